@@ -0,0 +1,50 @@
+"""离线工具共用的DeepSeek接口命令行参数
+
+evaluation.py、sentiment_estimator.py 等工具用同一组参数选择对接方式：
+真实接口(--api-key 或 DEEPSEEK_API_KEY)、本地模拟接口(--mock)，或经过录制层(--cassette)。
+回放模式不发出请求，不需要API Key，也不启动模拟接口。
+
+用法:
+    add_api_arguments(parser)
+    args = parser.parse_args()
+    with api_target(parser, args) as target:
+        ...  # target['base_url'] 为None时使用配置中的接口地址
+"""
+import os
+from contextlib import ExitStack, contextmanager
+
+from http_cassette import MODES, use_cassette
+
+
+def add_api_arguments(parser):
+    parser.add_argument('--mock', action='store_true', help='启动本地模拟接口')
+    parser.add_argument('--latency', type=float, default=0.0, help='模拟接口的平均延迟(秒)')
+    parser.add_argument('--api-key', default=os.environ.get('DEEPSEEK_API_KEY', ''))
+    parser.add_argument('--cassette', help='HTTP录制/回放文件')
+    parser.add_argument('--cassette-mode', choices=MODES, default='once',
+                        help='record: 总是请求并录制; replay: 只回放; once: 有录制时回放，否则请求并录制')
+
+
+@contextmanager
+def api_target(parser, args):
+    """按命令行参数准备接口，with 块内有效，退出时关闭模拟接口和录制文件
+
+    Yields:
+        {'base_url': 模拟接口地址或None, 'api_key': API Key, 'sleep_time': 使用模拟接口时为0，否则None}
+    """
+    replay = args.cassette and args.cassette_mode == 'replay'
+    target = {'base_url': None, 'api_key': args.api_key, 'sleep_time': None}
+    if replay:
+        target['api_key'] = args.api_key or 'replay'  # 回放不发出请求，录制文件里也不含API Key
+    elif not args.mock and not args.api_key:
+        parser.error('请通过 --api-key 或 DEEPSEEK_API_KEY 提供API Key，或使用 --mock')
+
+    with ExitStack() as stack:
+        if args.mock and not replay:
+            from mock_servers import MockDeepSeekServer
+            server = MockDeepSeekServer(latency=args.latency).start()
+            stack.callback(server.stop)
+            target.update(base_url=server.url, api_key=args.api_key or 'mock', sleep_time=0)
+        if args.cassette:
+            stack.enter_context(use_cassette(args.cassette, args.cassette_mode))
+        yield target
@@ -0,0 +1,439 @@
+"""爬取、分析、图表三个阶段的端到端基准测试
+
+memory 阶段对比评论保存为 list[dict] 和 CommentStore 时的内存占用。
+decode 阶段对比标准库 json 逐条复制和 comment_schema 投影解码评论接口响应的耗时。
+estimate 阶段经模拟接口运行一次抽样估计，再换 --estimate-seeds 个随机种子离线重复，
+统计置信区间覆盖真实占比的比例，防止估计的统计性质退化。
+
+每个阶段在独立子进程中运行，以便单独统计峰值内存。
+结果以JSON保存到 benchmarks/results/，可用 compare.py 对比不同提交。
+
+用法:
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 100000
+    python benchmarks/bench_pipeline.py --sizes 1000 --stages crawl analyze
+    python benchmarks/bench_pipeline.py --sizes 20000 --stages estimate --estimate-seeds 500
+    python benchmarks/bench_pipeline.py --sizes 1000 --cassette data/cassettes/bench                       # 录制
+    python benchmarks/bench_pipeline.py --sizes 1000 --cassette data/cassettes/bench --cassette-mode replay  # 回放
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+STAGES = ('crawl', 'analyze', 'analyze_chunked', 'csv_load', 'chart', 'memory', 'decode', 'estimate')
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+
+
+def _peak_rss_mb():
+    """当前进程的峰值常驻内存(MB)，无法获取时为None
+
+    resource 模块只在类Unix系统上存在，Windows 上改用 psutil(未安装时不统计)。
+    """
+    try:
+        import resource
+    except ImportError:
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 1024 / 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位为 KB，macOS 上为字节
+    if sys.platform == 'darwin':
+        return peak / 1024 / 1024
+    return peak / 1024
+
+
+def _configure(workdir, weibo_url=None, deepseek_url=None):
+    """把爬虫和分析器指向本地模拟接口并去掉限速等待"""
+    import config
+    config.CRAWLER_CONFIG.update(sleep_time=0, output_dir=os.path.join(workdir, 'raw'))
+    config.ANALYZER_CONFIG.update(sleep_time=0, output_dir=os.path.join(workdir, 'analyzed'))
+    if weibo_url:
+        config.CRAWLER_CONFIG['base_url'] = weibo_url
+    if deepseek_url:
+        config.ANALYZER_CONFIG['base_url'] = deepseek_url
+
+
+def _requests(server):
+    """模拟接口处理的请求数，加上从录制文件回放的次数"""
+    from http_client import get_cassette
+    cassette = get_cassette()
+    return server.request_count + (cassette.hits if cassette else 0)
+
+
+def bench_crawl(size, workdir, options):
+    from mock_servers import MockWeiboServer
+    server = MockWeiboServer(comments=size, latency=options['latency']).start()
+    try:
+        _configure(workdir, weibo_url=server.url)
+        from weibo_crawler import WeiboCrawler
+        crawler = WeiboCrawler()
+        crawler.set_headers('bench', 'bench', 'bench')
+
+        start = time.perf_counter()
+        output_file = crawler.crawl_comments('https://weibo.com/detail?id=1&uid=1')
+        elapsed = time.perf_counter() - start
+        pages = _requests(server)
+        return {
+            'seconds': elapsed,
+            'pages': pages,
+            'comments': len(crawler.comments),
+            'pages_per_s': pages / elapsed,
+            'comments_per_s': len(crawler.comments) / elapsed,
+            'output_file': output_file
+        }
+    finally:
+        server.stop()
+
+
+def bench_analyze(size, workdir, options, chunked=False):
+    from benchmarks.corpus import write_corpus
+    from mock_servers import MockDeepSeekServer
+    comments_file = write_corpus(os.path.join(workdir, 'corpus'), size)
+    server = MockDeepSeekServer(latency=options['latency']).start()
+    try:
+        _configure(workdir, deepseek_url=server.url)
+        if chunked:
+            import config
+            config.ANALYZER_CONFIG['chunked_min_mb'] = 0
+        from sentiment_analyzer import SentimentAnalyzer
+        analyzer = SentimentAnalyzer()
+        analyzer.set_api_key('bench')
+
+        start = time.perf_counter()
+        analyzer.analyze_comments(comments_file)
+        elapsed = time.perf_counter() - start
+        calls = _requests(server)
+        return {
+            'seconds': elapsed,
+            'comments': size,
+            'comments_per_s': size / elapsed,
+            'api_calls': calls,
+            'api_calls_per_comment': calls / size,
+            'prompt_tokens_per_call': analyzer.usage.prompt_tokens / max(calls, 1)
+        }
+    finally:
+        server.stop()
+
+
+def bench_analyze_chunked(size, workdir, options):
+    """分块流式分析，峰值内存应与评论条数无关"""
+    return bench_analyze(size, workdir, options, chunked=True)
+
+
+def bench_csv_load(size, workdir, options):
+    import pandas as pd
+    from benchmarks.corpus import write_corpus
+    analyzed_file = write_corpus(os.path.join(workdir, 'corpus'), size, analyzed=True)
+
+    start = time.perf_counter()
+    df = pd.read_csv(analyzed_file)
+    elapsed = time.perf_counter() - start
+    return {
+        'seconds': elapsed,
+        'rows': len(df),
+        'rows_per_s': len(df) / elapsed,
+        'file_mb': os.path.getsize(analyzed_file) / 1024 / 1024
+    }
+
+
+def bench_chart(size, workdir, options):
+    from benchmarks.corpus import write_corpus
+    analyzed_file = write_corpus(os.path.join(workdir, 'corpus'), size, analyzed=True)
+    os.chdir(workdir)  # ChartMaker 写到当前目录下的 charts/
+    from chart_maker import ChartMaker
+    chart_maker = ChartMaker()
+
+    start = time.perf_counter()
+    pie_file = chart_maker.create_pie_chart(analyzed_file)
+    pie_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    wordcloud_file = chart_maker.create_wordcloud(analyzed_file)
+    wordcloud_seconds = time.perf_counter() - start
+    return {
+        'seconds': pie_seconds + wordcloud_seconds,
+        'pie_seconds': pie_seconds,
+        'wordcloud_seconds': wordcloud_seconds,
+        'pie_ok': bool(pie_file),
+        'wordcloud_ok': bool(wordcloud_file)
+    }
+
+
+def bench_memory(size, workdir, options):
+    """同一批评论分别保存为 list[dict] 和 CommentStore 时占用的内存"""
+    import csv
+    import tracemalloc
+    from benchmarks.corpus import write_corpus
+    from comment_store import CommentStore
+    comments_file = write_corpus(os.path.join(workdir, 'corpus'), size)
+
+    def load_dicts():
+        with open(comments_file, encoding='utf-8-sig', newline='') as f:
+            return [
+                dict(record, comment_id=int(record['comment_id']), parent_id=int(record['parent_id']),
+                     like_count=int(record['like_count']), sentiment=-2)
+                for record in csv.DictReader(f)
+            ]
+
+    def measure(load):
+        tracemalloc.start()
+        start = time.perf_counter()
+        data = load()
+        elapsed = time.perf_counter() - start
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del data
+        return current / 1024 / 1024, elapsed
+
+    dict_mb, dict_seconds = measure(load_dicts)
+    store_mb, store_seconds = measure(lambda: CommentStore.from_csv(comments_file))
+    return {
+        'seconds': store_seconds,
+        'dict_seconds': dict_seconds,
+        'dict_mb': dict_mb,
+        'store_mb': store_mb,
+        'store_bytes_per_comment': store_mb * 1024 * 1024 / size,
+        'memory_saving': 1 - store_mb / dict_mb
+    }
+
+
+def bench_decode(size, workdir, options):
+    """评论接口响应的解码: json + 逐条复制dict 对比 comment_schema 投影解码"""
+    from comment_schema import BACKEND, parse_page
+    from mock_servers import make_comment
+
+    def padded(comment):
+        # 真实接口每条评论带有大量不保存的字段，这里补上一部分使体积接近
+        comment['user'].update({
+            'id': comment['id'] * 7, 'profile_image_url': 'https://tvax1.sinaimg.cn/crop.0.0.180.180.50/x.jpg',
+            'verified': False, 'description': '这个人很懒，什么都没有留下', 'followers_count': 1024,
+            'badge': {'user_name_certificate': 1, 'dzwbqlx_2016': 1}
+        })
+        comment.update({'rootid': comment['id'], 'floor_number': 1, 'source': '来自北京', 'mid': str(comment['id']),
+                        'text': comment['text_raw'], 'isLikedByMblogAuthor': False, 'disable_reply': 0})
+        return comment
+
+    pages = []
+    for start in range(0, size, 20):
+        data = [padded(make_comment(7, i)) for i in range(start, min(start + 20, size))]
+        pages.append(json.dumps({'ok': 1, 'data': data, 'total_number': size, 'max_id': start + 20}).encode())
+
+    start = time.perf_counter()
+    for content in pages:
+        rows = [
+            {'comment_id': c['id'], 'content': c['text_raw'], 'created_at': c['created_at'],
+             'user_name': c['user']['screen_name'], 'like_count': c.get('like_counts', 0)}
+            for c in json.loads(content)['data']
+        ]
+    json_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for content in pages:
+        page = parse_page(content)
+    seconds = time.perf_counter() - start
+    return {
+        'seconds': seconds,
+        'json_seconds': json_seconds,
+        'speedup': json_seconds / seconds if seconds else 0.0,
+        'backend': BACKEND
+    }
+
+
+class _LabelAnalyzer:
+    """按模拟接口的规则直接打标签，不经过HTTP，用于多个随机种子的覆盖率统计"""
+
+    def __init__(self):
+        from token_budget import UsageTracker
+        self.api_key = 'bench'
+        self.is_running = True
+        self.config = {'sleep_time': 0}
+        self.usage = UsageTracker()
+
+    def analyze_text(self, text):
+        from mock_servers import label_text
+        self.usage.requests += 1
+        return label_text(text)
+
+
+def bench_estimate(size, workdir, options):
+    """抽样估计的调用次数，以及各情感置信区间覆盖真实占比的比例"""
+    import contextlib
+    import io
+    import config
+    from benchmarks.corpus import make_comments_frame
+    from comment_store import CommentStore
+    from mock_servers import MockDeepSeekServer, label_text
+    frame = make_comments_frame(size)
+    store = CommentStore.from_dataframe(frame)
+    truth = frame['content'].map(label_text).value_counts(normalize=True)
+    estimator_config = dict(config.ESTIMATOR_CONFIG, output_dir=os.path.join(workdir, 'estimates'))
+
+    server = MockDeepSeekServer(latency=options['latency']).start()
+    try:
+        _configure(workdir, deepseek_url=server.url)
+        from sentiment_analyzer import SentimentAnalyzer
+        from sentiment_estimator import SentimentEstimator
+        analyzer = SentimentAnalyzer()
+        analyzer.set_api_key('bench')
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = SentimentEstimator(analyzer, estimator_config).estimate(store=store)
+        elapsed = time.perf_counter() - start
+        calls = _requests(server)
+    finally:
+        server.stop()
+
+    seeds = options.get('estimate_seeds') or 0
+    covered = samples = 0
+    per_class = dict.fromkeys(result['classes'], 0)
+    for seed in range(seeds):
+        with contextlib.redirect_stdout(io.StringIO()):
+            trial = SentimentEstimator(_LabelAnalyzer(), dict(estimator_config, seed=seed)).estimate(store=store)
+        hits = [item['low'] <= truth.get(int(label), 0.0) <= item['high']
+                for label, item in trial['classes'].items()]
+        for label, hit in zip(trial['classes'], hits):
+            per_class[label] += hit
+        covered += all(hits)
+        samples += trial['samples']
+    report = {
+        'seconds': elapsed,
+        'comments': size,
+        'samples': result['samples'],
+        'width': result['width'],
+        'api_calls': calls,
+        'api_calls_per_comment': calls / size
+    }
+    if seeds:
+        report.update(
+            seeds=seeds,
+            mean_samples=samples / seeds,
+            coverage_joint=covered / seeds,
+            coverage_min=min(per_class.values()) / seeds,
+            coverage={label: hits / seeds for label, hits in per_class.items()}
+        )
+    return report
+
+
+BENCHMARKS = {
+    'crawl': bench_crawl,
+    'analyze': bench_analyze,
+    'analyze_chunked': bench_analyze_chunked,
+    'csv_load': bench_csv_load,
+    'chart': bench_chart,
+    'memory': bench_memory,
+    'decode': bench_decode,
+    'estimate': bench_estimate
+}
+
+
+def _run_stage(stage, size, workdir, options, queue):
+    """子进程入口"""
+    try:
+        from profiler import PhaseProfiler
+        profiler = PhaseProfiler(enabled=bool(options.get('profile_dir')))
+        cassette = None
+        if options.get('cassette_dir'):
+            from http_cassette import Cassette
+            from http_client import set_cassette
+            cassette = Cassette(os.path.join(options['cassette_dir'], f'{stage}_{size}.sqlite'),
+                                options['cassette_mode'])
+            set_cassette(cassette)
+        with profiler.phase(f'{stage}_{size}', options.get('profile_dir') or workdir):
+            result = BENCHMARKS[stage](size, workdir, options)
+        result['status'] = 'ok'
+        if cassette:
+            result['cassette_misses'] = cassette.misses
+    except Exception as e:
+        result = {'status': 'error', 'error': str(e)}
+    result['peak_rss_mb'] = _peak_rss_mb()
+    queue.put(result)
+
+
+def run_stage(stage, size, workdir, options):
+    """在独立进程中运行一个阶段"""
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_run_stage, args=(stage, size, workdir, options, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='端到端基准测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES))
+    parser.add_argument('--latency', type=float, default=0.0, help='模拟接口的平均延迟(秒)')
+    parser.add_argument('--output', default=None, help='结果JSON路径，默认按提交号命名')
+    parser.add_argument('--cassette', metavar='DIR',
+                        help='HTTP录制/回放目录，每个阶段和规模一个文件，回放时不访问模拟接口')
+    parser.add_argument('--cassette-mode', choices=('record', 'replay', 'once'), default='once')
+    parser.add_argument('--estimate-seeds', type=int, default=100,
+                        help='estimate 阶段统计覆盖率的随机种子数，0为不统计')
+    parser.add_argument('--profile', action='store_true',
+                        help='同时剖析各阶段，结果写在 benchmarks/results/profiles/ 下')
+    args = parser.parse_args()
+
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'options': {'latency': args.latency, 'cassette_mode': args.cassette_mode if args.cassette else None},
+        'results': {}
+    }
+
+    with tempfile.TemporaryDirectory(prefix='weibo_bench_') as workdir:
+        for size in args.sizes:
+            for stage in args.stages:
+                print(f"[{stage}] {size} 条评论 ...", flush=True)
+                options = {
+                    'latency': args.latency,
+                    'profile_dir': RESULTS_DIR if args.profile else None,
+                    'cassette_dir': os.path.abspath(args.cassette) if args.cassette else None,
+                    'cassette_mode': args.cassette_mode,
+                    'estimate_seeds': args.estimate_seeds
+                }
+                result = run_stage(stage, size, workdir, options)
+                result.pop('output_file', None)
+                report['results'].setdefault(stage, {})[str(size)] = result
+                if result['status'] == 'ok':
+                    peak = result['peak_rss_mb']
+                    print(f"    {result['seconds']:.3f}s, 峰值内存 "
+                          f"{f'{peak:.1f}MB' if peak is not None else '未统计'}")
+                else:
+                    print(f"    失败: {result['error']}")
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d_%H%M%S')}_{commit}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存至: {output}")
+
+
+if __name__ == '__main__':
+    main()
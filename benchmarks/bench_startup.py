@@ -0,0 +1,67 @@
+"""冷启动导入耗时检查
+
+在全新的子进程中导入 main 模块若干次，取中位数与 UI_CONFIG['import_budget_ms'] 比较，
+同时确认 pandas、matplotlib 等重量级库没有在启动时被导入。
+超出预算或提前导入了重量级库时以非零状态退出，可直接用于CI。
+
+用法:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 10 --budget 250
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from config import UI_CONFIG
+
+# 启动阶段不应被导入的模块
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib', 'wordcloud', 'jieba', 'PIL', 'requests')
+
+_PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "import main\n"
+    "elapsed = time.perf_counter() - start\n"
+    "import json\n"
+    "print(json.dumps({'ms': elapsed * 1000, 'heavy': [m for m in %r if m in sys.modules]}))\n"
+) % (HEAVY_MODULES,)
+
+
+def measure_once():
+    output = subprocess.check_output(
+        [sys.executable, '-c', _PROBE], cwd=ROOT_DIR, text=True
+    )
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='冷启动导入耗时检查')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget', type=float, default=UI_CONFIG['import_budget_ms'],
+                        help='导入耗时上限(毫秒)')
+    args = parser.parse_args()
+
+    samples = [measure_once() for _ in range(args.runs)]
+    median = statistics.median(sample['ms'] for sample in samples)
+    heavy = sorted({name for sample in samples for name in sample['heavy']})
+
+    print(f"import main: 中位数 {median:.1f}ms (预算 {args.budget:.0f}ms, {args.runs} 次)")
+    failed = False
+    if heavy:
+        print(f"启动时导入了重量级模块: {', '.join(heavy)}")
+        failed = True
+    if median > args.budget:
+        print("超出启动耗时预算")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
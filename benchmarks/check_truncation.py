@@ -0,0 +1,66 @@
+"""截断结果的token上限检查
+
+随机生成中英文、全角符号、表情混合的文本，用各截断策略和不同的 max_tokens 截断，
+确认结果按 estimate_tokens 估算不超过 max_tokens，且保留的是原文的开头(和结尾)。
+发现违反时列出前几个反例并以非零状态退出，可直接用于CI。
+
+用法:
+    python benchmarks/check_truncation.py
+    python benchmarks/check_truncation.py --texts 100000 --seed 1
+"""
+import argparse
+import os
+import random
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from token_budget import estimate_tokens, truncate_text
+
+# 宽字符、窄字符、全角标点、表情和省略号本身
+ALPHABET = '评论支持失望今天路过abcXYZ0123 ,.!?，。！？【】😀[doge]…'
+
+
+def check(text, max_tokens, policy):
+    """返回违反的原因，没有问题时返回None"""
+    result = truncate_text(text, max_tokens, policy)
+    if estimate_tokens(text) <= max_tokens:
+        return None if result == text else '未超出上限却被截断'
+    if estimate_tokens(result) > max_tokens:
+        return f'结果 {estimate_tokens(result)} 个token'
+    # 原文里也可能有省略号，任一位置能拆成 开头 + 省略号 + 结尾 即可
+    for idx, char in enumerate(result):
+        if char != '…' or not text.startswith(result[:idx]):
+            continue
+        tail = result[idx + 1:]
+        if (tail == '' if policy == 'head' else text.endswith(tail)):
+            return None
+    return '结果不是原文的开头/结尾'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='截断结果的token上限检查')
+    parser.add_argument('--texts', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failures = []
+    for _ in range(args.texts):
+        text = ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 200)))
+        max_tokens = rng.randint(1, 80)
+        for policy in ('head', 'head_tail'):
+            reason = check(text, max_tokens, policy)
+            if reason:
+                failures.append((policy, max_tokens, text, reason))
+
+    print(f"检查 {args.texts} 条文本 × 2 种策略，违反 {len(failures)} 次")
+    for policy, max_tokens, text, reason in failures[:5]:
+        print(f"  {policy} max_tokens={max_tokens}: {reason} | {text!r}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""对比两次基准测试结果
+
+用法:
+    python benchmarks/compare.py results/old.json results/new.json
+"""
+import argparse
+import json
+
+# 越小越好的指标，其余指标越大越好
+LOWER_IS_BETTER = ('seconds', 'pie_seconds', 'wordcloud_seconds', 'peak_rss_mb', 'api_calls_per_comment',
+                   'dict_seconds', 'dict_mb', 'store_mb', 'store_bytes_per_comment',
+                   'json_seconds', 'prompt_tokens_per_call', 'cassette_misses')
+
+
+def load(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def compare(old, new):
+    """返回 (阶段, 规模, 指标, 旧值, 新值, 变化率) 列表，变化率为正表示变好"""
+    rows = []
+    for stage, sizes in new['results'].items():
+        for size, result in sizes.items():
+            previous = old['results'].get(stage, {}).get(size)
+            if not previous:
+                continue
+            for metric, value in result.items():
+                base = previous.get(metric)
+                if not isinstance(value, (int, float)) or isinstance(value, bool):
+                    continue
+                if not isinstance(base, (int, float)) or not base:
+                    continue
+                change = (value - base) / base
+                if metric in LOWER_IS_BETTER:
+                    change = -change
+                rows.append((stage, size, metric, base, value, change))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='对比两次基准测试结果')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    args = parser.parse_args()
+
+    old, new = load(args.old), load(args.new)
+    print(f"{old['commit']} -> {new['commit']}")
+    print(f"{'阶段':<10}{'规模':>8}  {'指标':<24}{'旧值':>12}{'新值':>12}{'变化':>9}")
+    for stage, size, metric, base, value, change in compare(old, new):
+        print(f"{stage:<10}{size:>8}  {metric:<24}{base:>12.3f}{value:>12.3f}{change:>+9.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""生成基准测试用的合成评论数据"""
+import os
+import random
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+import pandas as pd
+
+from mock_servers import make_comment
+
+
+def make_comments_frame(size, seed=0):
+    """生成与爬虫输出同结构的评论表"""
+    rows = []
+    for idx in range(size):
+        comment = make_comment(seed, idx)
+        rows.append({
+            'comment_id': comment['id'],
+            'parent_id': 0,
+            'content': comment['text_raw'],
+            'created_at': comment['created_at'],
+            'user_name': comment['user']['screen_name'],
+            'like_count': comment['like_counts']
+        })
+    return pd.DataFrame(rows)
+
+
+def make_analyzed_frame(size, seed=0):
+    """生成与分析器输出同结构的结果表，情感随机分配"""
+    df = make_comments_frame(size, seed)
+    rng = random.Random(seed)
+    df['sentiment'] = [rng.choice((0, 1, 2)) for _ in range(size)]
+    df['error'] = ''
+    df['cluster_id'] = df['comment_id']
+    df['cluster_size'] = 1
+    return df
+
+
+def write_corpus(directory, size, seed=0, analyzed=False):
+    """把合成数据写成CSV并返回路径"""
+    os.makedirs(directory, exist_ok=True)
+    kind = 'analyzed' if analyzed else 'comments'
+    path = os.path.join(directory, f'{kind}_{size}.csv')
+    if not os.path.exists(path):
+        df = make_analyzed_frame(size, seed) if analyzed else make_comments_frame(size, seed)
+        df.to_csv(path, index=False, encoding='utf-8-sig')
+    return path
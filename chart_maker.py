@@ -1,12 +1,31 @@
-import matplotlib.pyplot as plt
-import pandas as pd
-from wordcloud import WordCloud
-import jieba
+import json
 import os
-from matplotlib.font_manager import FontProperties
+import time
+from collections import Counter
+from datetime import timedelta, timezone
+from comment_schema import WEIBO_TIME_FORMAT
+from config import ERROR_MESSAGES, FILE_PATHS
+from dictionary_manager import get_dictionary_manager
+from font_registry import get_font_registry
+from lazy_modules import lazy_import
+from metrics import METRICS
+from text_normalizer import normalize_series
+
+# 只保存图片不显示窗口，固定使用Agg后端，避免与Tk主循环冲突
+plt = lazy_import('matplotlib.pyplot', on_load=lambda: __import__('matplotlib').use('Agg'))
+pd = lazy_import('pandas')
+wordcloud_lib = lazy_import('wordcloud')
+
+# 评论时间按北京时间分桶
+WEIBO_TIMEZONE = timezone(timedelta(hours=8))
 
 class ChartMaker:
-    def __init__(self):
+    def __init__(self, output_dir=None):
+        """
+        Args:
+            output_dir: 图表和统计的输出目录，默认为 charts
+        """
+        self.output_dir = output_dir or FILE_PATHS['charts']
         # 固定的颜色映射
         self.colors = {
             'positive': '#3498db',  # 蓝色
@@ -18,38 +37,39 @@ class ChartMaker:
             1: '中性',
             2: '消极' 
         }
-        # 使用系统自带的中文字体或尝试多个字体路径
-        self.font = self._get_chinese_font()
+        # 字体由进程内共享的注册表查找并缓存，首次使用时才扫描
+        self.fonts = get_font_registry()
+        
+    @property
+    def font(self):
+        """中文字体路径"""
+        return self._get_chinese_font()
         
     def _get_chinese_font(self):
         """获取可用的中文字体路径"""
-        try:
-            # Windows系统常见中文字体路径
-            font_paths = [
-                'C:/Windows/Fonts/simhei.ttf',  # 黑体
-                'C:/Windows/Fonts/SIMYOU.TTF',  # 幼圆
-                'C:/Windows/Fonts/simsun.ttc',  # 宋体
-                'C:/Windows/Fonts/msyh.ttc',    # 微软雅黑
-            ]
-            
-            # 返回第一个存在的字体路径
-            for path in font_paths:
-                if os.path.exists(path):
-                    return path
-                    
-            raise Exception("未找到可用的中文字体")
-            
-        except Exception as e:
-            print(f"加载中文字体失败: {str(e)}")
-            return None
+        path = self.fonts.font_path
+        if not path:
+            print("加载中文字体失败: 未找到可用的中文字体")
+        return path
+        
+    def _output_path(self, name):
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+        return os.path.join(self.output_dir, name)
+        
+    def _load(self, analyzed_file):
+        """读取分析结果，传入DataFrame时直接使用，批量生成报告时同一份数据只读一次"""
+        if isinstance(analyzed_file, pd.DataFrame):
+            return analyzed_file
+        with METRICS.timer('dataframe_io_seconds', op='read_csv'):
+            return pd.read_csv(analyzed_file)
     
     def create_pie_chart(self, analyzed_file):
         """生成情感分布饼图"""
         try:
-            plt.rcParams['font.sans-serif'] = ['SimHei']
-            plt.rcParams['axes.unicode_minus'] = False
+            self.fonts.apply_matplotlib()
             
-            df = pd.read_csv(analyzed_file)
+            df = self._load(analyzed_file)
             total = len(df)
             
             # 按固定顺序统计情感
@@ -76,10 +96,9 @@ class ChartMaker:
             )
             plt.title('评论情感分布', fontsize=14, weight='bold', pad=20)  # 加大标题字体并加粗
             
-            if not os.path.exists('charts'):
-                os.makedirs('charts')
-            output_file = 'charts/sentiment_pie.png'
-            plt.savefig(output_file, bbox_inches='tight', dpi=300)
+            output_file = self._output_path('sentiment_pie.png')
+            with METRICS.timer('render_seconds', chart='pie'):
+                plt.savefig(output_file, bbox_inches='tight', dpi=300)
             plt.close()
             
             return output_file
@@ -88,37 +107,54 @@ class ChartMaker:
             print(f"生成饼图失败: {str(e)}")
             return None
             
-    def create_wordcloud(self, analyzed_file, sentiment=None):
-        """生成词云图"""
+    def word_frequencies(self, analyzed_file, sentiment=None):
+        """统计评论的词频(已去掉停用词)
+        
+        Args:
+            analyzed_file: 分析结果文件路径或DataFrame
+            sentiment: 只统计该情感的评论，None为全部
+            
+        Returns:
+            Counter，词 -> 出现次数
+        """
+        df = self._load(analyzed_file)
+        if sentiment is not None:
+            df = df[df['sentiment'] == sentiment]
+        
+        # 合并规范化后的评论文本，旧的分析结果没有 clean_text 列时现场计算
+        if 'clean_text' in df:
+            texts = df['clean_text'].fillna('').astype(str)
+        else:
+            texts = normalize_series(df['content'])
+        text = ' '.join(texts)
+        
+        # 分词并去掉停用词，词典由 dicts/ 下的文件加载，修改后自动重新加载
+        with METRICS.timer('segmentation_seconds'):
+            return Counter(get_dictionary_manager().words(text))
+            
+    def create_wordcloud(self, analyzed_file, sentiment=None, frequencies=None):
+        """生成词云图
+        
+        Args:
+            analyzed_file: 分析结果文件路径或DataFrame
+            sentiment: 只用该情感的评论，None为全部
+            frequencies: 已统计好的词频，传入时不再分词
+        """
         try:
             # 获取字体路径
-            font_path = self._get_chinese_font()
+            font_path = self.font
             if not font_path:
                 raise Exception("未找到可用的中文字体")
+            self.fonts.apply_matplotlib()
             
-            # 读取分析结果
-            df = pd.read_csv(analyzed_file)
-            if sentiment is not None:
-                df = df[df['sentiment'] == sentiment]
-            
-            # 合并评论文本
-            text = ' '.join(df['content'].astype(str))
-            
-            # 添加停用词
-            stop_words = set(['了', '的', '是', '啊', '吗', '呢', '吧', '呀', '着', '啦', '么', 
-                             '都', '就', '也', '要', '这', '那', '不', '还', '有', '和', '我',
-                             '你', '他', '她', '它', '们', '个', '年', '月', '日'])
-            
-            # 分词并过滤
-            words = []
-            for word in jieba.cut(text):
-                if len(word) > 1 and word not in stop_words:
-                    words.append(word)
-            
-            text = ' '.join(words)
+            if frequencies is None:
+                frequencies = self.word_frequencies(analyzed_file, sentiment)
+            if not frequencies:
+                raise ValueError("没有可用于生成词云的词语")
             
             # 生成词云
-            wordcloud = WordCloud(
+            render_start = time.perf_counter()
+            wordcloud = wordcloud_lib.WordCloud(
                 font_path=font_path,
                 width=800,
                 height=400,
@@ -128,7 +164,7 @@ class ChartMaker:
                 colormap='viridis',
                 min_font_size=10,
                 max_font_size=80
-            ).generate(text)
+            ).generate_from_frequencies(frequencies)
             
             plt.figure(figsize=(10, 5))
             plt.imshow(wordcloud, interpolation='bilinear')
@@ -139,11 +175,10 @@ class ChartMaker:
                 title += f' - {self.labels[sentiment]}'
             plt.title(title, fontsize=14, weight='bold', pad=20)
             
-            if not os.path.exists('charts'):
-                os.makedirs('charts')
-            output_file = f'charts/wordcloud{"_" + str(sentiment) if sentiment is not None else ""}.png'
+            output_file = self._output_path(f'wordcloud{"_" + str(sentiment) if sentiment is not None else ""}.png')
             plt.savefig(output_file, bbox_inches='tight', dpi=300)
             plt.close()
+            METRICS.histogram('render_seconds', chart='wordcloud').observe(time.perf_counter() - render_start)
             
             return output_file
             
@@ -151,15 +186,106 @@ class ChartMaker:
             print(f"生成词云图失败: {str(e)}")
             return None
 
+    def create_trend_chart(self, analyzed_file, bucket=None):
+        """生成各情感评论数随时间变化的折线图
+        
+        Args:
+            analyzed_file: 分析结果文件路径或DataFrame
+            bucket: 'hour' 或 'day'，None 时按评论时间跨度自动选择
+        """
+        try:
+            self.fonts.apply_matplotlib()
+            df = self._load(analyzed_file)
+            
+            times = pd.to_datetime(df['created_at'], format=WEIBO_TIME_FORMAT, errors='coerce', utc=True)
+            times = times.dt.tz_convert(WEIBO_TIMEZONE).dt.tz_localize(None)
+            valid = times.notna()
+            if not valid.any():
+                raise ValueError("没有可解析的评论时间")
+            times = times[valid]
+            if bucket is None:
+                bucket = 'hour' if times.max() - times.min() <= pd.Timedelta(days=3) else 'day'
+            step = pd.Timedelta(hours=1) if bucket == 'hour' else pd.Timedelta(days=1)
+            
+            counts = pd.crosstab(times.dt.floor(step), df.loc[valid, 'sentiment'])
+            plt.figure(figsize=(10, 5))
+            for idx, label in self.labels.items():
+                if idx in counts:
+                    color = self.colors['positive' if idx == 0 else 'neutral' if idx == 1 else 'negative']
+                    plt.plot(counts.index, counts[idx], label=label, color=color, linewidth=2)
+            plt.legend()
+            plt.xlabel('时间')
+            plt.ylabel('评论数')
+            plt.title(f'评论情感走势(按{"小时" if bucket == "hour" else "天"})', fontsize=14, weight='bold', pad=20)
+            plt.gcf().autofmt_xdate()
+            
+            output_file = self._output_path('sentiment_trend.png')
+            with METRICS.timer('render_seconds', chart='trend'):
+                plt.savefig(output_file, bbox_inches='tight', dpi=150)
+            plt.close()
+            
+            return output_file
+            
+        except Exception as e:
+            print(f"生成走势图失败: {str(e)}")
+            return None
+
+    def create_estimate_chart(self, estimate):
+        """生成抽样估计的情感分布柱状图，误差线为置信区间
+
+        Args:
+            estimate: sentiment_estimator 的估计结果dict或其JSON文件路径
+        """
+        try:
+            self.fonts.apply_matplotlib()
+            if not isinstance(estimate, dict):
+                with open(estimate, encoding='utf-8') as f:
+                    estimate = json.load(f)
+
+            names, ratios, errors, colors = [], [], [[], []], []
+            for idx, label in self.labels.items():
+                item = estimate['classes'].get(str(idx))
+                if item is None:
+                    continue
+                names.append(label)
+                ratios.append(item['ratio'] * 100)
+                errors[0].append((item['ratio'] - item['low']) * 100)
+                errors[1].append((item['high'] - item['ratio']) * 100)
+                colors.append(self.colors['positive' if idx == 0 else 'neutral' if idx == 1 else 'negative'])
+
+            plt.figure(figsize=(8, 6))
+            bars = plt.bar(names, ratios, color=colors, yerr=errors, capsize=8)
+            for bar, ratio, upper in zip(bars, ratios, errors[1]):
+                plt.text(bar.get_x() + bar.get_width() / 2, ratio + upper + 1, f'{ratio:.1f}%',
+                         ha='center', fontsize=12, weight='bold')
+            plt.ylim(0, min(max(r + u for r, u in zip(ratios, errors[1])) + 10, 100))
+            plt.ylabel('占比(%)')
+            plt.title(
+                f"抽样估计的情感分布(样本 {estimate['samples']}/{estimate['total']} 条，"
+                f"{estimate['confidence'] * 100:.0f}%置信区间)",
+                fontsize=14, weight='bold', pad=20
+            )
+
+            output_file = self._output_path('sentiment_estimate.png')
+            with METRICS.timer('render_seconds', chart='estimate'):
+                plt.savefig(output_file, bbox_inches='tight', dpi=150)
+            plt.close()
+
+            return output_file
+
+        except Exception as e:
+            print(f"生成估计图失败: {str(e)}")
+            return None
+
     def save_sentiment_stats(self, analyzed_file):
         """保存情感分析统计结果
         
         Args:
-            analyzed_file: 分析结果文件路径
+            analyzed_file: 分析结果文件路径或DataFrame
         """
         try:
             # 读取分析结果
-            df = pd.read_csv(analyzed_file)
+            df = self._load(analyzed_file)
             
             # 统计各情感数量及占比
             stats = df['sentiment'].value_counts()
@@ -170,13 +296,11 @@ class ChartMaker:
             report += "=" * 20 + "\n"
             for sentiment, count in stats.items():
                 percentage = count / total * 100
-                report += f"{self.labels[sentiment]}: {count} 条 ({percentage:.1f}%)\n"
+                report += f"{self.labels.get(sentiment, ERROR_MESSAGES['analysis_failed'])}: {count} 条 ({percentage:.1f}%)\n"
             report += "=" * 20 + "\n"
             
             # 保存报告
-            if not os.path.exists('charts'):
-                os.makedirs('charts')
-            output_file = 'charts/sentiment_stats.txt'
+            output_file = self._output_path('sentiment_stats.txt')
             with open(output_file, 'w', encoding='utf-8') as f:
                 f.write(report)
                 
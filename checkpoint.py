@@ -0,0 +1,125 @@
+"""分析进度检查点
+
+每个输入文件对应一个追加式 JSONL 日志，首行记录输入文件信息，之后每行记录一条已分析评论：
+    {"comment_id": 123, "sentiment": 0, "error": ""}
+每行用一次 O_APPEND 写入，进程崩溃最多丢掉未写完的最后一行，读取时会跳过。
+分析完成并写出结果文件后删除日志；重启进程后可根据日志精确续跑。
+"""
+import glob
+import hashlib
+import json
+import os
+import time
+
+
+class CheckpointJournal:
+    """单个输入文件的分析检查点日志"""
+
+    def __init__(self, comments_file, directory, fsync_interval=1.0):
+        """
+        Args:
+            comments_file: 被分析的评论文件
+            directory: 日志目录
+            fsync_interval: 两次 fsync 的最短间隔(秒)，0 表示每条都落盘
+        """
+        self.comments_file = os.path.abspath(comments_file)
+        self.directory = directory
+        digest = hashlib.sha1(self.comments_file.encode('utf-8')).hexdigest()[:16]
+        self.path = os.path.join(directory, f'{digest}.jsonl')
+        self.fsync_interval = fsync_interval
+        self.meta = {}
+        self._fd = None
+        self._last_sync = 0.0
+
+    def _fingerprint(self):
+        stat = os.stat(self.comments_file)
+        return {'input': self.comments_file, 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def _open(self):
+        if self._fd is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        return self._fd
+
+    def _append(self, record):
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        os.write(self._open(), line.encode('utf-8'))
+        now = time.monotonic()
+        if now - self._last_sync >= self.fsync_interval:
+            os.fsync(self._fd)
+            self._last_sync = now
+
+    def reset(self, **meta):
+        """清空日志重新开始，meta 会写入首行(如分块分析的输出文件)"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.meta = {**self._fingerprint(), **meta}
+        self._append(self.meta)
+        self.flush()
+
+    def load(self):
+        """读取已完成的评论
+
+        Returns:
+            {comment_id: (sentiment, error)}；日志不存在或输入文件已变化时返回空dict
+        """
+        done = {}
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except OSError:
+            return done
+        if not lines:
+            return done
+        try:
+            meta = json.loads(lines[0])
+        except ValueError:
+            return done
+        fingerprint = self._fingerprint()
+        if (meta.get('size'), meta.get('mtime')) != (fingerprint['size'], fingerprint['mtime']):
+            print(f"输入文件已变化，忽略旧的检查点: {self.path}")
+            return done
+        self.meta = meta
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # 崩溃时未写完的行
+            done[record['comment_id']] = (record['sentiment'], record.get('error', ''))
+        return done
+
+    def record(self, comment_id, sentiment, error=''):
+        """追加一条分析结果"""
+        self._append({'comment_id': comment_id, 'sentiment': sentiment, 'error': error})
+
+    def flush(self):
+        if self._fd is not None:
+            os.fsync(self._fd)
+            self._last_sync = time.monotonic()
+
+    def close(self):
+        if self._fd is not None:
+            os.fsync(self._fd)
+            os.close(self._fd)
+            self._fd = None
+
+    def finish(self):
+        """结果已完整写出，删除日志"""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    @staticmethod
+    def latest_input(directory):
+        """最近一次未完成分析的输入文件，没有时返回None"""
+        journals = sorted(glob.glob(os.path.join(directory, '*.jsonl')), key=os.path.getmtime, reverse=True)
+        for path in journals:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    meta = json.loads(f.readline())
+            except (OSError, ValueError):
+                continue
+            if os.path.exists(meta.get('input', '')):
+                return meta['input']
+        return None
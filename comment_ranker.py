@@ -0,0 +1,134 @@
+import heapq
+import itertools
+from lazy_modules import lazy_import
+
+np = lazy_import('numpy')
+
+
+def like_weights(like_counts):
+    """点赞权重：每条评论至少计1，避免零赞评论被完全忽略"""
+    likes = np.asarray(like_counts, dtype=np.float64)
+    likes = np.nan_to_num(likes, nan=0.0)
+    return np.clip(likes, 0, None) + 1.0
+
+
+def like_weighted_distribution(df, labels=(0, 1, 2)):
+    """按点赞加权统计情感分布
+
+    Args:
+        df: 包含 sentiment 和 like_count 列的分析结果
+        labels: 参与统计的情感取值
+
+    Returns:
+        {情感: {'count': 条数, 'likes': 点赞总数, 'ratio': 加权占比}}
+    """
+    sentiments = df['sentiment'].to_numpy()
+    likes = np.nan_to_num(df['like_count'].to_numpy(dtype=np.float64), nan=0.0)
+    weights = like_weights(likes)
+
+    mask = np.isin(sentiments, labels)
+    total_weight = weights[mask].sum()
+
+    result = {}
+    for label in labels:
+        hit = sentiments == label
+        weight = weights[hit].sum()
+        result[label] = {
+            'count': int(hit.sum()),
+            'likes': int(likes[hit].sum()),
+            'ratio': float(weight / total_weight) if total_weight else 0.0
+        }
+    return result
+
+
+def top_k_by_likes(df, k=100, sentiment=None):
+    """取点赞数最高的 k 条评论
+
+    先用 argpartition 选出前 k 个位置，再只对这 k 条排序，
+    复杂度 O(n + k log k)，大评论串上比整体排序快得多。
+    """
+    if sentiment is not None:
+        df = df[df['sentiment'] == sentiment]
+    n = len(df)
+    if n == 0 or k <= 0:
+        return df.iloc[0:0]
+
+    likes = np.nan_to_num(df['like_count'].to_numpy(dtype=np.float64), nan=0.0)
+    if k < n:
+        candidates = np.argpartition(-likes, k - 1)[:k]
+    else:
+        candidates = np.arange(n)
+    # 稳定排序，点赞相同时保持原有顺序
+    order = candidates[np.argsort(-likes[candidates], kind='stable')]
+    return df.iloc[order]
+
+
+class RunningTopK:
+    """流式维护点赞数最高的 k 条记录（小顶堆）"""
+
+    def __init__(self, k=100):
+        self.k = k
+        self._heap = []
+        self._counter = itertools.count()
+
+    def push(self, like_count, record):
+        """加入一条记录"""
+        # 计数器按插入顺序递减，点赞相同时先到的记录优先保留
+        item = (like_count, -next(self._counter), record)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, item)
+        elif item > self._heap[0]:
+            heapq.heapreplace(self._heap, item)
+
+    def items(self):
+        """按点赞数从高到低返回记录"""
+        return [record for _, _, record in sorted(self._heap, reverse=True)]
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class SentimentTopK:
+    """分析过程中按情感分别维护 Top-K 和点赞加权计数"""
+
+    def __init__(self, k=100, labels=(0, 1, 2)):
+        self.k = k
+        self.labels = labels
+        self.reset()
+
+    def reset(self):
+        self.top = {label: RunningTopK(self.k) for label in self.labels}
+        self.weights = {label: 0.0 for label in self.labels}
+        self.counts = {label: 0 for label in self.labels}
+
+    def add(self, record):
+        """记录一条已分析评论，record 需包含 sentiment 和 like_count"""
+        self.add_value(record.get('sentiment'), record.get('like_count'), record)
+
+    def add_value(self, sentiment, like_count, record):
+        """记录一条已分析评论，record 可以是任意对象，如 CommentStore 中的行号"""
+        if sentiment not in self.top:
+            return
+        likes = like_count or 0
+        try:
+            likes = max(int(likes), 0)
+        except (TypeError, ValueError):
+            likes = 0
+        self.top[sentiment].push(likes, record)
+        self.weights[sentiment] += likes + 1
+        self.counts[sentiment] += 1
+
+    def top_comments(self, sentiment):
+        """返回某一情感当前点赞最高的评论"""
+        return self.top[sentiment].items()
+
+    def distribution(self):
+        """当前的点赞加权情感分布"""
+        total = sum(self.weights.values())
+        return {
+            label: {
+                'count': self.counts[label],
+                'ratio': self.weights[label] / total if total else 0.0
+            }
+            for label in self.labels
+        }
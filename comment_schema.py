@@ -0,0 +1,181 @@
+"""评论接口的快速解析
+
+优先用 msgspec 按类型化结构直接解码(只解码需要的字段)，其次 orjson，都没有时用标准库 json。
+每页评论只投影出保存的字段，按列放进 CommentPage，再整体写入 CommentStore，不再为每条评论复制dict。
+微博接口字段变化时抛出 SchemaDriftError，指出缺失或类型不符的字段。
+"""
+import json
+from typing import List, Optional
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if msgspec is not None:
+    BACKEND = 'msgspec'
+elif orjson is not None:
+    BACKEND = 'orjson'
+else:
+    BACKEND = 'json'
+
+# 评论的 created_at 格式，如 Mon Jan 01 12:00:00 +0800 2024
+WEIBO_TIME_FORMAT = '%a %b %d %H:%M:%S %z %Y'
+
+
+class SchemaDriftError(ValueError):
+    """微博接口返回的字段结构与预期不符"""
+
+    def __init__(self, field, index=None, detail=''):
+        self.field = field
+        self.index = index
+        where = f"第{index + 1}条评论的" if index is not None else ''
+        message = f"微博接口字段结构变化: {where}{field}"
+        if detail:
+            message += f" ({detail})"
+        super().__init__(message)
+
+
+class CommentPage:
+    """一页评论，只含保存的字段，按列存放"""
+
+    __slots__ = ('ok', 'max_id', 'comment_id', 'content', 'created_at',
+                 'user_name', 'like_count', 'total_number')
+
+    def __init__(self, ok=1, max_id=0):
+        self.ok = ok
+        self.max_id = max_id
+        self.comment_id = []
+        self.content = []
+        self.created_at = []
+        self.user_name = []
+        self.like_count = []
+        self.total_number = []
+
+    def __len__(self):
+        return len(self.comment_id)
+
+    def write_to(self, store, parent_id=0):
+        """写入 CommentStore"""
+        for row in zip(self.comment_id, self.content, self.created_at, self.user_name, self.like_count):
+            store.append(*row, parent_id=parent_id)
+
+
+def _int(value, field, index):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    raise SchemaDriftError(field, index, f"应为整数，实际为 {type(value).__name__}")
+
+
+def _str(value, field, index):
+    if isinstance(value, str):
+        return value
+    raise SchemaDriftError(field, index, f"应为字符串，实际为 {type(value).__name__}")
+
+
+def _project(payload):
+    """从通用JSON对象中投影出需要的字段"""
+    if not isinstance(payload, dict):
+        raise SchemaDriftError('<root>', detail=f"应为对象，实际为 {type(payload).__name__}")
+    page = CommentPage(ok=payload.get('ok', 1), max_id=payload.get('max_id') or 0)
+    if page.ok != 1:
+        return page  # 需要登录等异常状态没有 data 字段，交给调用方判断
+    items = payload.get('data')
+    if not isinstance(items, list):
+        raise SchemaDriftError('data', detail='缺少评论列表')
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise SchemaDriftError('<comment>', index, f"应为对象，实际为 {type(item).__name__}")
+        try:
+            page.comment_id.append(_int(item['id'], 'id', index))
+            page.content.append(_str(item['text_raw'], 'text_raw', index))
+            page.created_at.append(_str(item['created_at'], 'created_at', index))
+            page.user_name.append(_str(item['user']['screen_name'], 'user.screen_name', index))
+            page.like_count.append(_int(item.get('like_counts', 0), 'like_counts', index))
+            page.total_number.append(_int(item.get('total_number', 0), 'total_number', index))
+        except KeyError as e:
+            raise SchemaDriftError(e.args[0], index, '字段缺失') from None
+        except TypeError:
+            raise SchemaDriftError('user', index, '应为对象') from None
+    page.max_id = _int(page.max_id, 'max_id', None)
+    return page
+
+
+if msgspec is not None:
+    class _User(msgspec.Struct):
+        screen_name: str
+
+    class _Comment(msgspec.Struct):
+        id: int
+        text_raw: str
+        created_at: str
+        user: _User
+        like_counts: int = 0
+        total_number: int = 0
+
+    class _Page(msgspec.Struct):
+        ok: int = 1
+        max_id: int = 0
+        data: Optional[List[_Comment]] = None
+
+    _page_decoder = msgspec.json.Decoder(_Page)
+
+    def _decode_typed(content):
+        try:
+            raw = _page_decoder.decode(content)
+        except msgspec.ValidationError as e:
+            # 类型化解码失败时退回通用解码，给出具体字段
+            try:
+                payload = msgspec.json.decode(content)
+            except msgspec.DecodeError:
+                raise ValueError(f"评论接口返回的不是JSON: {str(e)}") from None
+            return _project(payload)
+        except msgspec.DecodeError as e:
+            raise ValueError(f"评论接口返回的不是JSON: {str(e)}") from None
+        page = CommentPage(ok=raw.ok, max_id=raw.max_id)
+        if raw.ok != 1:
+            return page
+        if raw.data is None:
+            raise SchemaDriftError('data', detail='缺少评论列表')
+        items = raw.data
+        page.comment_id = [item.id for item in items]
+        page.content = [item.text_raw for item in items]
+        page.created_at = [item.created_at for item in items]
+        page.user_name = [item.user.screen_name for item in items]
+        page.like_count = [item.like_counts for item in items]
+        page.total_number = [item.total_number for item in items]
+        return page
+
+
+def loads(content):
+    """通用JSON解码，content 可以是 bytes 或 str"""
+    if orjson is not None:
+        return orjson.loads(content)
+    if msgspec is not None:
+        return msgspec.json.decode(content)
+    return json.loads(content)
+
+
+def parse_page(content):
+    """解析一页评论接口的响应体
+
+    Args:
+        content: 响应体 bytes
+
+    Returns:
+        CommentPage
+
+    Raises:
+        SchemaDriftError: 字段缺失或类型不符
+        ValueError: 不是合法的JSON
+    """
+    if msgspec is not None:
+        return _decode_typed(content)
+    return _project(loads(content))
@@ -0,0 +1,191 @@
+"""紧凑的列式评论存储
+
+每个字段一列：数值列用 array 存成定长整数(情感为int8)，用户名去重后只存下标，
+时间字符串驻留复用。相比每条评论一个dict，百万级评论的内存占用可降低数倍。
+爬虫、分析器直接共用同一个 CommentStore，不再来回复制成 list[dict] 和 DataFrame。
+"""
+import csv
+import sys
+from array import array
+
+from lazy_modules import lazy_import
+from text_normalizer import normalize_texts
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+# 尚未分析的评论的情感值(-1 表示分析失败，0/1/2 为正常标签)
+UNLABELED = -2
+
+# 爬虫输出的字段顺序
+COMMENT_FIELDS = ('comment_id', 'parent_id', 'content', 'created_at', 'user_name', 'like_count')
+# 分析结果额外的字段
+ANALYSIS_FIELDS = ('sentiment', 'error', 'cluster_id', 'cluster_size', 'clean_text')
+
+
+def _to_int(value, default=0):
+    if value is None or value == '':
+        return default
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        try:
+            return int(float(value))
+        except (TypeError, ValueError):
+            return default
+
+
+class CommentStore:
+    """列式评论存储"""
+
+    def __init__(self):
+        self.comment_id = array('q')
+        self.parent_id = array('q')
+        self.like_count = array('q')
+        self.user_index = array('i')
+        self.content = []
+        self.clean_text = []      # 规范化后的正文，由 normalize() 批量补齐，可能短于 content
+        self.created_at = []
+        self.user_names = []      # 去重后的用户名，下标即 user_index 中的值
+        self._user_lookup = {}
+        self._time_lookup = {}    # 时间字符串驻留表
+
+        # 分析结果列
+        self.sentiment = array('b')
+        self.cluster_id = array('q')
+        self.cluster_size = array('i')
+        self.errors = {}          # 行号 -> 错误信息，只记录失败的行
+
+    def __len__(self):
+        return len(self.comment_id)
+
+    def append(self, comment_id, content, created_at, user_name, like_count=0, parent_id=0):
+        """追加一条评论，返回行号"""
+        user = self._user_lookup.get(user_name)
+        if user is None:
+            user = len(self.user_names)
+            self.user_names.append(user_name)
+            self._user_lookup[user_name] = user
+        created_at = self._time_lookup.setdefault(created_at, created_at)
+
+        self.comment_id.append(comment_id)
+        self.parent_id.append(parent_id or 0)
+        self.like_count.append(like_count or 0)
+        self.user_index.append(user)
+        self.content.append(content)
+        self.created_at.append(created_at)
+        self.sentiment.append(UNLABELED)
+        self.cluster_id.append(comment_id)
+        self.cluster_size.append(1)
+        return len(self.comment_id) - 1
+
+    def normalize(self):
+        """为尚未规范化的评论批量计算 clean_text，返回整列"""
+        start = len(self.clean_text)
+        if start < len(self.content):
+            self.clean_text.extend(normalize_texts(self.content[start:]))
+        return self.clean_text
+
+    def user_name(self, index):
+        return self.user_names[self.user_index[index]]
+
+    def set_result(self, index, sentiment, error=None):
+        """写入单条评论的分析结果"""
+        self.sentiment[index] = sentiment
+        if error:
+            self.errors[index] = error
+        else:
+            self.errors.pop(index, None)
+
+    def row(self, index):
+        """以dict形式返回一行，仅用于展示等少量访问"""
+        return {
+            'comment_id': self.comment_id[index],
+            'parent_id': self.parent_id[index],
+            'content': self.content[index],
+            'clean_text': self.clean_text[index] if index < len(self.clean_text) else '',
+            'created_at': self.created_at[index],
+            'user_name': self.user_name(index),
+            'like_count': self.like_count[index],
+            'sentiment': self.sentiment[index],
+            'error': self.errors.get(index, ''),
+            'cluster_id': self.cluster_id[index],
+            'cluster_size': self.cluster_size[index]
+        }
+
+    def to_dataframe(self, start=0, stop=None, analysis=False):
+        """转换为DataFrame用于写CSV
+
+        数值列通过 numpy.frombuffer 直接引用底层 array，不复制；
+        返回的DataFrame存活期间不要再向本存储追加评论。
+
+        Args:
+            start, stop: 行范围
+            analysis: 是否包含分析结果列
+        """
+        stop = len(self) if stop is None else stop
+        columns = {
+            'comment_id': np.frombuffer(self.comment_id, dtype=np.int64)[start:stop],
+            'parent_id': np.frombuffer(self.parent_id, dtype=np.int64)[start:stop],
+            'content': self.content[start:stop],
+            'created_at': self.created_at[start:stop],
+            'user_name': pd.Categorical.from_codes(
+                np.frombuffer(self.user_index, dtype=np.int32)[start:stop],
+                categories=pd.Index(self.user_names, dtype=object)
+            ),
+            'like_count': np.frombuffer(self.like_count, dtype=np.int64)[start:stop]
+        }
+        if analysis:
+            columns['sentiment'] = np.frombuffer(self.sentiment, dtype=np.int8)[start:stop]
+            columns['error'] = [self.errors.get(i, '') for i in range(start, stop)]
+            columns['cluster_id'] = np.frombuffer(self.cluster_id, dtype=np.int64)[start:stop]
+            columns['cluster_size'] = np.frombuffer(self.cluster_size, dtype=np.int32)[start:stop]
+            columns['clean_text'] = self.normalize()[start:stop]
+        return pd.DataFrame(columns, copy=False)
+
+    @classmethod
+    def from_csv(cls, path):
+        """逐行读取爬虫输出的CSV，不经过DataFrame"""
+        store = cls()
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            for record in csv.DictReader(f):
+                store.append(
+                    comment_id=_to_int(record['comment_id']),
+                    parent_id=_to_int(record.get('parent_id')),
+                    content=record['content'],
+                    created_at=record['created_at'],
+                    user_name=record['user_name'],
+                    like_count=_to_int(record.get('like_count'))
+                )
+        return store
+
+    @classmethod
+    def from_dataframe(cls, df):
+        store = cls()
+        parent_ids = df['parent_id'] if 'parent_id' in df else [0] * len(df)
+        for comment_id, parent_id, content, created_at, user_name, like_count in zip(
+            df['comment_id'], parent_ids, df['content'], df['created_at'],
+            df['user_name'], df['like_count']
+        ):
+            store.append(
+                comment_id=_to_int(comment_id),
+                parent_id=_to_int(parent_id),
+                content=content,
+                created_at=created_at,
+                user_name=user_name,
+                like_count=_to_int(like_count)
+            )
+        return store
+
+    def nbytes(self):
+        """粗略估算占用的内存(字节)"""
+        arrays = (self.comment_id, self.parent_id, self.like_count, self.user_index,
+                  self.sentiment, self.cluster_id, self.cluster_size)
+        total = sum(a.itemsize * len(a) for a in arrays)
+        total += sum(sys.getsizeof(text) for text in self.content)
+        total += sum(sys.getsizeof(clean) for clean, text in zip(self.clean_text, self.content)
+                     if clean is not text)
+        total += sum(sys.getsizeof(text) for text in self._time_lookup)
+        total += sum(sys.getsizeof(name) for name in self.user_names)
+        total += sys.getsizeof(self.content) + sys.getsizeof(self.clean_text) + sys.getsizeof(self.created_at)
+        return total
@@ -5,24 +5,184 @@ ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # 微博爬虫配置
 CRAWLER_CONFIG = {
+    # 可通过环境变量指向本地模拟服务器(mock_servers.py)
+    'base_url': os.environ.get('WEIBO_BASE_URL', 'https://weibo.com'),
     'output_dir': os.path.join(ROOT_DIR, 'data/raw_comments'),
     'headers': {
         'User-Agent': '',  # 移除默认值
         'Cookie': '',
         'Referer': ''
     },
-    'sleep_time': 1.0
+    'sleep_time': 1.0,
+    'fetch_replies': False,  # 是否爬取楼中楼回复
+    'reply_workers': 4,      # 并发爬取回复的线程数
+    'reply_min_count': 1,    # 回复数达到该值才爬取
+    # 多账号会话池（session_pool.py），账号文件存在时监控服务自动使用
+    'accounts_file': os.path.join(ROOT_DIR, 'data/accounts.json'),
+    'session_rpm': 20,                   # 单个账号每分钟请求数，账号文件中可单独设置
+    'session_failure_threshold': 3,      # 连续失败多少次后隔离
+    'session_quarantine_seconds': 300    # 首次隔离时长(秒)，之后逐次翻倍
 }
 
 # DeepSeek API配置
 ANALYZER_CONFIG = {
     'api_key': '',  # 运行时从UI获取
-    'output_dir': os.path.join(ROOT_DIR, 'data/analyzed_comments')
+    'base_url': os.environ.get('DEEPSEEK_BASE_URL', 'https://api.deepseek.com'),
+    'output_dir': os.path.join(ROOT_DIR, 'data/analyzed_comments'),
+    'sleep_time': 0.5,  # 两次API调用的间隔(秒)
+    'model': 'deepseek-chat',
+    # 情感分析的prompt，{text} 为评论文本(放在最后一行)
+    'prompt': '请分析下面这段文字的情感倾向(0表示积极,1表示中性,2表示消极),只需要返回数字:\n{text}',
+    'use_clean_text': True,  # 发给模型的是规范化后的文本(去掉表情代码、@、链接等)还是原文
+    'top_k': 100,  # 流式维护的点赞Top-K条数
+    'error_sentiment': -1,  # 分析失败的评论记为该值，并在error列写明原因
+    # 超过该大小(MB)的评论文件分块流式分析，每块分析完立即追加写入结果
+    'chunked_min_mb': 50,
+    'chunk_size': 20000,  # 每块的评论条数
+    # 分析进度检查点，停止或进程退出后可从中断处精确续跑
+    'checkpoint_dir': os.path.join(ROOT_DIR, 'data/checkpoints'),
+    'checkpoint_fsync_seconds': 1.0,  # 两次落盘的最短间隔，0表示每条都落盘
+    # token预算与用量统计
+    'budget': {
+        'max_tokens': 5,                 # 回复的最大token数，标签只有一个数字
+        'max_input_tokens': 512,         # 评论超过该token数时按策略截断
+        'truncate_policy': 'head_tail',  # none: 不截断; head: 保留开头; head_tail: 保留开头和结尾
+        'rpm': 0,                        # 每分钟请求数上限，0表示不限
+        'tpm': 0,                        # 每分钟token数上限，0表示不限
+        'price_per_million': {'prompt': 2.0, 'completion': 8.0}  # 每百万token价格(元)
+    },
+    # 近似重复评论聚类（MinHash + LSH）
+    'dedup': {
+        'enabled': True,
+        'num_perm': 64,    # MinHash签名长度
+        'bands': 16,       # LSH分段数
+        'threshold': 0.8,  # 签名相似度阈值
+        'max_anchors': 8   # 每个LSH桶内参与比较的簇数上限
+    },
+    # 分析顺序：关闭时按文件顺序；开启时按 点赞数、发布时间、簇大小 的加权得分从高到低
+    'priority': {
+        'enabled': False,
+        'weights': {'likes': 1.0, 'recency': 0.3, 'cluster': 0.5},
+        'interim_every': 50,  # 每分析多少条给出一次点赞加权的中途估计
+        'confidence': 0.95    # 中途估计统计区间的置信水平
+    }
+}
+
+# 分词词典配置（词云和查询接口共用）
+DICT_CONFIG = {
+    # 停用词表，每行一个词，# 开头为注释
+    'stopword_files': [os.path.join(ROOT_DIR, 'dicts/stopwords.txt')],
+    # jieba 用户词典，每行 "词语 [词频] [词性]"
+    'user_dict_files': [os.path.join(ROOT_DIR, 'dicts/user_dict.txt')],
+    'min_word_length': 2,       # 短于该长度的词不计入词云和高频词
+    'reload_check_seconds': 2.0  # 检查词典文件是否修改的最短间隔
+}
+
+# HTTP客户端配置（爬虫与分析器共用）
+HTTP_CONFIG = {
+    'connect_timeout': 5.0,    # 连接超时(秒)
+    'read_timeout': 30.0,      # 读取超时(秒)
+    'max_retries': 3,          # 失败后的最大重试次数
+    'backoff_base': 0.5,       # 指数退避基数(秒)
+    'backoff_max': 30.0,       # 单次退避上限(秒)
+    'retry_after_max': 120.0,  # Retry-After最长等待(秒)
+    'retry_statuses': (429, 500, 502, 503, 504),
+    'breaker_threshold': 5,    # 连续失败多少次后熔断
+    'breaker_reset': 30.0,     # 熔断后多久放行试探请求(秒)
+    'pool_size': 10,           # 默认每主机连接池大小
+    'host_pool_sizes': {
+        'weibo.com': 8,
+        'api.deepseek.com': 16
+    }
+}
+
+# 运行指标配置
+METRICS_CONFIG = {
+    'export_dir': os.path.join(ROOT_DIR, 'data/metrics'),  # 退出时写出快照的目录
+    'http_port': 0,       # 大于0时在该端口提供 /metrics 接口
+    'refresh_ms': 1000    # 状态栏指标刷新间隔(毫秒)
+}
+
+# 性能剖析配置（也可通过 --profile 或界面开关启用）
+PROFILE_CONFIG = {
+    'enabled': False,
+    'interval': 0.005,  # 调用栈采样间隔(秒)
+    'cprofile': True    # 是否同时输出cProfile统计
+}
+
+# 监控服务配置（monitor_daemon.py）
+MONITOR_CONFIG = {
+    'state_dir': os.path.join(ROOT_DIR, 'data/monitor'),  # 关注列表、已见评论和聚合结果
+    'workers': 2,              # 同时处理的微博数
+    'initial_interval': 300,   # 新加入微博的轮询间隔(秒)
+    'min_interval': 60,        # 热门微博的最短轮询间隔(秒)
+    'max_interval': 3600,      # 冷清微博的最长轮询间隔(秒)
+    'hot_threshold': 20,       # 一轮新增评论达到该数量时加快轮询
+    'max_attempts': 3,         # 评论分析失败后最多尝试的轮数，之后记为失败不再重试
+    'crawl_rpm': 60,           # 所有微博合计的爬取请求数/分钟，0表示不限
+    'history_size': 500,       # 每条微博保留的轮询记录数
+    'tick': 1.0                # 调度循环的检查间隔(秒)
+}
+
+# 本地查询接口配置（query_api.py）
+QUERY_API_CONFIG = {
+    'host': '127.0.0.1',
+    'port': 8090,
+    'index_path': os.path.join(ROOT_DIR, 'data/query_index.sqlite'),  # 分析结果的SQLite索引
+    'refresh_seconds': 2.0,   # 两次检查分析文件变化的最短间隔
+    'page_size': 50,          # 评论列表默认每页条数
+    'max_page_size': 500,
+    'cache_size': 256         # 缓存的响应个数
+}
+
+# 批量报告配置
+REPORT_CONFIG = {
+    'output_dir': os.path.join(ROOT_DIR, 'reports'),
+    'workers': 0,                  # 渲染进程数，0表示CPU核数
+    'sentiment_wordclouds': True,  # 除整体词云外，是否为每种情感各生成一张
+    'top_terms': 20,               # 索引页和统计中列出的高频词个数
+    'top_comments': 5              # 每种情感列出的高赞评论条数
+}
+
+# 大评论串的抽样估计：按 发布时间段 × 点赞层 分层随机抽样，只分析样本，给出带置信区间的情感分布
+ESTIMATOR_CONFIG = {
+    'output_dir': os.path.join(ROOT_DIR, 'data/estimates'),
+    'time_buckets': 6,           # 按发布时间等分成几段(每段评论数相近)
+    'like_tiers': [1, 10, 100],  # 点赞分层的下界：0、1-9、10-99、100以上
+    'initial_samples': 200,      # 第一轮按各层大小等比例抽样的条数
+    'min_per_stratum': 2,        # 每层至少抽取的条数，用于估计层内方差
+    'batch_min': 50,             # 之后每轮按层内方差(Neyman分配)追加，条数在此范围内
+    'batch_max': 1000,
+    'max_samples': 5000,         # 抽样总数上限
+    'target_width': 0.05,        # 各情感置信区间宽度(上限-下限)都不超过该值时停止
+    'stop_inflation': 1.1,       # 停止判断时区间宽度的放大倍数，抵消边抽样边检查带来的覆盖率损失
+    'confidence': 0.95,
+    'seed': 0                    # 随机种子，相同输入和配置抽到相同的样本
+}
+
+# 分析配置对比评测
+EVALUATION_CONFIG = {
+    'output_dir': os.path.join(ROOT_DIR, 'data/evaluation'),
+    'gold_file': os.path.join(ROOT_DIR, 'data/evaluation/gold.csv'),  # 人工标注集，含 content 和 label 列
+    'gold_long_ratio': 0.2,      # --make-gold 生成的合成标注集中长评论的占比
+    # 参与对比的分析配置，值为对 ANALYZER_CONFIG 的覆盖(嵌套的dict按键合并)
+    'variants': {
+        'baseline': {},
+        'raw_text': {'use_clean_text': False},
+        'short_prompt': {'prompt': '情感(0积极1中性2消极)，只回复数字:\n{text}'},
+        'no_dedup': {'dedup': {'enabled': False}},
+        # 合成标注集的长评论态度写在最后，只留开头会丢掉态度，留开头和结尾则基本不影响准确率
+        'head_16': {'budget': {'max_input_tokens': 16, 'truncate_policy': 'head'}},
+        'head_tail_16': {'budget': {'max_input_tokens': 16, 'truncate_policy': 'head_tail'}}
+    }
 }
 
 # 可视化配置
 CHART_CONFIG = {
     'charts_dir': os.path.join(ROOT_DIR, 'charts'),
+    # 指定中文字体文件，留空则自动查找
+    'font_path': os.environ.get('WEIBO_FONT_PATH', ''),
+    'font_cache': os.path.join(ROOT_DIR, 'data/font_cache.json'),  # 自动查找结果的缓存
     'chart_size': (640, 480),
     'colors': {
         'positive': '#2ecc71',
@@ -42,7 +202,10 @@ UI_CONFIG = {
     'window_size': '1400x800',
     'min_size': (1200, 600),
     'padding': 10,
-    'font': ('SimHei', 9)  # 添加字体配置
+    'font': ('SimHei', 9),  # 添加字体配置
+    'top_k': 100,  # 按点赞筛选时显示的条数
+    'preload_delay_ms': 200,   # 窗口显示后多久开始后台预加载重量级依赖
+    'import_budget_ms': 300    # 导入main模块的耗时上限，见 benchmarks/bench_startup.py
 }
 
 # 错误消息配置
@@ -54,7 +217,8 @@ ERROR_MESSAGES = {
     'no_analysis': '请先进行情感分析',
     'invalid_url': '无效的URL格式',
     'network_error': '网络连接错误',
-    'api_error': 'API调用失败'
+    'api_error': 'API调用失败',
+    'analysis_failed': '分析失败'
 }
 
 # 文件路径配置
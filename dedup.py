@@ -0,0 +1,142 @@
+import math
+import re
+import zlib
+from itertools import chain
+from lazy_modules import lazy_import
+from text_normalizer import EMOTICON_PATTERN, MENTION_PATTERN, URL_PATTERN
+
+np = lazy_import('numpy')
+
+# 只保留文字和数字，标点、emoji、空白全部去掉
+NON_WORD_PATTERN = re.compile(r'[\W_]+')
+
+# MinHash 使用的梅森素数
+_MERSENNE_PRIME = (1 << 31) - 1
+
+
+def canonicalize(text):
+    """规范化评论文本，用于判断近似重复
+
+    传入已经过 text_normalizer 处理的 clean_text 时，前三步不会再有匹配。
+    """
+    text = str(text)
+    text = URL_PATTERN.sub('', text)
+    text = MENTION_PATTERN.sub('', text)
+    text = EMOTICON_PATTERN.sub('', text)
+    text = NON_WORD_PATTERN.sub('', text)
+    return text.lower()
+
+
+class _UnionFind:
+    """并查集，根节点总是取下标最小的成员"""
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return
+        if ra < rb:
+            self.parent[rb] = ra
+        else:
+            self.parent[ra] = rb
+
+
+class CommentDeduplicator:
+    """基于 MinHash + LSH 的近似重复评论聚类"""
+
+    def __init__(self, num_perm=64, bands=16, threshold=0.8, shingle_size=3, seed=1, max_anchors=8):
+        if num_perm % bands:
+            raise ValueError("num_perm 必须能被 bands 整除")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.max_anchors = max_anchors
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self._a = None
+        self._b = None
+
+    def _hash_params(self):
+        """MinHash 的随机排列参数，首次使用时生成"""
+        if self._a is None:
+            rng = np.random.RandomState(self.seed)
+            self._a = rng.randint(1, _MERSENNE_PRIME, size=self.num_perm).astype(np.uint64)
+            self._b = rng.randint(0, _MERSENNE_PRIME, size=self.num_perm).astype(np.uint64)
+        return self._a, self._b
+
+    def _shingles(self, text):
+        """字符级 n-gram，短文本退化为整串"""
+        size = self.shingle_size
+        if len(text) <= size:
+            return {text}
+        return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+    def signature(self, text):
+        """计算单条文本的 MinHash 签名"""
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode('utf-8')) % _MERSENNE_PRIME for s in self._shingles(text)),
+            dtype=np.uint64
+        )
+        a, b = self._hash_params()
+        values = (np.outer(a, hashes) + b[:, None]) % _MERSENNE_PRIME
+        return values.min(axis=1)
+
+    def cluster(self, texts, raw=None):
+        """对文本聚类
+
+        Args:
+            texts: 评论文本序列，可以是原文或 clean_text
+            raw: texts 为 clean_text 时对应的原文，规范化后为空的评论按原文精确合并
+
+        Returns:
+            与输入等长的 numpy 数组，每个元素为所属簇代表（簇内第一条）的下标
+        """
+        n = len(texts)
+        uf = _UnionFind(n)
+
+        # 第一步：规范化后完全相同的直接合并
+        exact = {}
+        canonical = []
+        for idx, text in enumerate(texts):
+            key = canonicalize(text)
+            if not key:
+                # 纯表情等规范化后为空的评论，只按原文精确合并
+                key = '\0' + str(text if raw is None else raw[idx]).strip()
+            canonical.append(key)
+            if key in exact:
+                uf.union(exact[key], idx)
+            else:
+                exact[key] = idx
+
+        # 第二步：对每个精确簇的代表做 MinHash + LSH 找近似重复
+        reps = [idx for idx in exact.values() if not canonical[idx].startswith('\0')]
+        if reps:
+            signatures = np.stack([self.signature(canonical[idx]) for idx in reps])
+            min_equal = math.ceil(self.threshold * self.num_perm - 1e-9)  # 相似度达到阈值所需的相同位数
+            # 按下标顺序处理，每个代表与共享某个LSH桶的锚点比较。锚点是桶内的第一个成员，
+            # 以及进入桶时与已有锚点都不相似的成员(各簇在桶内的第一个成员)，
+            # 桶内第一个成员与其余成员不相似时，其余成员之间仍能合并。
+            # 每桶最多 max_anchors 个锚点，大量相似度略低于阈值的刷屏评论落在同一个桶时比较次数不会平方增长
+            anchors = {}  # (band, 签名片段) -> 锚点在 reps 中的位置
+            for pos, sig in enumerate(signatures):
+                keys = [(band, sig[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+                buckets = [anchors.setdefault(key, []) for key in keys]
+                candidates = np.unique(np.fromiter(chain.from_iterable(buckets), dtype=np.int64))
+                hits = candidates[(signatures[candidates] == sig).sum(axis=1) >= min_equal].tolist()
+                for anchor in hits:
+                    uf.union(reps[anchor], reps[pos])
+                for bucket in buckets:
+                    if not bucket or (not hits and len(bucket) < self.max_anchors):
+                        bucket.append(pos)
+
+        return np.array([uf.find(idx) for idx in range(n)], dtype=np.int64)
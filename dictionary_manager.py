@@ -0,0 +1,134 @@
+"""分词词典管理
+
+停用词表和 jieba 用户词典(网络用语、话题名等)放在 dicts/ 下的文本文件里，进程内只加载一次：
+停用词编译成 frozenset，用户词典载入一个独立的 jieba.Tokenizer。
+每次分词前最多每隔 reload_check_seconds 检查一次文件修改时间，改动后重新加载并整体替换，
+正在进行的分词不受影响。词云和查询接口共用同一个管理器。
+"""
+import os
+import threading
+import time
+
+from config import DICT_CONFIG
+from lazy_modules import lazy_import
+
+jieba = lazy_import('jieba')
+
+
+def read_word_list(path):
+    """读取词表文件，每行一个词，忽略空行和 # 开头的注释"""
+    words = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            word = line.strip()
+            if word and not word.startswith('#'):
+                words.append(word)
+    return words
+
+
+def _mtimes(paths):
+    """文件修改时间，文件不存在时为None"""
+    stamps = []
+    for path in paths:
+        try:
+            stamps.append(os.stat(path).st_mtime_ns)
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+class DictionaryManager:
+    """停用词与用户词典，文件修改后自动重新加载"""
+
+    def __init__(self, config=None):
+        self.config = config or DICT_CONFIG
+        self.stopwords = frozenset()
+        self._tokenizer = None
+        self._stopword_mtimes = None
+        self._user_dict_mtimes = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _load_stopwords(self):
+        words = set()
+        for path in self.config['stopword_files']:
+            if os.path.exists(path):
+                try:
+                    words.update(read_word_list(path))
+                except (OSError, UnicodeDecodeError) as e:
+                    print(f"读取停用词表失败({path}): {str(e)}")
+        return frozenset(words)
+
+    def _build_tokenizer(self):
+        """新建分词器并载入用户词典，主词典使用 jieba 的磁盘缓存"""
+        tokenizer = jieba.Tokenizer()
+        tokenizer.initialize()
+        for path in self.config['user_dict_files']:
+            if os.path.exists(path):
+                try:
+                    tokenizer.load_userdict(path)
+                except (OSError, ValueError, UnicodeDecodeError) as e:
+                    print(f"加载用户词典失败({path}): {str(e)}")
+        return tokenizer
+
+    def refresh(self, force=False):
+        """检查词典文件，有修改时重新加载
+
+        Returns:
+            是否重新加载了任一词典
+        """
+        now = time.monotonic()
+        if not force and self._tokenizer is not None \
+                and now - self._checked_at < self.config['reload_check_seconds']:
+            return False
+        with self._lock:
+            self._checked_at = now
+            changed = False
+            stopword_mtimes = _mtimes(self.config['stopword_files'])
+            if force or stopword_mtimes != self._stopword_mtimes:
+                self.stopwords = self._load_stopwords()
+                self._stopword_mtimes = stopword_mtimes
+                changed = True
+            user_dict_mtimes = _mtimes(self.config['user_dict_files'])
+            if force or self._tokenizer is None or user_dict_mtimes != self._user_dict_mtimes:
+                # 建好新分词器再替换，其他线程在此期间继续用旧的
+                self._tokenizer = self._build_tokenizer()
+                self._user_dict_mtimes = user_dict_mtimes
+                changed = True
+            return changed
+
+    def warmup(self):
+        """加载词典并初始化分词器，可在后台线程提前调用"""
+        self.refresh()
+        return self
+
+    @property
+    def tokenizer(self):
+        self.refresh()
+        return self._tokenizer
+
+    def cut(self, text):
+        """分词，返回生成器"""
+        return self.tokenizer.cut(text)
+
+    def words(self, text):
+        """分词并去掉停用词和过短的词"""
+        tokenizer = self.tokenizer
+        stopwords = self.stopwords
+        min_length = self.config['min_word_length']
+        return [word for word in tokenizer.cut(text)
+                if len(word) >= min_length and word not in stopwords]
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_dictionary_manager():
+    """进程内共享的词典管理器"""
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = DictionaryManager()
+    return _manager
@@ -0,0 +1,243 @@
+"""分析配置的对比评测
+
+用一份人工标注的评论集(CSV，含 content 和 label 列，label 为 0/1/2)依次运行多个分析配置，
+把准确率、各类F1与API调用次数、token用量、费用、耗时放在同一张表里，
+批处理、换模型、缩短prompt等省钱提速的改动是否影响准确率一目了然。
+
+可以对接真实接口、本地模拟接口(--mock)，或用 --cassette 回放录制的响应(见 http_cassette)：
+先对真实接口录制一次，之后调整评测代码时反复回放，不再产生费用。
+没有标注集时可用 --make-gold 生成合成标注集，标准答案与模拟接口的打标签规则一致。
+
+用法:
+    python evaluation.py --mock --make-gold 2000
+    python evaluation.py --mock --variants baseline short_prompt --latency 0.01
+    python evaluation.py --gold data/evaluation/gold.csv --variants-file variants.json
+    python evaluation.py --cassette data/cassettes/eval.sqlite --cassette-mode replay
+"""
+import argparse
+import copy
+import json
+import os
+import tempfile
+import time
+
+from api_cli import add_api_arguments, api_target
+from config import ANALYZER_CONFIG, CHART_CONFIG, EVALUATION_CONFIG
+from lazy_modules import lazy_import
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
+
+LABELS = CHART_CONFIG['labels']
+
+
+def merge_config(base, overrides):
+    """返回 base 的副本，嵌套的dict按键合并"""
+    merged = copy.deepcopy(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_config(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def make_gold(path, size, seed=0, long_ratio=None):
+    """生成合成标注集，标签按模拟接口的规则给出
+
+    Args:
+        long_ratio: 长评论的占比，默认取 EVALUATION_CONFIG['gold_long_ratio']。
+            长评论在原文前加一段中性铺垫，态度写在最后，截断配置在这部分评论上才有差别
+    """
+    from mock_servers import NEUTRAL_WORDS, label_text, make_comment
+    if long_ratio is None:
+        long_ratio = EVALUATION_CONFIG['gold_long_ratio']
+    rng = np.random.default_rng(seed)
+    rows = []
+    for idx in range(size):
+        comment = make_comment(seed, idx)
+        text = comment['text_raw']
+        if rng.random() < long_ratio:
+            # 中性词不改变情感词计数，标签与原文相同
+            text = ''.join(rng.choice(NEUTRAL_WORDS, rng.integers(20, 60))) + '。' + text
+        rows.append({
+            'comment_id': comment['id'],
+            'content': text,
+            'created_at': comment['created_at'],
+            'user_name': comment['user']['screen_name'],
+            'like_count': comment['like_counts'],
+            'label': label_text(text)
+        })
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    pd.DataFrame(rows).to_csv(path, index=False, encoding='utf-8-sig')
+    return path
+
+
+def load_gold(path):
+    """读取标注集，补齐分析器需要的列，评论id按行号重新编排
+
+    Raises:
+        ValueError: 缺少 content/label 列或标签不是 0/1/2
+    """
+    gold = pd.read_csv(path, dtype={'content': str}, keep_default_na=False)
+    missing = {'content', 'label'} - set(gold.columns)
+    if missing:
+        raise ValueError(f"标注集缺少列: {', '.join(sorted(missing))}")
+    gold['label'] = pd.to_numeric(gold['label'], errors='coerce')
+    if not gold['label'].isin(list(LABELS)).all():
+        raise ValueError(f"标注集的 label 只能是 {sorted(LABELS)}")
+    gold['label'] = gold['label'].astype(int)
+    # 检查点按评论id记录，标注集中的id可能重复或缺失
+    gold['comment_id'] = np.arange(1, len(gold) + 1)
+    gold['parent_id'] = 0
+    for column, default in (('created_at', ''), ('user_name', ''), ('like_count', 0)):
+        if column not in gold:
+            gold[column] = default
+    return gold
+
+
+def score(labels, predictions):
+    """准确率、各类精确率/召回率/F1 和宏平均F1，分析失败(-1)计为错误"""
+    labels = np.asarray(labels)
+    predictions = np.asarray(predictions)
+    result = {
+        'accuracy': float((labels == predictions).mean()) if len(labels) else 0.0,
+        'failed': int((~np.isin(predictions, list(LABELS))).sum()),
+        'classes': {}
+    }
+    for label in LABELS:
+        tp = int(((predictions == label) & (labels == label)).sum())
+        predicted = int((predictions == label).sum())
+        actual = int((labels == label).sum())
+        precision = tp / predicted if predicted else 0.0
+        recall = tp / actual if actual else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        result['classes'][str(label)] = {'precision': precision, 'recall': recall, 'f1': f1, 'support': actual}
+    result['macro_f1'] = sum(item['f1'] for item in result['classes'].values()) / len(LABELS)
+    return result
+
+
+def run_variant(name, overrides, gold, gold_file, base_url, api_key, workdir, sleep_time=None):
+    """用一个分析配置跑完整个标注集，返回指标"""
+    from comment_store import CommentStore
+    from sentiment_analyzer import SentimentAnalyzer
+    config = merge_config(ANALYZER_CONFIG, overrides)
+    config.update(
+        base_url=base_url or config['base_url'],
+        output_dir=os.path.join(workdir, name),
+        checkpoint_dir=os.path.join(workdir, name, 'checkpoints'),
+        chunked_min_mb=float('inf')  # 结果要和标注逐行对齐，不走分块模式
+    )
+    if sleep_time is not None:
+        config['sleep_time'] = sleep_time
+    analyzer = SentimentAnalyzer(config)
+    analyzer.set_api_key(api_key)
+    store = CommentStore.from_dataframe(gold)
+
+    start = time.perf_counter()
+    output_file = analyzer.analyze_comments(gold_file, store=store)
+    elapsed = time.perf_counter() - start
+    if not output_file:
+        raise RuntimeError(f"配置 {name} 分析未完成")
+
+    predictions = np.frombuffer(store.sentiment, dtype=np.int8)
+    usage = analyzer.usage
+    return dict(
+        score(gold['label'].to_numpy(), predictions),
+        variant=name,
+        overrides=overrides,
+        comments=len(gold),
+        calls=usage.requests,
+        prompt_tokens=usage.prompt_tokens,
+        completion_tokens=usage.completion_tokens,
+        truncated=usage.truncated,
+        cost=usage.cost,
+        seconds=elapsed,
+        comments_per_s=len(gold) / elapsed if elapsed else 0.0
+    )
+
+
+def format_table(results):
+    """多个配置的结果并排显示"""
+    header = (f"{'配置':<14}{'准确率':>8}{'宏F1':>8}"
+              + ''.join(f"{'F1' + label:>8}" for label in LABELS.values())
+              + f"{'失败':>6}{'调用':>8}{'token':>10}{'费用(元)':>10}{'耗时(s)':>9}")
+    lines = [header, '-' * 100]
+    for item in results:
+        lines.append(
+            f"{item['variant']:<16}{item['accuracy']:>9.3f}{item['macro_f1']:>9.3f}"
+            + ''.join(f"{item['classes'][str(label)]['f1']:>9.3f}" for label in LABELS)
+            + f"{item['failed']:>7}{item['calls']:>9}{item['prompt_tokens'] + item['completion_tokens']:>11}"
+            f"{item['cost']:>12.4f}{item['seconds']:>10.2f}"
+        )
+    return '\n'.join(lines)
+
+
+def evaluate(gold_file, variants, base_url=None, api_key=None, sleep_time=None):
+    """依次运行各配置
+
+    Args:
+        variants: {名称: 对 ANALYZER_CONFIG 的覆盖}
+
+    Returns:
+        各配置的指标列表
+    """
+    gold = load_gold(gold_file)
+    results = []
+    with tempfile.TemporaryDirectory(prefix='evaluation_') as workdir:
+        # 分析器读取的输入文件，与标注集逐行对应
+        input_file = os.path.join(workdir, 'gold_input.csv')
+        gold.drop(columns=['label']).to_csv(input_file, index=False, encoding='utf-8-sig')
+        for name, overrides in variants.items():
+            print(f"评测 {name} ...")
+            try:
+                results.append(run_variant(name, overrides, gold, input_file, base_url, api_key,
+                                           workdir, sleep_time))
+            except Exception as e:
+                print(f"评测 {name} 失败: {str(e)}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分析配置的准确率与开销对比')
+    parser.add_argument('--gold', default=EVALUATION_CONFIG['gold_file'], help='标注集CSV(content, label)')
+    parser.add_argument('--make-gold', type=int, metavar='N', help='生成N条合成标注集到 --gold 路径')
+    parser.add_argument('--variants', nargs='+', help='只运行这些配置，默认全部')
+    parser.add_argument('--variants-file', help='JSON文件 {名称: 配置覆盖}，代替内置配置')
+    parser.add_argument('--base-url', help='DeepSeek接口地址，默认读取配置')
+    add_api_arguments(parser)
+    parser.add_argument('--output', help='结果JSON，默认 data/evaluation/eval_<时间>.json')
+    args = parser.parse_args()
+
+    if args.make_gold:
+        make_gold(args.gold, args.make_gold)
+        print(f"已生成标注集: {args.gold}")
+    if not os.path.exists(args.gold):
+        parser.error(f"标注集不存在: {args.gold}")
+
+    variants = EVALUATION_CONFIG['variants']
+    if args.variants_file:
+        with open(args.variants_file, encoding='utf-8') as f:
+            variants = json.load(f)
+    if args.variants:
+        unknown = set(args.variants) - set(variants)
+        if unknown:
+            parser.error(f"未知的配置: {', '.join(sorted(unknown))}")
+        variants = {name: variants[name] for name in args.variants}
+
+    with api_target(parser, args) as target:
+        results = evaluate(args.gold, variants, target['base_url'] or args.base_url,
+                           target['api_key'], target['sleep_time'])
+
+    print(format_table(results))
+    output = args.output or os.path.join(EVALUATION_CONFIG['output_dir'], f'eval_{int(time.time())}.json')
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'gold': os.path.abspath(args.gold), 'results': results}, f, ensure_ascii=False, indent=2)
+    print(f"结果已保存至: {output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+"""跨平台中文字体查找
+
+启动后首次需要字体时扫描系统和 matplotlib 的字体目录，找出含中文字形的字体，
+扫描不到时再用 fc-list 兜底。结果缓存在磁盘上，之后直接读取缓存，不再重复探测文件系统。
+matplotlib 和 WordCloud 共用同一个字体。
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from config import CHART_CONFIG
+from lazy_modules import lazy_import
+
+ft2font = lazy_import('matplotlib.ft2font')
+font_manager = lazy_import('matplotlib.font_manager')
+plt = lazy_import('matplotlib.pyplot', on_load=lambda: __import__('matplotlib').use('Agg'))
+
+FONT_EXTENSIONS = ('.ttf', '.ttc', '.otf')
+
+# 常见中文字体文件名(小写)，按优先级排列
+PREFERRED_FONTS = (
+    'simhei', 'msyh', 'simsun', 'simyou',
+    'pingfang', 'hiragino sans gb', 'stheiti',
+    'notosanscjk', 'notosanssc', 'sourcehansans', 'sourcehansc',
+    'wqy-microhei', 'wqy-zenhei', 'droidsansfallback', 'arplumingcn', 'uming'
+)
+
+# 用于判断字体是否支持中文的字符
+_PROBE_CHARS = '中文评论'
+
+
+def font_directories():
+    """当前平台的字体目录"""
+    home = os.path.expanduser('~')
+    if sys.platform.startswith('win'):
+        windir = os.environ.get('WINDIR', 'C:/Windows')
+        dirs = [
+            os.path.join(windir, 'Fonts'),
+            os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Microsoft', 'Windows', 'Fonts')
+        ]
+    elif sys.platform == 'darwin':
+        dirs = ['/System/Library/Fonts', '/Library/Fonts', os.path.join(home, 'Library/Fonts')]
+    else:
+        dirs = [
+            '/usr/share/fonts', '/usr/local/share/fonts',
+            os.path.join(home, '.fonts'), os.path.join(home, '.local/share/fonts')
+        ]
+    try:
+        import matplotlib
+        dirs.append(os.path.join(matplotlib.get_data_path(), 'fonts', 'ttf'))
+    except ImportError:
+        pass
+    return [d for d in dirs if d and os.path.isdir(d)]
+
+
+def supports_chinese(path):
+    """读取字体字符表，判断是否包含中文字形"""
+    try:
+        charmap = ft2font.FT2Font(path).get_charmap()
+    except Exception:
+        return False
+    glyphs = [charmap.get(ord(char)) for char in _PROBE_CHARS]
+    # LastResort 之类的兜底字体把所有字符映射到同一个占位字形，要求各字字形互不相同
+    return None not in glyphs and len(set(glyphs)) == len(glyphs)
+
+
+def _preference(path):
+    """文件名越靠前的字体优先级越高，未知字体排在最后"""
+    name = os.path.basename(path).lower().replace(' ', '')
+    for rank, preferred in enumerate(PREFERRED_FONTS):
+        if preferred.replace(' ', '') in name:
+            return rank
+    return len(PREFERRED_FONTS)
+
+
+def scan_font_files():
+    """列出所有字体目录下的字体文件"""
+    files = []
+    for directory in font_directories():
+        for root, _, names in os.walk(directory):
+            for name in names:
+                if name.lower().endswith(FONT_EXTENSIONS):
+                    files.append(os.path.join(root, name))
+    return files
+
+
+def fc_list_fonts():
+    """用 fontconfig 查询中文字体，系统没有 fc-list 时返回空列表"""
+    try:
+        output = subprocess.check_output(
+            ['fc-list', ':lang=zh', 'file'], text=True, stderr=subprocess.DEVNULL, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return []
+    return [line.split(':', 1)[0].strip() for line in output.splitlines() if line.strip()]
+
+
+class FontRegistry:
+    """中文字体注册表，整个进程只扫描一次"""
+
+    def __init__(self, config=None):
+        self.config = config or CHART_CONFIG
+        self._path = None
+        self._family = None
+        self._resolved = False
+        self._matplotlib_ready = False
+        self._lock = threading.Lock()
+
+    def _load_cache(self):
+        cache_file = self.config['font_cache']
+        try:
+            with open(cache_file, encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        path = cached.get('path')
+        if path and os.path.exists(path):
+            return path
+        return None
+
+    def _save_cache(self, path):
+        cache_file = self.config['font_cache']
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            with open(cache_file, 'w', encoding='utf-8') as f:
+                json.dump({'path': path}, f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            print(f"保存字体缓存失败: {str(e)}")
+
+    def _discover(self):
+        """按优先级扫描字体目录，返回第一个支持中文的字体，找不到时用fc-list兜底"""
+        for path in sorted(scan_font_files(), key=_preference):
+            if supports_chinese(path):
+                return path
+        candidates = sorted((p for p in fc_list_fonts() if os.path.exists(p)), key=_preference)
+        return candidates[0] if candidates else None
+
+    def _resolve(self):
+        # 配置覆盖 > 磁盘缓存 > 扫描
+        override = self.config.get('font_path')
+        if override:
+            if os.path.exists(override):
+                return override
+            print(f"配置的字体不存在: {override}")
+
+        cached = self._load_cache()
+        if cached:
+            return cached
+
+        path = self._discover()
+        if path:
+            self._save_cache(path)
+        return path
+
+    @property
+    def font_path(self):
+        """中文字体文件路径，没有可用字体时为None"""
+        if not self._resolved:
+            with self._lock:
+                if not self._resolved:
+                    self._path = self._resolve()
+                    self._resolved = True
+        return self._path
+
+    @property
+    def family(self):
+        """字体族名，用于 matplotlib 的 rcParams"""
+        if self._family is None and self.font_path:
+            try:
+                self._family = ft2font.FT2Font(self.font_path).family_name
+            except Exception as e:
+                print(f"读取字体族名失败: {str(e)}")
+        return self._family
+
+    def apply_matplotlib(self):
+        """把字体注册到 matplotlib 并设为默认无衬线字体，只执行一次"""
+        if self._matplotlib_ready:
+            return self.family
+        family = self.family
+        if family:
+            font_manager.fontManager.addfont(self.font_path)
+            sans_serif = [name for name in plt.rcParams['font.sans-serif'] if name != family]
+            plt.rcParams['font.sans-serif'] = [family] + sans_serif
+        plt.rcParams['axes.unicode_minus'] = False
+        self._matplotlib_ready = True
+        return family
+
+    def refresh(self):
+        """忽略缓存重新扫描"""
+        with self._lock:
+            self._path = self._discover()
+            self._family = None
+            self._resolved = True
+            self._matplotlib_ready = False
+            if self._path:
+                self._save_cache(self._path)
+        return self._path
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_font_registry():
+    """进程内共享的字体注册表"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = FontRegistry()
+    return _registry
@@ -0,0 +1,172 @@
+"""HTTP请求的录制与回放
+
+把 请求 -> 响应 保存在一个SQLite文件里(响应体zlib压缩，按请求摘要建主键索引)，
+之后可以完全从磁盘回放，不再访问微博和DeepSeek：改完代码重跑分析、回归对比和基准测试都可复现，
+回放时跳过爬虫/分析器的节流等待和速率预算，按CPU速度运行。
+
+请求摘要由方法、路径、排序后的查询参数和请求体(JSON按键排序)计算，不含主机名和请求头，
+因此模拟接口换了端口、换了账号Cookie或API Key仍能命中，录制文件里也不保存这些凭据。
+相同的请求只保存最后一次的响应。
+
+模式:
+    record  总是请求网络并保存响应
+    replay  只从录制文件读取，没有录制的请求抛出 CassetteMissError
+    once    有录制时回放，没有时请求网络并保存
+
+用法:
+    from http_cassette import use_cassette
+    with use_cassette('data/cassettes/run.sqlite', 'once'):
+        ...
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+import http_client
+from http_client import HttpError
+from lazy_modules import lazy_import
+from metrics import METRICS
+
+requests = lazy_import('requests')
+
+MODES = ('record', 'replay', 'once')
+# 回放时还原的响应头，其余的(Set-Cookie等)不保存
+KEPT_HEADERS = ('Content-Type', 'Retry-After')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS interactions (
+    key TEXT PRIMARY KEY, method TEXT, path TEXT, status INTEGER,
+    headers TEXT, body BLOB, recorded_at REAL
+);
+"""
+
+
+class CassetteMissError(HttpError):
+    """回放模式下请求没有录制"""
+
+
+def request_key(method, url, kwargs):
+    """请求摘要，与主机名、请求头和超时设置无关"""
+    parsed = urlparse(url)
+    query = parse_qsl(parsed.query, keep_blank_values=True)
+    params = kwargs.get('params') or {}
+    query.extend((str(key), str(value)) for key, value in
+                 (params.items() if isinstance(params, dict) else params))
+    if kwargs.get('json') is not None:
+        body = json.dumps(kwargs['json'], sort_keys=True, ensure_ascii=False)
+    else:
+        body = kwargs.get('data') or ''
+        if isinstance(body, dict):
+            body = urlencode(sorted(body.items()))
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    digest = hashlib.sha1(f'{method.upper()} {parsed.path}?{urlencode(sorted(query))}\n'.encode('utf-8'))
+    digest.update(body)
+    return digest.hexdigest(), parsed.path
+
+
+class Cassette:
+    """一个录制文件，可在多个线程和多个 HttpClient 间共用"""
+
+    def __init__(self, path, mode='once'):
+        if mode not in MODES:
+            raise ValueError(f"未知的录制模式: {mode}")
+        if mode == 'replay' and not os.path.exists(path):
+            raise FileNotFoundError(f"录制文件不存在: {path}")
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.mode = mode
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    @property
+    def replaying(self):
+        return self.mode == 'replay'
+
+    def lookup(self, method, url, kwargs):
+        """查找录制的响应
+
+        Returns:
+            requests.Response，record 模式或 once 模式未命中时返回None
+
+        Raises:
+            CassetteMissError: replay 模式下没有录制该请求
+        """
+        if self.mode == 'record':
+            return None
+        key, path = request_key(method, url, kwargs)
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT status, headers, body FROM interactions WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if row is None:
+            METRICS.counter('http_cassette_total', result='miss').inc()
+            if self.mode == 'replay':
+                raise CassetteMissError(f"录制文件中没有该请求: {method} {path}")
+            return None
+        METRICS.counter('http_cassette_total', result='hit').inc()
+        status, headers, body = row
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(json.loads(headers))
+        response._content = zlib.decompress(body)
+        response.encoding = 'utf-8'
+        response.url = url
+        return response
+
+    def record(self, method, url, kwargs, response):
+        """保存一次请求的响应，replay 模式下忽略"""
+        if self.mode == 'replay':
+            return
+        key, path = request_key(method, url, kwargs)
+        headers = {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+        with self._lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO interactions VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, method.upper(), path, response.status_code, json.dumps(headers),
+                 zlib.compress(response.content), time.time())
+            )
+            self.conn.commit()
+            self.recorded += 1
+        METRICS.counter('http_cassette_total', result='recorded').inc()
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute('SELECT COUNT(*) FROM interactions').fetchone()[0]
+
+    def summary(self):
+        return f"录制文件 {self.path}({self.mode}): 命中 {self.hits} 次 | 未命中 {self.misses} 次 | 新录制 {self.recorded} 条"
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+@contextmanager
+def use_cassette(path, mode='once'):
+    """在 with 块内让所有 HttpClient 经过录制/回放层"""
+    cassette = Cassette(path, mode)
+    http_client.set_cassette(cassette)
+    try:
+        yield cassette
+    finally:
+        http_client.set_cassette(None)
+        print(cassette.summary())
+        cassette.close()
@@ -0,0 +1,224 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from config import HTTP_CONFIG
+from lazy_modules import lazy_import
+from metrics import METRICS
+
+requests = lazy_import('requests')
+
+# 进程内共用的录制/回放层(见 http_cassette)，为None时直接请求网络
+_cassette = None
+
+
+def set_cassette(cassette):
+    """为所有 HttpClient 设置录制/回放层，传入None取消"""
+    global _cassette
+    _cassette = cassette
+
+
+def get_cassette():
+    return _cassette
+
+
+def replaying():
+    """当前是否从录制文件回放响应，回放时不需要节流等待"""
+    return _cassette is not None and _cassette.replaying
+
+
+def pause(seconds):
+    """请求之间的节流等待，回放时跳过"""
+    if seconds > 0 and not replaying():
+        time.sleep(seconds)
+
+
+class HttpError(Exception):
+    """请求在重试后仍然失败"""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class CircuitOpenError(HttpError):
+    """熔断器打开，请求被直接拒绝"""
+
+
+class CircuitBreaker:
+    """单个主机的熔断器
+
+    连续失败达到阈值后打开，冷却时间过后放行一次试探请求（半开），
+    试探成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """是否允许发出请求"""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                return True
+            if self.state == self.HALF_OPEN:
+                # 半开状态只放行一个试探请求
+                return False
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class HttpClient:
+    """带连接池、超时、重试和熔断的HTTP客户端，爬虫和分析器共用"""
+
+    def __init__(self, config=None):
+        self.config = config or HTTP_CONFIG
+        self._session = None
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """连接池化的Session，首次请求时创建"""
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    self._session = self._create_session()
+        return self._session
+
+    def _create_session(self):
+        session = requests.Session()
+        # 按主机设置连接池大小
+        default_size = self.config['pool_size']
+        for prefix in ('http://', 'https://'):
+            session.mount(prefix, requests.adapters.HTTPAdapter(
+                pool_connections=default_size, pool_maxsize=default_size
+            ))
+        for host, size in self.config['host_pool_sizes'].items():
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=size)
+            session.mount(f'https://{host}/', adapter)
+            session.mount(f'http://{host}/', adapter)
+        return session
+
+    def _breaker(self, host):
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(
+                    self.config['breaker_threshold'],
+                    self.config['breaker_reset']
+                )
+                self._breakers[host] = breaker
+            return breaker
+
+    def _backoff(self, attempt):
+        """指数退避，取全抖动避免多个线程同时重试"""
+        cap = min(self.config['backoff_max'], self.config['backoff_base'] * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    @staticmethod
+    def _retry_after(response):
+        """解析Retry-After头，支持秒数和HTTP日期两种格式"""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            pass
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+    def request(self, method, url, **kwargs):
+        """发送请求，失败时按配置重试
+
+        设置了录制/回放层时先查找录制的响应，命中则直接返回，不占用连接和熔断器。
+
+        Returns:
+            requests.Response，状态码为可重试错误时会重试直到用尽次数
+
+        Raises:
+            CircuitOpenError: 目标主机熔断中
+            HttpError: 重试用尽仍然失败，或回放时没有录制该请求
+        """
+        cassette = _cassette
+        if cassette is not None:
+            response = cassette.lookup(method, url, kwargs)
+            if response is not None:
+                return response
+
+        host = urlparse(url).netloc
+        breaker = self._breaker(host)
+        if not breaker.allow():
+            METRICS.counter('http_circuit_rejections_total', host=host).inc()
+            raise CircuitOpenError(f"{host} 熔断中，暂停请求")
+
+        kwargs.setdefault('timeout', (self.config['connect_timeout'], self.config['read_timeout']))
+        retries = self.config['max_retries']
+        last_error = None
+
+        for attempt in range(retries + 1):
+            delay = None
+            if attempt:
+                METRICS.counter('http_retries_total', host=host).inc()
+            try:
+                with METRICS.timer('http_request_seconds', host=host):
+                    response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                # 包括连接/超时以及分块编码、解压、重定向过多等错误，都要计入熔断器，
+                # 否则半开状态的试探请求失败后熔断器永远停在半开
+                METRICS.counter('http_requests_total', host=host, status='error').inc()
+                last_error = HttpError(f"{method} {url} 请求失败: {str(e)}")
+            else:
+                METRICS.counter('http_requests_total', host=host, status=response.status_code).inc()
+                if response.status_code not in self.config['retry_statuses']:
+                    breaker.record_success()
+                    if cassette is not None:
+                        cassette.record(method, url, kwargs, response)
+                    return response
+                last_error = HttpError(
+                    f"{method} {url} 返回 {response.status_code}",
+                    status_code=response.status_code
+                )
+                retry_after = self._retry_after(response)
+                if retry_after is not None:
+                    delay = min(retry_after, self.config['retry_after_max'])
+
+            if attempt < retries:
+                time.sleep(delay if delay is not None else self._backoff(attempt))
+
+        breaker.record_failure()
+        METRICS.counter('http_failures_total', host=host).inc()
+        raise last_error
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
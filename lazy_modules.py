@@ -0,0 +1,78 @@
+"""重量级依赖的延迟导入
+
+pandas、matplotlib、jieba 等库导入耗时较长，直接在模块顶部导入会拖慢窗口出现。
+用 lazy_import 代替 import，首次访问属性时才真正加载；
+窗口显示后可调用 preload_all 在后台线程提前加载。
+"""
+import importlib
+import threading
+import types
+
+_registry = []
+
+
+class LazyModule(types.ModuleType):
+    """模块代理，首次访问属性时导入真实模块"""
+
+    def __init__(self, name, on_load=None):
+        super().__init__(name)
+        self.__dict__['_lazy_name'] = name
+        self.__dict__['_lazy_on_load'] = on_load
+        self.__dict__['_lazy_module'] = None
+        self.__dict__['_lazy_lock'] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__['_lazy_module']
+        if module is not None:
+            return module
+        with self.__dict__['_lazy_lock']:
+            module = self.__dict__['_lazy_module']
+            if module is None:
+                on_load = self.__dict__['_lazy_on_load']
+                if on_load:
+                    on_load()
+                module = importlib.import_module(self.__dict__['_lazy_name'])
+                self.__dict__['_lazy_module'] = module
+        return module
+
+    @property
+    def is_loaded(self):
+        return self.__dict__['_lazy_module'] is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name, on_load=None):
+    """返回延迟加载的模块代理
+
+    Args:
+        name: 模块全名，如 'pandas'、'PIL.ImageTk'
+        on_load: 真正导入前调用的函数，如设置 matplotlib 后端
+    """
+    module = LazyModule(name, on_load)
+    _registry.append(module)
+    return module
+
+
+def preload_all(callback=None):
+    """在后台线程依次加载所有已登记的模块
+
+    Args:
+        callback: 全部加载完成后调用
+    """
+    def run():
+        for module in list(_registry):
+            try:
+                module._load()
+            except ImportError as e:
+                print(f"预加载 {module.__name__} 失败: {str(e)}")
+        if callback:
+            callback()
+
+    thread = threading.Thread(target=run, name='preload', daemon=True)
+    thread.start()
+    return thread
@@ -1,16 +1,30 @@
 import os
+import argparse
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog  # 合并导入
 import threading
-import pandas as pd
-from PIL import Image, ImageTk
+import time
 from weibo_crawler import WeiboCrawler
 from sentiment_analyzer import SentimentAnalyzer
 from chart_maker import ChartMaker
-from config import UI_CONFIG, ERROR_MESSAGES  # 确保从config导入
+from dictionary_manager import get_dictionary_manager
+from comment_ranker import top_k_by_likes, like_weighted_distribution
+from priority_scheduler import format_estimate
+from sentiment_estimator import SentimentEstimator, format_result
+from metrics import METRICS
+from profiler import PhaseProfiler
+from lazy_modules import lazy_import, preload_all
+from config import (  # 确保从config导入
+    UI_CONFIG, ERROR_MESSAGES, METRICS_CONFIG, CRAWLER_CONFIG, ANALYZER_CONFIG, ESTIMATOR_CONFIG
+)
+
+# 重量级依赖延迟加载，窗口显示后再在后台预加载
+pd = lazy_import('pandas')
+Image = lazy_import('PIL.Image')
+ImageTk = lazy_import('PIL.ImageTk')
 
 class MainWindow:
-    def __init__(self):
+    def __init__(self, profile=False):
         self.root = tk.Tk()
         self.root.title("微博评论分析工具")
         self.root.geometry("1400x800")
@@ -20,15 +34,23 @@ class MainWindow:
         self.crawler = WeiboCrawler()
         self.analyzer = SentimentAnalyzer()
         self.chart_maker = ChartMaker()
+        self.profiler = PhaseProfiler(enabled=profile)
         
         # 初始化状态变量
         self.is_crawling = False
         self.is_analyzing = False
         self.last_crawl_file = None    # 添加这行
         self.last_analysis_file = None # 添加这行
+        self._analysis_cache = None    # (文件路径, 修改时间, DataFrame)
         
         self.setup_ui()
         
+        # 窗口出现后在后台线程预加载pandas/matplotlib/jieba等，随后加载分词词典
+        self.root.after(
+            UI_CONFIG['preload_delay_ms'],
+            lambda: preload_all(callback=get_dictionary_manager().warmup)
+        )
+        
     def setup_ui(self):
         """设置UI界面"""
         # 主框架
@@ -114,10 +136,45 @@ class MainWindow:
         ttk.Button(control_frame, text="开始分析", command=self.start_analysis).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="停止分析", command=self.stop_analysis).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="继续分析", command=self.resume_analysis).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="抽样估计", command=self.start_estimate).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="积极评论", command=lambda: self.filter_comments(0)).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="中性评论", command=lambda: self.filter_comments(1)).pack(side=tk.LEFT, padx=5)
         ttk.Button(control_frame, text="消极评论", command=lambda: self.filter_comments(2)).pack(side=tk.LEFT, padx=5)
         
+        # 勾选后筛选按钮只显示点赞最高的评论
+        self.top_by_likes_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(
+            control_frame,
+            text=f"点赞Top{UI_CONFIG['top_k']}",
+            variable=self.top_by_likes_var
+        ).pack(side=tk.LEFT, padx=5)
+        
+        # 勾选后同时爬取楼中楼回复
+        self.fetch_replies_var = tk.BooleanVar(value=self.crawler.fetch_replies)
+        ttk.Checkbutton(
+            control_frame,
+            text="爬取回复",
+            variable=self.fetch_replies_var
+        ).pack(side=tk.LEFT, padx=5)
+
+        # 勾选后按点赞数、发布时间和簇大小的优先级分析，中途停止也已覆盖高赞评论
+        self.priority_var = tk.BooleanVar(value=self.analyzer.config['priority']['enabled'])
+        ttk.Checkbutton(
+            control_frame,
+            text="高赞优先",
+            variable=self.priority_var,
+            command=lambda: self.analyzer.config['priority'].update(enabled=self.priority_var.get())
+        ).pack(side=tk.LEFT, padx=5)
+
+        # 性能剖析开关，结果写在各阶段输出目录的profiles/下
+        self.profile_var = tk.BooleanVar(value=self.profiler.enabled)
+        ttk.Checkbutton(
+            control_frame,
+            text="性能剖析",
+            variable=self.profile_var,
+            command=lambda: setattr(self.profiler, 'enabled', self.profile_var.get())
+        ).pack(side=tk.LEFT, padx=5)
+        
         # 进度条
         self.progress_var = tk.DoubleVar()
         self.progress_bar = ttk.Progressbar(left_frame, variable=self.progress_var, maximum=100)
@@ -173,13 +230,44 @@ class MainWindow:
         # 状态栏
         self.status_var = tk.StringVar()
         self.status_var.set("就绪")
-        status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN)
-        status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        status_frame = ttk.Frame(self.root)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        status_bar = ttk.Label(status_frame, textvariable=self.status_var, relief=tk.SUNKEN)
+        status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
+        # 运行指标：请求速率、p95延迟、缓存命中率
+        self.metrics_var = tk.StringVar()
+        metrics_bar = ttk.Label(status_frame, textvariable=self.metrics_var, relief=tk.SUNKEN)
+        metrics_bar.pack(side=tk.RIGHT)
+        self._last_request_total = 0
+        self._last_metrics_time = time.time()
+        self.root.after(METRICS_CONFIG['refresh_ms'], self._refresh_metrics)
         
         # 绑定大小变化事件
         self.pie_label.bind('<Configure>', self._update_pie_display)
         self.wordcloud_label.bind('<Configure>', self._update_wordcloud_display)
         
+    def _refresh_metrics(self):
+        """定时刷新状态栏上的运行指标"""
+        now = time.time()
+        request_total = METRICS.counter_total('http_requests_total')
+        elapsed = now - self._last_metrics_time
+        rate = (request_total - self._last_request_total) / elapsed if elapsed > 0 else 0.0
+        self._last_request_total = request_total
+        self._last_metrics_time = now
+        
+        p95 = METRICS.merged_quantile('http_request_seconds', 0.95)
+        hits = METRICS.counter_total('analysis_cache_hits_total')
+        misses = METRICS.counter_total('analysis_cache_misses_total')
+        
+        p95_text = f"{p95 * 1000:.0f}ms" if p95 is not None else "-"
+        hit_text = f"{hits / (hits + misses) * 100:.1f}%" if hits + misses else "-"
+        tokens = METRICS.counter_total('llm_tokens_total')
+        self.metrics_var.set(
+            f"请求 {rate:.1f}/s | p95 {p95_text} | 缓存命中 {hit_text} | token {tokens}"
+        )
+        self.root.after(METRICS_CONFIG['refresh_ms'], self._refresh_metrics)
+
     # 添加清除占位符的方法
     def clear_placeholder(self, widget, placeholder):
         if widget.get("1.0", "end-1c") == placeholder:
@@ -236,16 +324,16 @@ class MainWindow:
         """继续爬取线程"""
         try:
             self.update_status("继续爬取评论...")
-            output_file = self.crawler.resume()
+            with self.profiler.phase('crawl', CRAWLER_CONFIG['output_dir']):
+                output_file = self.crawler.resume()
             if output_file:
                 self.last_crawl_file = output_file
                 self.show_message("完成", f"评论已保存至: {output_file}")
                 
                 # 显示评论内容
-                df = pd.read_csv(output_file)
                 self.result_text.delete(1.0, tk.END)
-                for _, row in df.iterrows():
-                    self.result_text.insert(tk.END, f"{row['content']}\n")
+                for content in self.crawler.comments.content:
+                    self.result_text.insert(tk.END, f"{content}\n")
                 
                 self.update_status("爬取完成")
         except Exception as e:
@@ -264,6 +352,16 @@ class MainWindow:
             self.is_analyzing = True
             threading.Thread(target=self._analysis_thread).start()
 
+    def start_estimate(self):
+        """抽样估计情感分布，可用"停止分析"中止"""
+        if not self.is_analyzing:
+            if not hasattr(self, 'last_crawl_file'):
+                self.show_message("错误", "请先爬取评论")
+                return
+                
+            self.is_analyzing = True
+            threading.Thread(target=self._estimate_thread).start()
+
     def stop_analysis(self):
         """停止分析"""
         if self.is_analyzing:
@@ -283,7 +381,7 @@ class MainWindow:
                 
                 self.analyzer.set_api_key(api_key)
                 self.is_analyzing = True
-                threading.Thread(target=self._analysis_thread).start()
+                threading.Thread(target=self._analysis_thread, kwargs={'resume': True}).start()
                 
             except Exception as e:
                 self.show_message("错误", str(e))
@@ -292,7 +390,8 @@ class MainWindow:
     def generate_pie_chart(self):
         """生成饼图"""
         try:
-            chart_file = self.chart_maker.create_pie_chart(self.last_analysis_file)
+            with self.profiler.phase('chart', 'charts'):
+                chart_file = self.chart_maker.create_pie_chart(self.last_analysis_file)
             if chart_file:
                 self.root.update()
                 frame_width = self.pie_label.winfo_width()
@@ -311,7 +410,8 @@ class MainWindow:
     def generate_wordcloud(self):
         """生成词云图"""
         try:
-            chart_file = self.chart_maker.create_wordcloud(self.last_analysis_file)
+            with self.profiler.phase('chart', 'charts'):
+                chart_file = self.chart_maker.create_wordcloud(self.last_analysis_file)
             if chart_file:
                 self.root.update()
                 frame_width = self.wordcloud_label.winfo_width()
@@ -367,6 +467,17 @@ class MainWindow:
         self.pie_label.configure(image='')
         self.wordcloud_label.configure(image='')
 
+    def _load_analysis(self, analyzed_file):
+        """读取分析结果，文件未变化时直接复用缓存"""
+        mtime = os.path.getmtime(analyzed_file)
+        if self._analysis_cache:
+            cached_file, cached_mtime, cached_df = self._analysis_cache
+            if cached_file == analyzed_file and cached_mtime == mtime:
+                return cached_df
+        df = pd.read_csv(analyzed_file)
+        self._analysis_cache = (analyzed_file, mtime, df)
+        return df
+
     def filter_comments(self, sentiment):
         """筛选评论"""
         try:
@@ -380,8 +491,11 @@ class MainWindow:
                 return
                 
             self.update_status(f"正在筛选{self.chart_maker.labels[sentiment]}评论...")
-            df = pd.read_csv(self.last_analysis_file)
-            filtered = df[df['sentiment'] == sentiment]
+            df = self._load_analysis(self.last_analysis_file)
+            if self.top_by_likes_var.get():
+                filtered = top_k_by_likes(df, UI_CONFIG['top_k'], sentiment)
+            else:
+                filtered = df[df['sentiment'] == sentiment]
             
             self.result_text.delete(1.0, tk.END)
             if len(filtered) > 0:
@@ -424,20 +538,23 @@ class MainWindow:
             self.crawler.progress_callback = progress_callback
             
             # 开始爬取
-            output_file = self.crawler.crawl_comments(url)
+            with self.profiler.phase('crawl', CRAWLER_CONFIG['output_dir']):
+                output_file = self.crawler.crawl_comments(
+                    url, fetch_replies=self.fetch_replies_var.get()
+                )
             if output_file:
                 self.last_crawl_file = output_file
                 self.show_message("完成", f"评论已保存至: {output_file}")
                 
                 # 显示评论内容(增加更多信息)
-                df = pd.read_csv(output_file)
+                comments = self.crawler.comments
                 self.result_text.delete(1.0, tk.END)
-                for _, row in df.iterrows():
+                for idx in range(len(comments)):
                     comment_info = (
-                        f"用户: {row['user_name']}\n"
-                        f"时间: {row['created_at']}\n"
-                        f"点赞: {row['like_count']}\n"
-                        f"内容: {row['content']}\n"
+                        f"用户: {comments.user_name(idx)}\n"
+                        f"时间: {comments.created_at[idx]}\n"
+                        f"点赞: {comments.like_count[idx]}\n"
+                        f"内容: {comments.content[idx]}\n"
                         f"{'-'*50}\n"
                     )
                     self.result_text.insert(tk.END, comment_info)
@@ -451,10 +568,14 @@ class MainWindow:
         finally:
             self.is_crawling = False
 
-    def _analysis_thread(self):
-        """分析线程"""
+    def _analysis_thread(self, resume=False):
+        """分析线程
+        
+        Args:
+            resume: 按检查点继续上次的分析，重启程序后也可继续
+        """
         try:
-            if not hasattr(self, 'last_crawl_file'):
+            if not hasattr(self, 'last_crawl_file') and not resume:
                 self.show_message("错误", "请先爬取评论")
                 return
                 
@@ -484,14 +605,30 @@ class MainWindow:
                 
             self.analyzer.progress_callback = progress_callback
             
+            # 点赞加权的中途估计，中途停止时也能看到大致分布
+            def interim_callback(snapshot):
+                self.result_text.insert(tk.END, f"中途估计: {format_estimate(snapshot)}\n")
+                self.result_text.see(tk.END)
+                
+            self.analyzer.interim_callback = interim_callback
+            
             # 开始分析
-            output_file = self.analyzer.analyze_comments(self.last_crawl_file)
+            with self.profiler.phase('analyze', ANALYZER_CONFIG['output_dir']):
+                # 直接复用爬虫内存中的评论，不再重新读取CSV
+                if resume:
+                    output_file = self.analyzer.resume(
+                        getattr(self, 'last_crawl_file', None), store=self.crawler.comments or None
+                    )
+                else:
+                    output_file = self.analyzer.analyze_comments(
+                        self.last_crawl_file, store=self.crawler.comments or None
+                    )
             if output_file and os.path.exists(output_file):  # 确保文件存在
                 self.last_analysis_file = output_file  # 保存分析结果文件路径
                 print(f"分析结果文件保存在: {output_file}")  # 调试输出
                 
                 # 显示分析结果
-                df = pd.read_csv(output_file)
+                df = self._load_analysis(output_file)
                 self.result_text.delete(1.0, tk.END)
                 
                 # 统计各类情感数量
@@ -503,13 +640,20 @@ class MainWindow:
                 self.result_text.insert(tk.END, "=" * 30 + "\n")
                 for sentiment, count in sentiment_counts.items():
                     percentage = count / total * 100
-                    label = self.chart_maker.labels[sentiment]
+                    label = self.chart_maker.labels.get(sentiment, ERROR_MESSAGES['analysis_failed'])
                     self.result_text.insert(tk.END, f"{label}: {count}条 ({percentage:.1f}%)\n")
+                self.result_text.insert(tk.END, "-" * 30 + "\n")
+                self.result_text.insert(tk.END, "点赞加权分布：\n")
+                for sentiment, stats in like_weighted_distribution(df).items():
+                    label = self.chart_maker.labels[sentiment]
+                    self.result_text.insert(tk.END, f"{label}: {stats['ratio'] * 100:.1f}% (点赞 {stats['likes']})\n")
+                self.result_text.insert(tk.END, "-" * 30 + "\n")
+                self.result_text.insert(tk.END, f"API用量: {self.analyzer.usage.format()}\n")
                 self.result_text.insert(tk.END, "=" * 30 + "\n\n")
                 
                 # 显示详细结果
                 for _, row in df.iterrows():
-                    sentiment = self.chart_maker.labels[row['sentiment']]
+                    sentiment = self.chart_maker.labels.get(row['sentiment'], ERROR_MESSAGES['analysis_failed'])
                     comment_info = (
                         f"[{sentiment}]\n"
                         f"用户: {row['user_name']}\n"
@@ -533,6 +677,47 @@ class MainWindow:
         finally:
             self.is_analyzing = False
 
+    def _estimate_thread(self):
+        """抽样估计线程，结果图显示在饼图位置"""
+        try:
+            api_key = self.api_key_entry.get().strip()
+            if not api_key:
+                self.show_message("错误", "请输入API Key")
+                return
+            self.analyzer.set_api_key(api_key)
+            self.analyzer.is_running = True
+            self.update_status("正在抽样估计...")
+            self.result_text.delete(1.0, tk.END)
+            self.progress_var.set(0)
+            
+            # 每轮抽样后显示当前估计，进度按区间宽度接近目标的程度计算
+            def progress_callback(result):
+                self.progress_var.set(min(result['target_width'] / max(result['width'], 1e-9), 1.0) * 100)
+                self.result_text.insert(tk.END, f"{format_result(result)}\n")
+                self.result_text.see(tk.END)
+                self.root.update()
+                
+            estimator = SentimentEstimator(self.analyzer, ESTIMATOR_CONFIG)
+            estimator.progress_callback = progress_callback
+            with self.profiler.phase('estimate', ESTIMATOR_CONFIG['output_dir']):
+                result = estimator.estimate(self.last_crawl_file, store=self.crawler.comments or None)
+            if result is None:
+                raise Exception("抽样估计失败")
+            self.result_text.insert(tk.END, f"API用量: {self.analyzer.usage.format()}\n")
+            
+            chart_file = self.chart_maker.create_estimate_chart(result)
+            if chart_file:
+                self.current_pie_file = chart_file
+                self._update_pie_display()
+            self.update_status("抽样估计完成" if result['converged'] else "抽样估计已结束(未达到目标精度)")
+            
+        except Exception as e:
+            print(f"抽样估计错误: {str(e)}")
+            self.show_message("错误", str(e))
+            self.update_status("抽样估计失败")
+        finally:
+            self.is_analyzing = False
+
     def show_message(self, title, message):
         """显示消息对话框"""
         if title == "错误":
@@ -555,13 +740,31 @@ def ensure_directories():
         if not os.path.exists(directory):
             os.makedirs(directory)
 
+def export_metrics():
+    """把本次运行的指标写成JSON快照和Prometheus文本文件"""
+    export_dir = METRICS_CONFIG['export_dir']
+    stamp = int(time.time())
+    METRICS.write_json(os.path.join(export_dir, f'metrics_{stamp}.json'))
+    METRICS.write_prometheus(os.path.join(export_dir, f'metrics_{stamp}.prom'))
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=UI_CONFIG['title'])
+    parser.add_argument('--profile', action='store_true',
+                        help='剖析爬取/分析/图表各阶段，结果写在输出目录的profiles/下')
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     try:
         ensure_directories()
-        app = MainWindow()
+        if METRICS_CONFIG['http_port']:
+            METRICS.serve(METRICS_CONFIG['http_port'])
+        app = MainWindow(profile=args.profile)
         app.root.mainloop()
     except Exception as e:
         print(f"程序运行错误: {str(e)}")
+    finally:
+        export_metrics()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
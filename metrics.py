@@ -0,0 +1,211 @@
+"""轻量的运行指标：计数器、直方图和计时器
+
+所有模块共用全局注册表 METRICS，可导出为 Prometheus 文本格式或 JSON 快照。
+"""
+import bisect
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 默认直方图分桶(秒)，覆盖从毫秒级解析到数十秒的网络请求
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    inner = ','.join(f'{key}="{value}"' for key, value in labels)
+    return '{' + inner + '}'
+
+
+class Counter:
+    """只增不减的计数器"""
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Histogram:
+    """分桶直方图，另保留最近的样本用于计算分位数"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=1024):
+        self.buckets = tuple(buckets)
+        self.bucket_counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self.recent.append(value)
+
+    def quantile(self, q):
+        """最近样本的分位数，没有样本时返回None"""
+        with self._lock:
+            samples = sorted(self.recent)
+        if not samples:
+            return None
+        index = min(int(q * len(samples)), len(samples) - 1)
+        return samples[index]
+
+    @contextmanager
+    def time(self):
+        """计时上下文，退出时记录耗时(秒)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class MetricsRegistry:
+    """指标注册表，同名同标签的指标只创建一次"""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+
+    def _get(self, store, factory, name, labels):
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        metric = store.get(key)
+        if metric is None:
+            with self._lock:
+                metric = store.setdefault(key, factory())
+        return metric
+
+    def counter(self, name, **labels):
+        return self._get(self._counters, Counter, name, labels)
+
+    def histogram(self, name, **labels):
+        return self._get(self._histograms, Histogram, name, labels)
+
+    def timer(self, name, **labels):
+        """用法: with METRICS.timer('render_seconds', chart='pie'): ..."""
+        return self.histogram(name, **labels).time()
+
+    def counter_total(self, name):
+        """某计数器所有标签的合计"""
+        return sum(c.value for (n, _), c in list(self._counters.items()) if n == name)
+
+    def merged_quantile(self, name, q):
+        """合并某直方图所有标签的最近样本后计算分位数"""
+        samples = []
+        for (n, _), histogram in list(self._histograms.items()):
+            if n == name:
+                samples.extend(histogram.recent)
+        if not samples:
+            return None
+        samples.sort()
+        return samples[min(int(q * len(samples)), len(samples) - 1)]
+
+    def snapshot(self):
+        """JSON可序列化的快照"""
+        counters = []
+        for (name, labels), counter in sorted(self._counters.items()):
+            counters.append({'name': name, 'labels': dict(labels), 'value': counter.value})
+        histograms = []
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            histograms.append({
+                'name': name,
+                'labels': dict(labels),
+                'count': histogram.count,
+                'sum': histogram.sum,
+                'p50': histogram.quantile(0.5),
+                'p95': histogram.quantile(0.95),
+                'p99': histogram.quantile(0.99)
+            })
+        return {
+            'timestamp': time.time(),
+            'uptime': time.time() - self.started_at,
+            'counters': counters,
+            'histograms': histograms
+        }
+
+    def to_prometheus(self):
+        """导出为 Prometheus 文本格式"""
+        lines = []
+        seen = set()
+        for (name, labels), counter in sorted(self._counters.items()):
+            if name not in seen:
+                lines.append(f'# TYPE {name} counter')
+                seen.add(name)
+            lines.append(f'{name}{_format_labels(labels)} {counter.value}')
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            if name not in seen:
+                lines.append(f'# TYPE {name} histogram')
+                seen.add(name)
+            cumulative = 0
+            for bound, count in zip(histogram.buckets, histogram.bucket_counts):
+                cumulative += count
+                bucket_labels = labels + (('le', bound),)
+                lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+            bucket_labels = labels + (('le', '+Inf'),)
+            lines.append(f'{name}_bucket{_format_labels(bucket_labels)} {histogram.count}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {histogram.sum}')
+            lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def write_json(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+        return path
+
+    def write_prometheus(self, path):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        return path
+
+    def serve(self, port, host='127.0.0.1'):
+        """在后台线程提供 /metrics(Prometheus) 和 /metrics.json 接口"""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == '/metrics':
+                    body = registry.to_prometheus().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4'
+                elif self.path == '/metrics.json':
+                    body = json.dumps(registry.snapshot(), ensure_ascii=False).encode('utf-8')
+                    content_type = 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started_at = time.time()
+
+
+METRICS = MetricsRegistry()
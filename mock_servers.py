@@ -0,0 +1,300 @@
+"""本地模拟的微博评论接口和DeepSeek接口，用于离线压测
+
+用法:
+    python mock_servers.py --comments 100000 --latency 0.02 --error-rate 0.01
+
+然后通过环境变量让爬虫和分析器指向本地:
+    WEIBO_BASE_URL=http://127.0.0.1:8081 DEEPSEEK_BASE_URL=http://127.0.0.1:8082 python main.py
+"""
+import argparse
+import json
+import random
+import socket
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# 生成语料用的词表，情感词同时用于模拟API打标签
+POSITIVE_WORDS = ['支持', '喜欢', '太棒了', '加油', '好看', '感动', '厉害', '开心']
+NEGATIVE_WORDS = ['失望', '垃圾', '难看', '恶心', '生气', '无语', '离谱', '退钱']
+NEUTRAL_WORDS = ['今天', '这个', '评论', '路过', '看看', '消息', '已阅', '知道了']
+EMOTICONS = ['[哈哈]', '[doge]', '[怒]', '[泪]', '[赞]', '[允悲]']
+
+_EPOCH = datetime(2026, 1, 1, tzinfo=timezone(timedelta(hours=8)))
+
+
+class RateLimiter:
+    """简单的每秒请求数限制，超出时返回429"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class MockServer(ThreadingHTTPServer):
+    """模拟服务器基类，负责延迟、错误率和限流"""
+
+    daemon_threads = True
+
+    def __init__(self, address, handler, latency=0.0, error_rate=0.0, rate_limit=0, seed=0):
+        super().__init__(address, handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.limiter = RateLimiter(rate_limit)
+        self.random = random.Random(seed)
+        self.seed = seed
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """在后台线程启动服务"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # 关闭Nagle算法，否则头和正文分两次写出时会被延迟确认拖慢约40ms
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _simulate(self):
+        """模拟网络延迟、限流和随机错误，返回False表示已经回复了错误"""
+        server = self.server
+        with server._count_lock:
+            server.request_count += 1
+        if server.latency:
+            time.sleep(server.random.uniform(0.5, 1.5) * server.latency)
+        if not server.limiter.acquire():
+            self._send_json(429, {'error': 'rate limited'}, {'Retry-After': '1'})
+            return False
+        if server.error_rate and server.random.random() < server.error_rate:
+            self._send_json(503, {'error': 'service unavailable'})
+            return False
+        return True
+
+
+def label_text(text):
+    """按情感词计数打标签，没有情感词时按文本哈希决定，结果可复现
+
+    模拟接口按它回答，也用作合成评测集的标准答案。
+    """
+    positive = sum(text.count(word) for word in POSITIVE_WORDS)
+    negative = sum(text.count(word) for word in NEGATIVE_WORDS)
+    if positive > negative:
+        return 0
+    if negative > positive:
+        return 2
+    if positive or any(word in text for word in NEUTRAL_WORDS):
+        return 1
+    return zlib.crc32(text.encode('utf-8')) % 3
+
+
+def make_comment(seed, index, reply_ratio=0.0, max_replies=0, parent=None):
+    """按下标确定性地生成一条评论，无需把整个语料放进内存"""
+    rng = random.Random(seed * 1000003 + index if parent is None else seed * 1000003 + parent * 7919 + index)
+    pools = [POSITIVE_WORDS, NEUTRAL_WORDS, NEGATIVE_WORDS]
+    words = rng.choice(pools)
+    text = ''.join(rng.choice(words) for _ in range(rng.randint(2, 6)))
+    if rng.random() < 0.3:
+        text += rng.choice(EMOTICONS)
+    if rng.random() < 0.1:
+        text = f'@用户{rng.randint(1, 999)} ' + text
+
+    # 回复id放在独立区间，避免和一级评论冲突
+    comment_id = index + 1 if parent is None else 10 ** 9 + parent * 1000 + index + 1
+    created_at = _EPOCH + timedelta(seconds=comment_id % 10000000)
+    comment = {
+        'id': comment_id,
+        'text_raw': text,
+        'created_at': created_at.strftime('%a %b %d %H:%M:%S %z %Y'),
+        'user': {'screen_name': f'用户{rng.randint(1, 50000)}'},
+        'like_counts': int(rng.paretovariate(1.2)) - 1,
+        'total_number': 0
+    }
+    if parent is None and max_replies and rng.random() < reply_ratio:
+        comment['total_number'] = rng.randint(1, max_replies)
+    return comment
+
+
+class _WeiboHandler(_MockHandler):
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path != '/ajax/statuses/buildComments':
+            self._send_json(404, {'error': 'not found'})
+            return
+        if not self._simulate():
+            return
+
+        server = self.server
+        if self.headers.get('Cookie') in server.banned_cookies:
+            # 失效账号：微博返回 ok=-100 并要求重新登录
+            self._send_json(200, {'ok': -100, 'url': 'https://passport.weibo.com/sso/signin'})
+            return
+        params = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+        count = int(params.get('count', 20))
+        offset = int(params.get('max_id', 0) or 0)
+
+        if params.get('fetch_level') == '1':
+            # 楼中楼回复，id为父评论id
+            parent_id = int(params['id'])
+            parent = make_comment(server.seed, parent_id - 1, server.reply_ratio, server.max_replies)
+            total = parent['total_number']
+            make = lambda i: make_comment(server.seed, i, parent=parent_id)
+        else:
+            total = server.comments
+            make = lambda i: make_comment(server.seed, i, server.reply_ratio, server.max_replies)
+
+        end = min(offset + count, total)
+        data = [make(i) for i in range(offset, end)]
+        self._send_json(200, {
+            'ok': 1,
+            'data': data,
+            'total_number': total,
+            'max_id': end if end < total else 0
+        })
+
+
+class _DeepSeekHandler(_MockHandler):
+    def do_POST(self):
+        if urlparse(self.path).path != '/v1/chat/completions':
+            self._send_json(404, {'error': 'not found'})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length)
+        if not self._simulate():
+            return
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            self._send_json(401, {'error': {'message': 'missing api key'}})
+            return
+
+        try:
+            request = json.loads(body)
+            prompt = request['messages'][-1]['content']
+        except (ValueError, KeyError, IndexError):
+            self._send_json(400, {'error': {'message': 'invalid request'}})
+            return
+
+        label = label_text(prompt.rsplit('\n', 1)[-1])
+        completion = str(label)
+        prompt_tokens = max(len(prompt) * 2 // 3, 1)
+        self._send_json(200, {
+            'id': f'mock-{self.server.request_count}',
+            'object': 'chat.completion',
+            'model': request.get('model', 'deepseek-chat'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': completion},
+                'finish_reason': 'stop'
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': 1,
+                'total_tokens': prompt_tokens + 1
+            }
+        })
+
+
+class MockWeiboServer(MockServer):
+    """模拟 /ajax/statuses/buildComments 分页接口"""
+
+    def __init__(self, host='127.0.0.1', port=0, comments=1000, reply_ratio=0.0,
+                 max_replies=0, banned_cookies=(), **kwargs):
+        super().__init__((host, port), _WeiboHandler, **kwargs)
+        self.comments = comments
+        self.banned_cookies = set(banned_cookies)
+        self.reply_ratio = reply_ratio
+        self.max_replies = max_replies
+
+
+class MockDeepSeekServer(MockServer):
+    """模拟 /v1/chat/completions 接口"""
+
+    def __init__(self, host='127.0.0.1', port=0, **kwargs):
+        super().__init__((host, port), _DeepSeekHandler, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='本地模拟微博与DeepSeek接口')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--weibo-port', type=int, default=8081)
+    parser.add_argument('--deepseek-port', type=int, default=8082)
+    parser.add_argument('--comments', type=int, default=100000, help='一级评论总数')
+    parser.add_argument('--reply-ratio', type=float, default=0.0, help='有回复的评论比例')
+    parser.add_argument('--max-replies', type=int, default=0, help='单条评论最多回复数')
+    parser.add_argument('--latency', type=float, default=0.0, help='平均响应延迟(秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='随机返回503的比例')
+    parser.add_argument('--rate-limit', type=int, default=0, help='每秒最多请求数，0为不限')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    common = {
+        'latency': args.latency,
+        'error_rate': args.error_rate,
+        'rate_limit': args.rate_limit,
+        'seed': args.seed
+    }
+    weibo = MockWeiboServer(
+        args.host, args.weibo_port,
+        comments=args.comments,
+        reply_ratio=args.reply_ratio,
+        max_replies=args.max_replies,
+        **common
+    ).start()
+    deepseek = MockDeepSeekServer(args.host, args.deepseek_port, **common).start()
+
+    print(f"微博模拟接口: {weibo.url}")
+    print(f"DeepSeek模拟接口: {deepseek.url}")
+    print("按 Ctrl+C 退出")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        weibo.stop()
+        deepseek.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,398 @@
+"""微博评论监控服务
+
+长期运行，按关注列表定时重新爬取每条微博，只分析新出现的评论并累加情感统计。
+新增评论多的微博缩短轮询间隔，长时间没有新评论的微博逐步放慢。
+所有微博共用有限的工作线程和同一份爬取/分析速率预算，状态保存在 MONITOR_CONFIG['state_dir']，
+重启后继续。
+
+用法:
+    python monitor_daemon.py add "https://weibo.com/detail?id=123&uid=456"
+    python monitor_daemon.py remove "https://weibo.com/detail?id=123&uid=456"
+    python monitor_daemon.py status
+    WEIBO_COOKIE=... DEEPSEEK_API_KEY=... python monitor_daemon.py run
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from comment_store import UNLABELED, CommentStore
+from config import ANALYZER_CONFIG, CRAWLER_CONFIG, MONITOR_CONFIG
+from sentiment_analyzer import SentimentAnalyzer
+from session_pool import SessionPool
+from token_budget import TokenBudget
+from weibo_crawler import WeiboCrawler
+
+LABELS = (0, 1, 2)
+
+
+def post_key(url):
+    """微博的标识，优先用URL中的id"""
+    match = re.search(r'id=(\d+)', url)
+    if match:
+        return match.group(1)
+    return hashlib.sha1(url.encode('utf-8')).hexdigest()[:12]
+
+
+def _write_json(path, data):
+    """先写临时文件再替换，避免中途退出留下损坏的文件"""
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def _read_json(path, default):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+class Watchlist:
+    """关注列表，CLI 修改，运行中的服务按修改时间重新加载"""
+
+    def __init__(self, state_dir):
+        self.path = os.path.join(state_dir, 'watchlist.json')
+        os.makedirs(state_dir, exist_ok=True)
+
+    def urls(self):
+        return _read_json(self.path, [])
+
+    def add(self, url):
+        urls = self.urls()
+        if url not in urls:
+            urls.append(url)
+            _write_json(self.path, urls)
+
+    def remove(self, url):
+        urls = [u for u in self.urls() if u != url]
+        _write_json(self.path, urls)
+
+    def mtime(self):
+        try:
+            return os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+
+class MonitorDaemon:
+    """监控服务"""
+
+    def __init__(self, headers, api_key, config=None):
+        """
+        Args:
+            headers: (User-Agent, Cookie, Referer)
+            api_key: DeepSeek API Key
+        """
+        self.config = config or MONITOR_CONFIG
+        self.headers = headers
+        self.api_key = api_key
+        self.state_dir = self.config['state_dir']
+        self.state_file = os.path.join(self.state_dir, 'state.json')
+        self.watchlist = Watchlist(self.state_dir)
+        self.posts = {}
+        self._seen = {}
+        self._watchlist_mtime = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._active = {}  # 微博标识 -> (爬虫, 分析器)
+
+        # 所有微博共用的速率预算
+        self.crawl_budget = TokenBudget(rpm=self.config['crawl_rpm'])
+        # 有账号文件时用多账号轮流爬取，否则只用命令行给出的一组请求头
+        self.session_pool = None
+        if os.path.exists(CRAWLER_CONFIG['accounts_file']):
+            self.session_pool = SessionPool.from_file(CRAWLER_CONFIG['accounts_file'])
+        budget_config = ANALYZER_CONFIG['budget']
+        self.llm_budget = TokenBudget(rpm=budget_config['rpm'], tpm=budget_config['tpm'])
+
+    # ---- 状态 ----
+
+    def load(self):
+        self.posts = _read_json(self.state_file, {}).get('posts', {})
+        self._sync_watchlist()
+
+    def save(self):
+        with self._lock:
+            _write_json(self.state_file, {'posts': self.posts})
+
+    def _new_post(self, url):
+        return {
+            'url': url,
+            'interval': self.config['initial_interval'],
+            'next_run': 0,
+            'last_run': None,
+            'aggregates': {
+                'total': 0,
+                'errors': 0,
+                'counts': {str(label): 0 for label in LABELS},
+                'weights': {str(label): 0 for label in LABELS}
+            },
+            'failed': {},  # 分析失败、等待下一轮重试的评论id -> 已尝试次数
+            'history': []
+        }
+
+    @staticmethod
+    def _failed(post):
+        """分析失败的评论id -> 已尝试次数，旧状态文件中是id列表"""
+        failed = post.get('failed') or {}
+        if isinstance(failed, list):
+            failed = dict.fromkeys(map(str, failed), 1)
+        post['failed'] = failed
+        return failed
+
+    def _sync_watchlist(self):
+        """关注列表变化时增删微博，已有微博的进度保留"""
+        mtime = self.watchlist.mtime()
+        if mtime == self._watchlist_mtime:
+            return
+        self._watchlist_mtime = mtime
+        urls = {post_key(url): url for url in self.watchlist.urls()}
+        with self._lock:
+            for key in list(self.posts):
+                if key not in urls:
+                    del self.posts[key]
+            for key, url in urls.items():
+                if key not in self.posts:
+                    self.posts[key] = self._new_post(url)
+
+    def _seen_file(self, key):
+        return os.path.join(self.state_dir, f'{key}.seen')
+
+    def _seen_ids(self, key):
+        if key not in self._seen:
+            seen = set()
+            try:
+                with open(self._seen_file(key), encoding='utf-8') as f:
+                    seen.update(int(line) for line in f if line.strip())
+            except OSError:
+                pass
+            self._seen[key] = seen
+        return self._seen[key]
+
+    def _mark_seen(self, key, comment_ids):
+        self._seen_ids(key).update(comment_ids)
+        with open(self._seen_file(key), 'a', encoding='utf-8') as f:
+            f.writelines(f'{comment_id}\n' for comment_id in comment_ids)
+
+    # ---- 单条微博的一轮轮询 ----
+
+    def next_interval(self, interval, new_count):
+        """新增评论多时间隔减半，没有新增时放慢1.5倍"""
+        if new_count >= self.config['hot_threshold']:
+            interval /= 2
+        elif new_count == 0:
+            interval *= 1.5
+        return min(max(interval, self.config['min_interval']), self.config['max_interval'])
+
+    def poll(self, key):
+        """爬取一条微博，只分析新评论并累加统计"""
+        post = self.posts[key]
+        post_dir = os.path.join(self.state_dir, key)
+
+        crawler = WeiboCrawler()
+        crawler.config = dict(CRAWLER_CONFIG, output_dir=os.path.join(post_dir, 'raw'))
+        crawler.set_headers(*self.headers)
+        crawler.budget = self.crawl_budget
+        crawler.session_pool = self.session_pool
+        analyzer = SentimentAnalyzer()
+        analyzer.config = dict(ANALYZER_CONFIG, output_dir=os.path.join(post_dir, 'analyzed'))
+        analyzer.set_api_key(self.api_key)
+        analyzer.budget = self.llm_budget
+        self._active[key] = (crawler, analyzer)
+        try:
+            crawler.crawl_comments(post['url'])
+            comments = crawler.comments
+            seen = self._seen_ids(key)
+            fresh = CommentStore()
+            for idx in range(len(comments)):
+                if comments.comment_id[idx] not in seen:
+                    fresh.append(
+                        comment_id=comments.comment_id[idx],
+                        parent_id=comments.parent_id[idx],
+                        content=comments.content[idx],
+                        created_at=comments.created_at[idx],
+                        user_name=comments.user_name(idx),
+                        like_count=comments.like_count[idx]
+                    )
+
+            # 上一轮分析失败的评论会再次出现，不算作新增，避免把反复失败的微博当成热门
+            with self._lock:
+                failed = set(self._failed(post))
+            retried = sum(1 for comment_id in fresh.comment_id if str(comment_id) in failed)
+            new_count = len(fresh) - retried
+
+            analyzed = []
+            if len(fresh) and not self._stop.is_set():
+                os.makedirs(post_dir, exist_ok=True)
+                new_file = os.path.join(post_dir, f'new_{int(time.time() * 1000)}.csv')
+                fresh.to_dataframe().to_csv(new_file, index=False, encoding='utf-8-sig')
+                if analyzer.analyze_comments(new_file, store=fresh):
+                    analyzed, abandoned = self._accumulate(post, fresh)
+                    # 分析失败的评论不记为已见，下一轮重试；重试次数用完的不再分析
+                    self._mark_seen(key, analyzed + abandoned)
+
+            now = time.time()
+            with self._lock:
+                post['interval'] = self.next_interval(post['interval'], new_count)
+                post['last_run'] = now
+                post['next_run'] = now + post['interval']
+                post['history'].append({
+                    'time': now,
+                    'new': new_count,
+                    'retried': retried,
+                    'analyzed': len(analyzed),
+                    'tokens': analyzer.usage.total_tokens,
+                    'interval': post['interval']
+                })
+                del post['history'][:-self.config['history_size']]
+            self.save()
+            print(f"[{key}] 新评论 {new_count} 条，重试 {retried} 条，已分析 {len(analyzed)} 条，"
+                  f"下次轮询 {post['interval']:.0f} 秒后")
+        finally:
+            self._active.pop(key, None)
+
+    def _accumulate(self, post, store):
+        """把本轮结果累加到聚合统计
+
+        errors 为失败的评论条数：每条失败的评论只计一次，之后重试成功时减去；
+        失败达到 max_attempts 次的评论不再重试，仍计入 errors。
+
+        Returns:
+            (分析成功的评论id, 放弃重试的评论id)
+        """
+        aggregates = post['aggregates']
+        analyzed, abandoned = [], []
+        with self._lock:
+            failed = self._failed(post)
+            for idx in range(len(store)):
+                comment_id = store.comment_id[idx]
+                sentiment = store.sentiment[idx]
+                if sentiment == UNLABELED:
+                    # 分析中途停止，没有轮到的评论下一轮再分析，不算一次尝试
+                    continue
+                if sentiment not in LABELS:
+                    attempts = failed.get(str(comment_id), 0) + 1
+                    if attempts == 1:
+                        aggregates['errors'] += 1
+                    if attempts >= self.config['max_attempts']:
+                        failed.pop(str(comment_id), None)
+                        abandoned.append(comment_id)
+                    else:
+                        failed[str(comment_id)] = attempts
+                    continue
+                if failed.pop(str(comment_id), None):
+                    aggregates['errors'] -= 1
+                aggregates['total'] += 1
+                aggregates['counts'][str(sentiment)] += 1
+                aggregates['weights'][str(sentiment)] += max(store.like_count[idx], 0) + 1
+                analyzed.append(comment_id)
+        return analyzed, abandoned
+
+    # ---- 调度 ----
+
+    def run(self):
+        """调度循环，直到 stop() 被调用"""
+        self.load()
+        workers = self.config['workers']
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='monitor')
+        futures = {}
+        print(f"监控服务已启动，关注 {len(self.posts)} 条微博")
+        try:
+            while not self._stop.is_set():
+                self._sync_watchlist()
+                for key, future in list(futures.items()):
+                    if future.done():
+                        futures.pop(key)
+                        if future.exception():
+                            print(f"[{key}] 轮询失败: {future.exception()}")
+                            with self._lock:
+                                post = self.posts.get(key)
+                                if post:
+                                    post['next_run'] = time.time() + post['interval']
+
+                # 只在有空闲线程时提交，到期的微博按到期先后排队
+                now = time.time()
+                due = sorted(
+                    (post['next_run'], key) for key, post in list(self.posts.items())
+                    if post['next_run'] <= now and key not in futures
+                )
+                for _, key in due[:workers - len(futures)]:
+                    futures[key] = executor.submit(self.poll, key)
+
+                self._stop.wait(self.config['tick'])
+        finally:
+            for crawler, analyzer in list(self._active.values()):
+                crawler.stop()
+                analyzer.stop()
+            executor.shutdown(wait=True)
+            self.save()
+            print("监控服务已停止")
+
+    def stop(self):
+        self._stop.set()
+
+
+def format_status(state_dir):
+    """各微博的轮询间隔和情感分布"""
+    posts = _read_json(os.path.join(state_dir, 'state.json'), {}).get('posts', {})
+    lines = []
+    for key, post in posts.items():
+        aggregates = post['aggregates']
+        total_weight = sum(aggregates['weights'].values())
+        ratios = ' '.join(
+            f"{label}:{aggregates['weights'][str(label)] / total_weight * 100:.1f}%" if total_weight else f"{label}:-"
+            for label in LABELS
+        )
+        lines.append(
+            f"{key}  评论 {aggregates['total']}  失败 {aggregates['errors']}  "
+            f"间隔 {post['interval']:.0f}s  点赞加权 {ratios}  {post['url']}"
+        )
+    return '\n'.join(lines) or '关注列表为空'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='微博评论监控服务')
+    parser.add_argument('command', choices=['add', 'remove', 'status', 'run'])
+    parser.add_argument('url', nargs='?')
+    parser.add_argument('--cookie', default=os.environ.get('WEIBO_COOKIE', ''))
+    parser.add_argument('--user-agent', default=os.environ.get(
+        'WEIBO_USER_AGENT', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'))
+    parser.add_argument('--referer', default=os.environ.get('WEIBO_REFERER', 'https://weibo.com/'))
+    parser.add_argument('--api-key', default=os.environ.get('DEEPSEEK_API_KEY', ''))
+    args = parser.parse_args()
+
+    state_dir = MONITOR_CONFIG['state_dir']
+    if args.command in ('add', 'remove'):
+        if not args.url:
+            parser.error('需要微博URL')
+        watchlist = Watchlist(state_dir)
+        if args.command == 'add':
+            watchlist.add(args.url)
+        else:
+            watchlist.remove(args.url)
+        print(f"关注列表: {len(watchlist.urls())} 条微博")
+    elif args.command == 'status':
+        print(format_status(state_dir))
+    else:
+        if not args.api_key:
+            parser.error('需要 --api-key (或环境变量 DEEPSEEK_API_KEY)')
+        if not args.cookie and not os.path.exists(CRAWLER_CONFIG['accounts_file']):
+            parser.error(f"需要 --cookie (或环境变量 WEIBO_COOKIE)，或账号文件 {CRAWLER_CONFIG['accounts_file']}")
+        daemon = MonitorDaemon((args.user_agent, args.cookie, args.referer), args.api_key)
+        signal.signal(signal.SIGTERM, lambda *_: daemon.stop())
+        try:
+            daemon.run()
+        except KeyboardInterrupt:
+            daemon.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""按优先级安排情感分析顺序，并在分析过程中给出点赞加权的中途估计
+
+按文件顺序分析时，中途停止或预算用尽后，点赞最多、最能代表舆论的评论可能还没分析到。
+优先级模式按 点赞数、发布时间、近似重复簇大小 的加权得分从高到低分析，
+每个簇的第一次调用就能给整簇打上标签，大簇和高赞评论很快被覆盖。
+
+中途估计按点赞加权，给出两种区间:
+    low/high  统计区间：假设未分析部分与已分析部分的分布相近，按有效样本量(Kish)给出的置信区间
+    min/max   确定区间：未分析部分全部属于/全部不属于该情感时的极端值，总是成立
+优先级模式下已分析的评论不是随机样本，统计区间只作参考；点赞权重覆盖率越高两者越接近，
+全部分析完时区间收缩为一个点。
+"""
+from statistics import NormalDist
+
+from config import CHART_CONFIG
+from comment_ranker import like_weights
+from comment_schema import WEIBO_TIME_FORMAT
+from lazy_modules import lazy_import
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+
+def z_score(confidence):
+    """双侧置信水平对应的正态分位数，如 0.95 -> 1.96"""
+    return NormalDist().inv_cdf(0.5 + confidence / 2)
+
+
+def _scaled(values):
+    """线性缩放到 [0, 1]，全部相同时为0"""
+    low, high = values.min(), values.max()
+    if high <= low:
+        return np.zeros_like(values)
+    return (values - low) / (high - low)
+
+
+def recency_scores(created_at, comment_ids):
+    """越新的评论得分越高，按发布时间排名缩放到 [0, 1]
+
+    时间无法解析时按评论id排名，微博的评论id随时间递增。
+    """
+    times = pd.to_datetime(pd.Series(created_at), format=WEIBO_TIME_FORMAT, errors='coerce', utc=True)
+    if times.isna().any():
+        ranks = pd.Series(np.asarray(comment_ids, dtype=np.float64)).rank(method='average')
+    else:
+        ranks = times.rank(method='average')
+    return _scaled(ranks.to_numpy(dtype=np.float64))
+
+
+def priority_scores(store, cluster_ids, weights):
+    """每条评论的优先级得分
+
+    Args:
+        store: CommentStore
+        cluster_ids: 每条评论所在簇的代表下标
+        weights: {'likes': 权重, 'recency': 权重, 'cluster': 权重}
+    """
+    count = len(store)
+    scores = np.zeros(count, dtype=np.float64)
+    if not count:
+        return scores
+    if weights.get('likes'):
+        likes = np.log1p(np.clip(np.asarray(store.like_count, dtype=np.float64), 0, None))
+        scores += weights['likes'] * _scaled(likes)
+    if weights.get('recency'):
+        scores += weights['recency'] * recency_scores(store.created_at, store.comment_id)
+    if weights.get('cluster'):
+        sizes = np.bincount(cluster_ids, minlength=count)[cluster_ids]
+        scores += weights['cluster'] * _scaled(np.log(sizes.astype(np.float64)))
+    return scores
+
+
+def priority_order(store, cluster_ids, start=0, weights=None):
+    """从 start 开始的评论下标，按优先级得分从高到低排列，得分相同时保持文件顺序"""
+    scores = priority_scores(store, cluster_ids, weights or {'likes': 1.0})[start:]
+    return start + np.argsort(-scores, kind='stable')
+
+
+class ProgressiveEstimate:
+    """分析过程中按簇累计的点赞加权情感分布
+
+    簇代表得到标签后整簇都计入估计，不必等簇内其余评论轮到。
+    """
+
+    def __init__(self, like_counts, cluster_ids, labels=None, confidence=0.95):
+        """
+        Args:
+            like_counts: 参与估计的评论点赞数
+            cluster_ids: 与 like_counts 对应的簇代表下标
+            labels: 情感取值，默认取 CHART_CONFIG['labels']
+            confidence: 统计区间的置信水平
+        """
+        self.labels = tuple(labels or CHART_CONFIG['labels'])
+        self.confidence = confidence
+        self.z = z_score(confidence)
+        cluster_ids = np.asarray(cluster_ids, dtype=np.int64)
+        weights = like_weights(like_counts)
+        size = int(cluster_ids.max()) + 1 if len(cluster_ids) else 0
+        # 每簇的评论数、权重和与权重平方和，用于有效样本量
+        self._rows = np.bincount(cluster_ids, minlength=size)
+        self._weight = np.bincount(cluster_ids, weights=weights, minlength=size)
+        self._weight_sq = np.bincount(cluster_ids, weights=weights * weights, minlength=size)
+        self.total_rows = len(cluster_ids)
+        self.total_weight = float(weights.sum())
+        self._seen = set()
+        self.rows = 0
+        self.weight_sq = 0.0
+        self.class_weight = dict.fromkeys(self.labels, 0.0)
+
+    def add_cluster(self, representative, sentiment):
+        """簇代表得到标签，分析失败的簇不计入"""
+        if sentiment not in self.class_weight or representative in self._seen:
+            return
+        self._seen.add(representative)
+        self.rows += int(self._rows[representative])
+        self.weight_sq += float(self._weight_sq[representative])
+        self.class_weight[sentiment] += float(self._weight[representative])
+
+    @property
+    def labeled_weight(self):
+        return sum(self.class_weight.values())
+
+    def snapshot(self):
+        """当前估计
+
+        Returns:
+            {'rows': 已覆盖条数, 'total': 总条数, 'coverage': 点赞权重覆盖率,
+             'effective_n': 有效样本量, 'confidence': 置信水平,
+             'classes': {情感: {'ratio', 'low', 'high', 'min', 'max'}}}
+        """
+        labeled = self.labeled_weight
+        coverage = labeled / self.total_weight if self.total_weight else 0.0
+        effective_n = labeled * labeled / self.weight_sq if self.weight_sq else 0.0
+        classes = {}
+        for label, weight in self.class_weight.items():
+            ratio = weight / labeled if labeled else 0.0
+            margin = self.z * (ratio * (1 - ratio) / effective_n) ** 0.5 if effective_n else 1.0
+            # 已分析部分是确定的，只有未分析部分的占比有不确定性
+            known = weight / self.total_weight if self.total_weight else 0.0
+            classes[label] = {
+                'ratio': ratio,
+                'low': known + (1 - coverage) * max(ratio - margin, 0.0),
+                'high': known + (1 - coverage) * min(ratio + margin, 1.0),
+                'min': known,
+                'max': known + 1 - coverage
+            }
+        return {
+            'rows': self.rows,
+            'total': self.total_rows,
+            'coverage': coverage,
+            'effective_n': effective_n,
+            'confidence': self.confidence,
+            'classes': classes
+        }
+
+
+def format_estimate(snapshot, names=None):
+    """一行文字描述中途估计：估计值(统计区间，确定区间)"""
+    names = names or CHART_CONFIG['labels']
+    parts = [
+        f"{names.get(label, label)} {item['ratio'] * 100:.1f}%"
+        f"({item['low'] * 100:.1f}%~{item['high'] * 100:.1f}%，"
+        f"至少{item['min'] * 100:.1f}% 至多{item['max'] * 100:.1f}%)"
+        for label, item in snapshot['classes'].items()
+    ]
+    parts.append(f"已覆盖 {snapshot['rows']}/{snapshot['total']} 条")
+    parts.append(f"点赞权重 {snapshot['coverage'] * 100:.1f}%")
+    return ' | '.join(parts)
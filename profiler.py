@@ -0,0 +1,114 @@
+"""按阶段(爬取/分析/图表)进行性能剖析
+
+每个阶段生成两类文件，保存在该阶段的输出目录下的 profiles/ 中:
+    <阶段>_<时间戳>.collapsed  采样得到的折叠调用栈，可直接交给 flamegraph.pl / speedscope
+    <阶段>_<时间戳>.prof       cProfile 统计结果，可用 pstats / snakeviz 查看
+"""
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from config import PROFILE_CONFIG
+
+
+class StackSampler:
+    """定时采集所有线程的调用栈，统计折叠栈出现次数"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def _frame_label(frame):
+        code = frame.f_code
+        filename = os.path.basename(code.co_filename)
+        return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(';', ',')
+
+    def _sample(self):
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, str(thread_id)).replace(';', ','))
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def write_collapsed(self, path):
+        """写出 flamegraph 兼容的折叠栈文件，每行为“栈 次数”"""
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+
+class PhaseProfiler:
+    """按阶段剖析，未启用时不产生任何开销"""
+
+    def __init__(self, enabled=None):
+        self.config = PROFILE_CONFIG
+        self.enabled = self.config['enabled'] if enabled is None else enabled
+        self.last_files = []  # 最近一次剖析生成的文件
+
+    @contextmanager
+    def phase(self, name, output_dir):
+        """剖析一个阶段
+
+        Args:
+            name: 阶段名，如 crawl / analyze / chart
+            output_dir: 该阶段的输出目录，剖析文件写在其 profiles/ 子目录
+        """
+        if not self.enabled:
+            yield
+            return
+
+        sampler = StackSampler(self.config['interval'])
+        profile = None
+        if self.config['cprofile']:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # 同一时刻只能有一个 cProfile 生效(如爬取和分析并发时)，此时只做采样
+                profile = None
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            if profile:
+                profile.disable()
+            self.last_files = self._write(name, output_dir, sampler, profile)
+
+    def _write(self, name, output_dir, sampler, profile):
+        profile_dir = os.path.join(output_dir, 'profiles')
+        os.makedirs(profile_dir, exist_ok=True)
+        prefix = os.path.join(profile_dir, f"{name}_{int(time.time())}")
+        files = [sampler.write_collapsed(prefix + '.collapsed')]
+        if profile:
+            profile.dump_stats(prefix + '.prof')
+            files.append(prefix + '.prof')
+        print(f"性能剖析结果已保存: {', '.join(files)}")
+        return files
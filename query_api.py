@@ -0,0 +1,402 @@
+"""分析结果的本地HTTP查询接口
+
+把分析结果CSV导入SQLite索引，供看板直接查询，不用再解析CSV：
+    GET /posts                           所有微博及评论数
+    GET /posts/<id>/counts               情感计数与点赞加权占比
+    GET /posts/<id>/trend?bucket=hour    按小时/天的情感走势
+    GET /posts/<id>/comments?sentiment=0&q=关键词&sort=likes&page=1&page_size=50
+    GET /posts/<id>/terms?sentiment=2&limit=50   高频词
+
+单次分析的结果以文件名(如 analyzed_1700000000)作为微博标识，监控服务的结果以微博id作为标识。
+分析文件有变化时才重新导入；响应带 ETag，数据没变时重复轮询直接返回304。
+
+用法:
+    python query_api.py --port 8090
+"""
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from config import ANALYZER_CONFIG, MONITOR_CONFIG, QUERY_API_CONFIG
+from dictionary_manager import get_dictionary_manager
+from metrics import METRICS
+from text_normalizer import normalize_texts
+
+LABELS = (0, 1, 2)
+TIME_FORMATS = ('%a %b %d %H:%M:%S %z %Y', '%Y-%m-%d %H:%M:%S')
+BUCKETS = {'hour': 3600, 'day': 86400}
+SORTS = {
+    'likes': 'like_count DESC, comment_id',
+    'time': 'created_ts DESC, comment_id',
+    'id': 'comment_id'
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY, post TEXT, mtime REAL, size INTEGER
+);
+CREATE TABLE IF NOT EXISTS comments (
+    post TEXT, file TEXT, comment_id INTEGER, parent_id INTEGER, content TEXT,
+    created_at TEXT, created_ts INTEGER, user_name TEXT, like_count INTEGER, sentiment INTEGER
+);
+CREATE INDEX IF NOT EXISTS comments_post_sentiment ON comments (post, sentiment);
+CREATE INDEX IF NOT EXISTS comments_post_time ON comments (post, created_ts);
+CREATE INDEX IF NOT EXISTS comments_post_likes ON comments (post, like_count);
+CREATE INDEX IF NOT EXISTS comments_file ON comments (file);
+CREATE INDEX IF NOT EXISTS comments_post_id ON comments (post, comment_id);
+"""
+
+
+def analysis_sources():
+    """(微博标识, 分析结果文件) 列表"""
+    sources = []
+    for path in glob.glob(os.path.join(ANALYZER_CONFIG['output_dir'], 'analyzed_*.csv')):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if not name.startswith('analyzed_partial_'):
+            sources.append((name, path))
+    for path in glob.glob(os.path.join(MONITOR_CONFIG['state_dir'], '*', 'analyzed', '*.csv')):
+        sources.append((os.path.basename(os.path.dirname(os.path.dirname(path))), path))
+    return sources
+
+
+def parse_time(value):
+    """微博时间转为时间戳，无法解析时返回None"""
+    for fmt in TIME_FORMATS:
+        try:
+            return int(datetime.strptime(value, fmt).timestamp())
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _int(value, default=0):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+class ResultIndex:
+    """分析结果的SQLite索引"""
+
+    def __init__(self, path, sources=analysis_sources, refresh_seconds=2.0):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+        self.sources = sources
+        self.refresh_seconds = refresh_seconds
+        self.version = ''
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        """导入新增或变化的分析文件，删除已不存在的文件，返回是否有变化
+
+        监控服务会把重试成功的评论再写进一个新文件，同一微博中同一条评论只保留最新文件里的结果。
+        """
+        now = time.monotonic()
+        if not force and now - self._checked < self.refresh_seconds:
+            return False
+        with self._lock:
+            self._checked = now
+            known = {path: ((mtime, size), post) for path, post, mtime, size in
+                     self.conn.execute('SELECT path, post, mtime, size FROM files')}
+            current = {}
+            posts = {}
+            affected = set()
+            for post, path in self.sources():
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                current[path] = (stat.st_mtime, stat.st_size)
+                posts[path] = post
+                if known.get(path, (None,))[0] != current[path]:
+                    self._import(post, path, stat.st_mtime, stat.st_size)
+                    affected.add(post)
+            removed = {known[path][1] for path in set(known) - set(current)}
+            for path in set(known) - set(current):
+                self.conn.execute('DELETE FROM comments WHERE file = ?', (path,))
+                self.conn.execute('DELETE FROM files WHERE path = ?', (path,))
+            # 被删除的文件可能覆盖过旧文件中的结果，重新导入该微博的其余文件
+            for path in sorted((path for path in current if posts[path] in removed), key=current.get):
+                self._import(posts[path], path, *current[path])
+            affected |= removed
+            for post in affected:
+                self._dedupe(post)
+            changed = bool(affected)
+            self.conn.commit()
+            if changed or not self.version:
+                digest = hashlib.sha1()
+                for path in sorted(current):
+                    digest.update(f'{path}|{current[path][0]}|{current[path][1]}\n'.encode('utf-8'))
+                self.version = digest.hexdigest()[:16]
+            return changed
+
+    def _import(self, post, path, mtime, size):
+        self.conn.execute('DELETE FROM comments WHERE file = ?', (path,))
+        with METRICS.timer('query_index_import_seconds'), \
+                open(path, encoding='utf-8-sig', newline='') as f:
+            batch = []
+            for record in csv.DictReader(f):
+                batch.append((
+                    post, path, _int(record.get('comment_id')), _int(record.get('parent_id')),
+                    record.get('content', ''), record.get('created_at', ''),
+                    parse_time(record.get('created_at')), record.get('user_name', ''),
+                    _int(record.get('like_count')), _int(record.get('sentiment'), -1)
+                ))
+                if len(batch) >= 5000:
+                    self._insert(batch)
+                    batch = []
+            self._insert(batch)
+        self.conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', (path, post, mtime, size))
+
+    def _dedupe(self, post):
+        """同一条评论出现在多个文件中时只保留最新文件(修改时间最晚)里的结果"""
+        self.conn.execute(
+            'DELETE FROM comments WHERE post = ? AND rowid IN ('
+            ' SELECT c.rowid FROM comments c JOIN files f ON f.path = c.file'
+            ' WHERE c.post = ? AND EXISTS ('
+            '  SELECT 1 FROM comments n JOIN files nf ON nf.path = n.file'
+            '  WHERE n.post = c.post AND n.comment_id = c.comment_id'
+            '  AND (nf.mtime > f.mtime OR (nf.mtime = f.mtime AND n.file > c.file))))',
+            (post, post)
+        )
+
+    def _insert(self, rows):
+        self.conn.executemany('INSERT INTO comments VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def posts(self):
+        rows = self._query(
+            'SELECT post, COUNT(*), MIN(created_ts), MAX(created_ts) FROM comments GROUP BY post ORDER BY post'
+        )
+        return [{'post': post, 'comments': count, 'first': first, 'last': last}
+                for post, count, first, last in rows]
+
+    def counts(self, post):
+        rows = self._query(
+            'SELECT sentiment, COUNT(*), SUM(MAX(like_count, 0) + 1), SUM(like_count) '
+            'FROM comments WHERE post = ? GROUP BY sentiment', (post,)
+        )
+        if not rows:
+            return None
+        total_weight = sum(weight for sentiment, _, weight, _ in rows if sentiment in LABELS)
+        result = {'total': sum(count for _, count, _, _ in rows), 'sentiments': {}}
+        for sentiment, count, weight, likes in rows:
+            result['sentiments'][str(sentiment)] = {
+                'count': count,
+                'likes': likes,
+                'weighted_ratio': weight / total_weight if sentiment in LABELS and total_weight else None
+            }
+        return result
+
+    def trend(self, post, bucket='hour'):
+        if bucket not in BUCKETS:
+            raise ValueError(f"bucket 只能是 {', '.join(BUCKETS)}")
+        size = BUCKETS[bucket]
+        rows = self._query(
+            'SELECT created_ts / ? * ? AS bucket, sentiment, COUNT(*) FROM comments '
+            'WHERE post = ? AND created_ts IS NOT NULL GROUP BY bucket, sentiment ORDER BY bucket',
+            (size, size, post)
+        )
+        series = OrderedDict()
+        for start, sentiment, count in rows:
+            point = series.setdefault(start, {'time': start, **{str(label): 0 for label in LABELS}})
+            point[str(sentiment)] = count
+        return list(series.values())
+
+    def comments(self, post, sentiment=None, keyword=None, sort='likes', page=1, page_size=50):
+        if sort not in SORTS:
+            raise ValueError(f"sort 只能是 {', '.join(SORTS)}")
+        where = ['post = ?']
+        params = [post]
+        if sentiment is not None:
+            where.append('sentiment = ?')
+            params.append(sentiment)
+        if keyword:
+            where.append('content LIKE ?')
+            params.append(f'%{keyword}%')
+        condition = ' AND '.join(where)
+        total = self._query(f'SELECT COUNT(*) FROM comments WHERE {condition}', params)[0][0]
+        rows = self._query(
+            f'SELECT comment_id, parent_id, content, created_at, user_name, like_count, sentiment '
+            f'FROM comments WHERE {condition} ORDER BY {SORTS[sort]} LIMIT ? OFFSET ?',
+            params + [page_size, (page - 1) * page_size]
+        )
+        columns = ('comment_id', 'parent_id', 'content', 'created_at', 'user_name', 'like_count', 'sentiment')
+        return {
+            'total': total,
+            'page': page,
+            'page_size': page_size,
+            'items': [dict(zip(columns, row)) for row in rows]
+        }
+
+    def terms(self, post, sentiment=None, limit=50):
+        sql = 'SELECT content FROM comments WHERE post = ?'
+        params = [post]
+        if sentiment is not None:
+            sql += ' AND sentiment = ?'
+            params.append(sentiment)
+        counter = Counter()
+        texts = normalize_texts([content or '' for (content,) in self._query(sql, params)])
+        dictionaries = get_dictionary_manager()
+        with METRICS.timer('segmentation_seconds'):
+            for text in texts:
+                counter.update(dictionaries.words(text))
+        return [{'term': term, 'count': count} for term, count in counter.most_common(limit)]
+
+
+class QueryServer(ThreadingHTTPServer):
+    """查询接口服务，缓存最近的响应"""
+
+    daemon_threads = True
+
+    def __init__(self, address, index, config=None):
+        super().__init__(address, _QueryHandler)
+        self.index = index
+        self.config = config or QUERY_API_CONFIG
+        self.cache = OrderedDict()  # 请求路径 -> (版本, 响应体)
+        self.cache_lock = threading.Lock()
+
+    def cached(self, key, version):
+        with self.cache_lock:
+            entry = self.cache.get(key)
+            if entry and entry[0] == version:
+                self.cache.move_to_end(key)
+                return entry[1]
+        return None
+
+    def store(self, key, version, body):
+        with self.cache_lock:
+            self.cache[key] = (version, body)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.config['cache_size']:
+                self.cache.popitem(last=False)
+
+
+class _QueryHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split('/') if part]
+        endpoint = parts[2] if len(parts) == 3 else '/'.join(parts[:1])
+
+        server.index.refresh()
+        version = server.index.version
+        etag = '"' + hashlib.sha1(f'{version}|{self.path}'.encode('utf-8')).hexdigest()[:16] + '"'
+        if self.headers.get('If-None-Match') == etag:
+            self._finish(304, endpoint, etag=etag)
+            return
+
+        body = server.cached(self.path, version)
+        if body is None:
+            try:
+                result = self._route(parts, parse_qs(url.query))
+            except ValueError as e:
+                self._finish(400, endpoint, json.dumps({'error': str(e)}, ensure_ascii=False).encode('utf-8'))
+                return
+            if result is None:
+                self._finish(404, endpoint, b'{"error": "not found"}')
+                return
+            body = json.dumps(result, ensure_ascii=False).encode('utf-8')
+            server.store(self.path, version, body)
+        self._finish(200, endpoint, body, etag=etag)
+
+    def _route(self, parts, query):
+        index = self.server.index
+        config = self.server.config
+
+        def param(name, default=None):
+            return query.get(name, [default])[0]
+
+        def int_param(name, default=None):
+            value = param(name)
+            if value is None or value == '':
+                return default
+            try:
+                return int(value)
+            except ValueError:
+                raise ValueError(f"{name} 必须是整数")
+
+        if parts == ['posts']:
+            return {'posts': index.posts()}
+        if len(parts) != 3 or parts[0] != 'posts':
+            return None
+        post, endpoint = parts[1], parts[2]
+        if endpoint == 'counts':
+            return index.counts(post)
+        if endpoint == 'trend':
+            return {'bucket': param('bucket', 'hour'), 'points': index.trend(post, param('bucket', 'hour'))}
+        if endpoint == 'comments':
+            page = max(int_param('page', 1), 1)
+            page_size = min(max(int_param('page_size', config['page_size']), 1), config['max_page_size'])
+            return index.comments(
+                post, int_param('sentiment'), param('q'), param('sort', 'likes'), page, page_size
+            )
+        if endpoint == 'terms':
+            return {'terms': index.terms(post, int_param('sentiment'), min(int_param('limit', 50), 500))}
+        return None
+
+    def _finish(self, status, endpoint, body=b'', etag=None):
+        METRICS.counter('query_api_requests_total', endpoint=endpoint or '/', status=status).inc()
+        self.send_response(status)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        if status != 304:
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host=None, port=None, index_path=None):
+    """启动查询服务，返回服务器对象(已在后台线程运行)"""
+    config = QUERY_API_CONFIG
+    index = ResultIndex(index_path or config['index_path'], refresh_seconds=config['refresh_seconds'])
+    server = QueryServer((host or config['host'], config['port'] if port is None else port), index)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分析结果查询接口')
+    parser.add_argument('--host', default=QUERY_API_CONFIG['host'])
+    parser.add_argument('--port', type=int, default=QUERY_API_CONFIG['port'])
+    parser.add_argument('--index', default=QUERY_API_CONFIG['index_path'], help='SQLite索引文件')
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.index)
+    print(f"查询接口已启动: http://{args.host}:{server.server_address[1]}/posts")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
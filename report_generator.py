@@ -0,0 +1,312 @@
+"""批量生成分析报告
+
+对一批微博的分析结果分别生成饼图、词云、情感走势图和统计，每条微博一个文件夹，
+最后汇总成 index.html 和 index.md。数据来源可以是分析结果目录，也可以是查询接口的SQLite索引。
+各微博在进程池中并行渲染；每个进程只初始化一次字体和分词词典，
+同一条微博的数据只读一次，词频只统计一次，整体词云和各情感词云共用。
+
+用法:
+    python report_generator.py                        # 默认的分析结果和监控结果目录
+    python report_generator.py --dir data/monitor --workers 4 --since 2024-01-01
+    python report_generator.py --index data/query_index.sqlite --posts 4975123 4975456 --since 2024-01-01
+"""
+import argparse
+import glob
+import html
+import json
+import os
+import re
+import sqlite3
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from config import CHART_CONFIG, QUERY_API_CONFIG, REPORT_CONFIG
+from lazy_modules import lazy_import
+
+pd = lazy_import('pandas')
+
+LABELS = CHART_CONFIG['labels']
+INDEX_COLUMNS = 'comment_id, parent_id, content, created_at, user_name, like_count, sentiment'
+
+_chart = None  # 每个渲染进程各自的 ChartMaker
+
+
+def directory_sources(directory):
+    """扫描目录中的分析结果，返回 {微博标识: {'files': [...]}}
+
+    支持两种布局：目录下直接放 analyzed_*.csv(以文件名为标识)，
+    以及监控服务的 <目录>/<微博id>/analyzed/*.csv(同一条微博的多次结果合并)。
+    """
+    sources = {}
+    for path in sorted(glob.glob(os.path.join(directory, 'analyzed_*.csv'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if not name.startswith('analyzed_partial_'):
+            sources[name] = {'files': [path]}
+    for path in sorted(glob.glob(os.path.join(directory, '*', 'analyzed', '*.csv'))):
+        post = os.path.basename(os.path.dirname(os.path.dirname(path)))
+        sources.setdefault(post, {'files': []})['files'].append(path)
+    return sources
+
+
+def default_sources():
+    """与查询接口相同的来源：分析结果目录和监控结果目录"""
+    from query_api import analysis_sources
+    sources = {}
+    for post, path in sorted(analysis_sources()):
+        sources.setdefault(post, {'files': []})['files'].append(path)
+    return sources
+
+
+def index_sources(index_path, posts=None, since=None):
+    """从查询接口的SQLite索引中选出微博
+
+    Args:
+        posts: 只包含这些微博标识，None为全部
+        since: 只包含该时间之后有评论的微博(时间戳)
+    """
+    sql = 'SELECT post FROM comments'
+    params = []
+    if since is not None:
+        sql += ' WHERE created_ts >= ?'
+        params.append(since)
+    sql += ' GROUP BY post ORDER BY post'
+    with sqlite3.connect(f'file:{index_path}?mode=ro', uri=True) as conn:
+        found = [post for (post,) in conn.execute(sql, params)]
+    return {post: {'index': index_path} for post in found if posts is None or post in posts}
+
+
+def filter_since(sources, since):
+    """只保留 since(时间戳)之后有评论的目录来源，评论时间的解析与查询接口的索引一致"""
+    from query_api import parse_time
+    kept = {}
+    for post, source in sources.items():
+        for path in source['files']:
+            try:
+                times = pd.read_csv(path, usecols=['created_at'], dtype=str)['created_at']
+            except ValueError:
+                continue  # 没有 created_at 列
+            timestamps = (parse_time(value) for value in times)
+            if any(ts is not None and ts >= since for ts in timestamps):
+                kept[post] = source
+                break
+    return kept
+
+
+def load_source(post, source):
+    """读取一条微博的全部分析结果"""
+    if 'index' in source:
+        with sqlite3.connect(f"file:{source['index']}?mode=ro", uri=True) as conn:
+            return pd.read_sql_query(
+                f'SELECT {INDEX_COLUMNS} FROM comments WHERE post = ? ORDER BY comment_id', conn, params=(post,)
+            )
+    frames = [pd.read_csv(path) for path in sorted(source['files'], key=os.path.getmtime)]
+    if len(frames) == 1:
+        return frames[0]
+    # 监控服务重试成功的评论会出现在多个文件中，按文件先后只保留最新的结果
+    df = pd.concat(frames, ignore_index=True)
+    return df.drop_duplicates('comment_id', keep='last', ignore_index=True)
+
+
+def folder_name(post):
+    return re.sub(r'[^\w\-]+', '_', str(post)).strip('_') or 'post'
+
+
+def _init_worker():
+    """渲染进程初始化：字体从磁盘缓存读取，分词词典加载一次"""
+    global _chart
+    from chart_maker import ChartMaker
+    from dictionary_manager import get_dictionary_manager
+    _chart = ChartMaker()
+    _chart.fonts.font_path
+    get_dictionary_manager().warmup()
+
+
+def render_post(post, source, output_dir, config=None):
+    """生成一条微博的报告文件夹，返回摘要"""
+    from comment_ranker import like_weighted_distribution, top_k_by_likes
+    config = config or REPORT_CONFIG
+    if _chart is None:
+        _init_worker()
+    start = time.perf_counter()
+    df = load_source(post, source)
+    df['like_count'] = df['like_count'].fillna(0)
+    post_dir = os.path.join(output_dir, folder_name(post))
+    os.makedirs(post_dir, exist_ok=True)
+    _chart.output_dir = post_dir
+
+    files = {
+        'pie': _chart.create_pie_chart(df),
+        'trend': _chart.create_trend_chart(df),
+        'stats': _chart.save_sentiment_stats(df)[0]
+    }
+    # 按情感分别统计词频，整体词频由各情感相加，不再重复分词
+    frequencies = {int(s): _chart.word_frequencies(df, s) for s in df['sentiment'].dropna().unique()}
+    overall = sum(frequencies.values(), Counter())
+    files['wordcloud'] = _chart.create_wordcloud(df, frequencies=overall)
+    if config['sentiment_wordclouds']:
+        for sentiment in LABELS:
+            if frequencies.get(sentiment):
+                files[f'wordcloud_{sentiment}'] = _chart.create_wordcloud(
+                    df, sentiment, frequencies=frequencies[sentiment]
+                )
+
+    distribution = like_weighted_distribution(df, tuple(LABELS))
+    top_comments = {
+        sentiment: [
+            {'content': str(row['content']), 'like_count': int(row['like_count'])}
+            for _, row in top_k_by_likes(df, config['top_comments'], sentiment).iterrows()
+        ]
+        for sentiment in LABELS
+    }
+    summary = {
+        'post': post,
+        'folder': folder_name(post),
+        'comments': len(df),
+        'failed': int((~df['sentiment'].isin(list(LABELS))).sum()),
+        'sentiments': {str(s): value for s, value in distribution.items()},
+        'top_terms': overall.most_common(config['top_terms']),
+        'top_comments': {str(s): value for s, value in top_comments.items()},
+        'files': {name: os.path.basename(path) for name, path in files.items() if path},
+        'seconds': time.perf_counter() - start
+    }
+    with open(os.path.join(post_dir, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    with open(os.path.join(post_dir, 'report.md'), 'w', encoding='utf-8') as f:
+        f.write(post_markdown(summary))
+    return summary
+
+
+def _ratio(summary, sentiment):
+    item = summary['sentiments'].get(str(sentiment))
+    if not item or not summary['comments']:
+        return 0.0, 0.0
+    return item['count'] / summary['comments'], item['ratio']
+
+
+def post_markdown(summary):
+    """单条微博的 report.md"""
+    lines = [f"# {summary['post']}", '', f"评论 {summary['comments']} 条，分析失败 {summary['failed']} 条", '',
+             '| 情感 | 条数 | 占比 | 点赞加权占比 |', '|------|------|------|------------|']
+    for sentiment, label in LABELS.items():
+        share, weighted = _ratio(summary, sentiment)
+        count = summary['sentiments'][str(sentiment)]['count']
+        lines.append(f'| {label} | {count} | {share:.1%} | {weighted:.1%} |')
+    lines.append('')
+    for name in ('pie', 'trend', 'wordcloud'):
+        if name in summary['files']:
+            lines.append(f"![{name}]({summary['files'][name]})")
+    lines += ['', '## 高频词', '', '、'.join(f'{term}({count})' for term, count in summary['top_terms']), '']
+    for sentiment, label in LABELS.items():
+        comments = summary['top_comments'][str(sentiment)]
+        if comments:
+            lines += [f'## 高赞{label}评论', '']
+            lines += [f"- ({item['like_count']}赞) {item['content']}" for item in comments]
+            lines.append('')
+    return '\n'.join(lines)
+
+
+def write_index(summaries, output_dir):
+    """汇总所有微博，生成 index.md 和 index.html"""
+    header = ['微博', '评论数'] + [f'{label}(加权)' for label in LABELS.values()] + ['高频词']
+    md = ['# 情感分析报告', '', f"生成时间 {datetime.now():%Y-%m-%d %H:%M}，共 {len(summaries)} 条微博", '',
+          '| ' + ' | '.join(header) + ' |', '|' + '---|' * len(header)]
+    rows = []
+    for summary in summaries:
+        ratios = []
+        for sentiment in LABELS:
+            share, weighted = _ratio(summary, sentiment)
+            ratios.append(f'{share:.1%} ({weighted:.1%})')
+        terms = '、'.join(term for term, _ in summary['top_terms'][:5])
+        md.append(f"| [{summary['post']}]({summary['folder']}/report.md) | {summary['comments']} | "
+                  + ' | '.join(ratios) + f' | {terms} |')
+        pie = summary['files'].get('pie')
+        thumbnail = f'<img src="{summary["folder"]}/{pie}" width="120">' if pie else ''
+        cells = [f'<a href="{summary["folder"]}/report.md">{html.escape(str(summary["post"]))}</a>{thumbnail}',
+                 str(summary['comments'])] + ratios + [html.escape(terms)]
+        rows.append('<tr>' + ''.join(f'<td>{cell}</td>' for cell in cells) + '</tr>')
+
+    md_file = os.path.join(output_dir, 'index.md')
+    with open(md_file, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(md) + '\n')
+    html_file = os.path.join(output_dir, 'index.html')
+    with open(html_file, 'w', encoding='utf-8') as f:
+        f.write(
+            '<!DOCTYPE html>\n<html lang="zh-CN"><head><meta charset="utf-8"><title>情感分析报告</title>'
+            '<style>table{border-collapse:collapse}td,th{border:1px solid #ccc;padding:4px 8px}'
+            'img{display:block}</style></head><body>\n'
+            f'<h1>情感分析报告</h1><p>{html.escape(md[2])}</p>\n<table><tr>'
+            + ''.join(f'<th>{html.escape(name)}</th>' for name in header) + '</tr>\n'
+            + '\n'.join(rows) + '\n</table></body></html>\n'
+        )
+    return html_file, md_file
+
+
+def generate_reports(sources, output_dir=None, workers=None, config=None):
+    """并行生成所有微博的报告
+
+    Args:
+        sources: {微博标识: 来源}，见 directory_sources / index_sources
+        output_dir: 报告目录，默认为 reports/<时间>
+        workers: 渲染进程数，默认读取配置
+
+    Returns:
+        (index.html 路径, 成功生成的微博摘要列表)
+    """
+    config = config or REPORT_CONFIG
+    output_dir = output_dir or os.path.join(config['output_dir'], datetime.now().strftime('%Y%m%d_%H%M%S'))
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or config['workers'] or os.cpu_count() or 1
+
+    # 先在主进程解析一次字体并写入磁盘缓存，子进程直接读取
+    from font_registry import get_font_registry
+    get_font_registry().font_path
+
+    summaries = []
+    with ProcessPoolExecutor(max_workers=min(workers, max(len(sources), 1)), initializer=_init_worker) as pool:
+        futures = {pool.submit(render_post, post, source, output_dir, config): post
+                   for post, source in sources.items()}
+        for future in as_completed(futures):
+            post = futures[future]
+            try:
+                summaries.append(future.result())
+                print(f"已生成 {post} ({len(summaries)}/{len(futures)})")
+            except Exception as e:
+                print(f"生成报告失败({post}): {str(e)}")
+    summaries.sort(key=lambda item: str(item['post']))
+    html_file, _ = write_index(summaries, output_dir)
+    return html_file, summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量生成情感分析报告')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--dir', help='分析结果目录')
+    source.add_argument('--index', nargs='?', const=QUERY_API_CONFIG['index_path'], help='查询接口的SQLite索引')
+    parser.add_argument('--posts', nargs='+', help='只生成这些微博(标识)')
+    parser.add_argument('--since', help='只包含该日期之后有评论的微博，如 2024-01-01')
+    parser.add_argument('--output', help='报告目录，默认 reports/<时间>')
+    parser.add_argument('--workers', type=int, default=REPORT_CONFIG['workers'], help='渲染进程数，0为CPU核数')
+    args = parser.parse_args()
+
+    since = int(datetime.strptime(args.since, '%Y-%m-%d').timestamp()) if args.since else None
+    if args.index:
+        sources = index_sources(args.index, args.posts, since)
+    else:
+        sources = directory_sources(args.dir) if args.dir else default_sources()
+        if args.posts:
+            sources = {post: source for post, source in sources.items() if post in args.posts}
+        if since is not None:
+            sources = filter_since(sources, since)
+    if not sources:
+        print("没有找到分析结果")
+        return
+
+    start = time.perf_counter()
+    html_file, summaries = generate_reports(sources, args.output, args.workers)
+    print(f"共生成 {len(summaries)}/{len(sources)} 条微博的报告，用时 {time.perf_counter() - start:.1f} 秒: {html_file}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,153 +1,388 @@
-import pandas as pd
-import requests
+import csv
 import os
 import time
+from lazy_modules import lazy_import
 from config import ANALYZER_CONFIG, ERROR_MESSAGES
+from checkpoint import CheckpointJournal
+from comment_ranker import SentimentTopK
+from comment_store import CommentStore
+from dedup import CommentDeduplicator
+from http_client import HttpClient, HttpError, pause
+from metrics import METRICS
+from priority_scheduler import ProgressiveEstimate, format_estimate, priority_order
+from token_budget import TokenBudget, UsageTracker, estimate_tokens, truncate_text
+
+pd = lazy_import('pandas')
+np = lazy_import('numpy')
 
 class SentimentAnalyzer:
-    def __init__(self):
-        self.config = ANALYZER_CONFIG
+    def __init__(self, config=None):
+        self.config = config or ANALYZER_CONFIG
         self.api_key = None
         self.progress_callback = None
+        self.interim_callback = None  # 收到中途估计(见 priority_scheduler.ProgressiveEstimate.snapshot)
+        self.interim = None  # 最近一次的中途估计
         self.is_running = True
         self.current_index = 0
         self.last_file = None
+        self.store = None  # 当前分析的评论存储
+        self.chunk_output = None  # 分块分析的结果文件
+        # 流式维护各情感点赞最高的评论
+        self.top_comments = SentimentTopK(self.config['top_k'])
+        # 近似重复评论聚类，每簇只调用一次API
+        dedup_config = self.config['dedup']
+        self.deduplicator = CommentDeduplicator(
+            num_perm=dedup_config['num_perm'],
+            bands=dedup_config['bands'],
+            threshold=dedup_config['threshold'],
+            max_anchors=dedup_config['max_anchors']
+        )
+        self.cluster_labels = {}  # 簇代表下标 -> 情感
+        self.http = HttpClient()
+        # 按RPM/TPM调度请求并累计token用量
+        budget_config = self.config['budget']
+        self.budget = TokenBudget(rpm=budget_config['rpm'], tpm=budget_config['tpm'])
+        self.usage = UsageTracker(budget_config['price_per_million'])
     
     def set_api_key(self, api_key):
         """设置API密钥"""
         self.api_key = api_key
         
-    def resume(self):
-        """继续分析"""
+    def resume(self, comments_file=None, store=None):
+        """继续分析
+        
+        按检查点日志跳过已完成的评论；进程重启后未指定文件时，
+        从检查点目录找回最近一次未完成的输入文件。
+        """
         self.is_running = True
-        if self.last_file and os.path.exists(self.last_file):
-            return self.analyze_comments(self.last_file, start_from=self.current_index)
+        comments_file = (comments_file or self.last_file
+                         or CheckpointJournal.latest_input(self.config['checkpoint_dir']))
+        if comments_file and os.path.exists(comments_file):
+            return self.analyze_comments(comments_file, store=store, resume=True)
         return None
         
     def stop(self):
         """停止分析"""
         self.is_running = False
         
-    def analyze_comments(self, comments_file, start_from=0):
-        """分析评论"""
+    def _journal(self, comments_file):
+        return CheckpointJournal(
+            comments_file,
+            self.config['checkpoint_dir'],
+            fsync_interval=self.config['checkpoint_fsync_seconds']
+        )
+        
+    def analyze_comments(self, comments_file, start_from=0, store=None, resume=False):
+        """分析评论
+        
+        Args:
+            comments_file: 爬虫输出的评论CSV
+            start_from: 从第几条开始分析
+            store: 已在内存中的 CommentStore(如爬虫的 comments)，传入时不再读取文件
+            resume: 按检查点日志续跑，已完成的评论不再调用API
+            
+        Returns:
+            完整结果文件路径；中途停止时返回None，进度保存在检查点日志中
+        """
+        if not resume:
+            self.usage.reset()
+        journal = self._journal(comments_file)
+        done = journal.load() if resume else {}
+        if resume and journal.meta.get('output'):
+            return self.analyze_chunked(comments_file, resume=True)
+        if store is None and os.path.exists(comments_file) and \
+                os.path.getsize(comments_file) >= self.config['chunked_min_mb'] * 1024 * 1024:
+            return self.analyze_chunked(comments_file, start_from)
         try:
             if not self.api_key:
                 raise ValueError(ERROR_MESSAGES['no_api_key'])
                 
+            # 继续分析同一文件时沿用内存中的存储
+            if store is None:
+                if resume and self.store is not None and comments_file == self.last_file:
+                    store = self.store
+                else:
+                    with METRICS.timer('dataframe_io_seconds', op='read_csv'):
+                        store = CommentStore.from_csv(comments_file)
+            if done:
+                start_from = journal.meta.get('start_from', 0)
+            else:
+                journal.reset(start_from=start_from)
             self.last_file = comments_file
-            df = pd.read_csv(comments_file)
-            results = []
-            total = len(df)
+            self.store = store
+            self.chunk_output = None
+            # 已完成的评论会从日志重新计入，这里总是从头统计
+            self.top_comments.reset()
+            self.cluster_labels = {}
+            total = len(store)
             
-            # 从指定位置继续分析
-            for idx in range(start_from, len(df)):
-                if not self.is_running:
-                    self.current_index = idx  # 保存当前位置
-                    # 保存已分析的结果
-                    if results:
-                        return self._save_partial_results(results)
-                    break
-                    
-                row = df.iloc[idx]
-                try:
-                    sentiment = self._analyze_text(row['content'])
-                    results.append({
-                        'comment_id': row['comment_id'],
-                        'content': row['content'],
-                        'created_at': row['created_at'],
-                        'user_name': row['user_name'],
-                        'like_count': row['like_count'],
-                        'sentiment': sentiment
-                    })
-                    
-                    if self.progress_callback:
-                        progress = (idx + 1) / total * 100
-                        self.progress_callback(progress)
-                        
-                    time.sleep(0.5)  # 避免请求过快
-                    
-                except Exception as e:
-                    print(f"单条评论分析失败: {str(e)}")
-                    results.append({
-                        'comment_id': row['comment_id'],
-                        'content': row['content'],
-                        'created_at': row['created_at'],
-                        'user_name': row['user_name'],
-                        'like_count': row['like_count'],
-                        'sentiment': 1  # 出错时设为中性
-                    })
+            stopped_at = self._analyze_rows(store, start_from, 0, total, journal, done)
+            print(f"API用量: {self.usage.format()}")
+            if stopped_at < total:
+                if self.interim:
+                    print(f"中途估计: {format_estimate(self.interim)}")
+                self.current_index = stopped_at  # 保存当前位置
+                journal.close()
+                return None
             
-            # 保存完整结果
-            if results:
-                return self._save_results(results)
+            # 保存完整结果，成功后删除检查点
+            output_file = self._save_results(store, start_from) if total > start_from else None
+            if output_file:
+                journal.finish()
+            return output_file
                 
         except Exception as e:
             print(f"分析失败: {str(e)}")
+            journal.close()
             return None
             
-    def _save_partial_results(self, results):
-        """保存部分分析结果"""
+    def analyze_chunked(self, comments_file, start_from=0, resume=False):
+        """分块流式分析大文件
+        
+        每次只读入 chunk_size 条评论，分析完立即追加到同一个结果文件，
+        内存占用与文件大小无关。续跑时跳过结果文件中已有的行，
+        已记录在检查点中但还没写入结果文件的评论直接沿用日志中的结果。
+        近似重复评论只在块内合并，优先级排序和中途估计也只在块内进行。
+        """
+        journal = self._journal(comments_file)
         try:
-            if not os.path.exists(self.config['output_dir']):
-                os.makedirs(self.config['output_dir'])
+            if not self.api_key:
+                raise ValueError(ERROR_MESSAGES['no_api_key'])
                 
-            output_file = os.path.join(
-                self.config['output_dir'],
-                f'analyzed_partial_{int(time.time())}.csv'
-            )
+            done = journal.load() if resume else {}
+            output_file = journal.meta.get('output') if done else None
+            if output_file:
+                start_from = journal.meta.get('start_from', 0)
+                written = self._count_rows(output_file) if os.path.exists(output_file) else 0
+            else:
+                self.top_comments.reset()
+                self.usage.reset()
+                output_file = self._output_path('analyzed')
+                journal.reset(start_from=start_from, output=output_file)
+                done = {}
+                written = 0
+            self.last_file = comments_file
+            self.store = None
+            self.chunk_output = output_file
+            total = self._count_rows(comments_file)
             
-            df_result = pd.DataFrame(results)
-            df_result.to_csv(output_file, index=False, encoding='utf-8-sig')
-            return output_file
+            skip = start_from + written
+            offset = skip
+            reader = pd.read_csv(
+                comments_file,
+                chunksize=self.config['chunk_size'],
+                skiprows=lambda line: 0 < line <= skip,
+                dtype={'content': str, 'created_at': str, 'user_name': str},
+                keep_default_na=False
+            )
+            for chunk in reader:
+                store = CommentStore.from_dataframe(chunk)
+                del chunk
+                self.cluster_labels = {}  # 簇代表下标只在块内有效
+                stopped_at = self._analyze_rows(store, 0, offset, total, journal, done)
+                if stopped_at:
+                    self._append_results(store, stopped_at)
+                offset += stopped_at
+                if stopped_at < len(store):
+                    self.current_index = offset  # 保存当前位置
+                    journal.close()
+                    print(f"API用量: {self.usage.format()}")
+                    return None
+                    
+            self.current_index = offset
+            print(f"API用量: {self.usage.format()}")
+            journal.finish()
+            if os.path.exists(output_file):
+                return output_file
+            return None
             
         except Exception as e:
-            print(f"保存部分结果失败: {str(e)}")
+            print(f"分析失败: {str(e)}")
+            journal.close()
             return None
             
-    def _analyze_text(self, text):
-        """调用DeepSeek API进行情感分析"""
-        try:
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
+    def _analyze_rows(self, store, start, offset, total, journal, done):
+        """分析 store 中从 start 开始的评论，结果写回 store 并记入检查点
+        
+        Args:
+            offset: store 第一行在整个输入中的行号，用于进度和Top-K
+            total: 整个输入的评论条数
+            journal: 检查点日志
+            done: 检查点中已完成的评论 {comment_id: (sentiment, error)}，失败的会重试
             
-            data = {
-                'model': 'deepseek-chat',
-                'messages': [{
-                    'role': 'user',
-                    'content': f'请分析下面这段文字的情感倾向(0表示积极,1表示中性,2表示消极),只需要返回数字:\n{text}'
-                }]
-            }
+        按优先级排序时评论不按行号顺序完成，中途停止时只有最前面连续完成的部分算作已分析，
+        其余已完成的评论保存在检查点中，续跑时直接沿用。
             
-            response = requests.post(
-                'https://api.deepseek.com/v1/chat/completions',
-                headers=headers,
-                json=data
+        Returns:
+            停止时第一条未分析评论的行号，全部完成时为 len(store)
+        """
+        count = len(store)
+        # 去掉表情代码、@提及、链接和转发链，prompt 和去重都用规范化后的文本
+        with METRICS.timer('normalize_seconds'):
+            clean_text = store.normalize()
+        # 聚类近似重复评论，簇代表为簇内第一条
+        if self.config['dedup']['enabled']:
+            cluster_ids = self.deduplicator.cluster(clean_text, raw=store.content)
+        else:
+            cluster_ids = np.arange(count)
+        cluster_sizes = np.bincount(cluster_ids, minlength=count)
+        
+        priority_config = self.config['priority']
+        if priority_config['enabled']:
+            order = priority_order(store, cluster_ids, start, priority_config['weights'])
+        else:
+            order = range(start, count)
+        visited = np.zeros(count, dtype=bool)
+        visited[:start] = True
+        estimate = ProgressiveEstimate(
+            store.like_count[start:], cluster_ids[start:], confidence=priority_config['confidence']
+        )
+        self.interim = None
+        
+        for processed, idx in enumerate(order, 1):
+            if not self.is_running:
+                self._emit_interim(estimate)
+                return int(np.argmin(visited)) if not visited.all() else count
+            visited[idx] = True
+            if processed % priority_config['interim_every'] == 0:
+                self._emit_interim(estimate)
+                
+            representative = int(cluster_ids[idx])
+            store.cluster_id[idx] = store.comment_id[representative]
+            store.cluster_size[idx] = int(cluster_sizes[representative])
+            comment_id = store.comment_id[idx]
+            previous = done.get(comment_id)
+            if previous and not previous[1]:
+                sentiment = previous[0]
+                store.set_result(idx, sentiment)
+                self.cluster_labels.setdefault(representative, sentiment)
+                estimate.add_cluster(representative, self.cluster_labels[representative])
+                self.top_comments.add_value(sentiment, store.like_count[idx], offset + idx)
+                continue
+            called_api = representative not in self.cluster_labels
+            try:
+                if called_api:
+                    METRICS.counter('analysis_cache_misses_total').inc()
+                    text = clean_text[idx] if self.config['use_clean_text'] else ''
+                    # 纯表情评论规范化后为空，仍用原文
+                    self.cluster_labels[representative] = self._analyze_text(text or store.content[idx])
+                else:
+                    METRICS.counter('analysis_cache_hits_total').inc()
+                sentiment = self.cluster_labels[representative]
+                estimate.add_cluster(representative, sentiment)
+                store.set_result(idx, sentiment)
+                journal.record(comment_id, sentiment)
+                self.top_comments.add_value(sentiment, store.like_count[idx], offset + idx)
+                
+            except Exception as e:
+                print(f"单条评论分析失败: {str(e)}")
+                # 失败的评论单独标记，不再伪装成中性
+                store.set_result(idx, self.config['error_sentiment'], str(e))
+                journal.record(comment_id, self.config['error_sentiment'], str(e))
+                
+            # 结果已写入后再通知进度，回调抛出异常(如界面已停止分析)只结束循环，不影响已完成的评论
+            if self.progress_callback:
+                try:
+                    self.progress_callback((offset + start + processed) / total * 100)
+                except Exception as e:
+                    print(f"分析中止: {str(e)}")
+                    self.is_running = False
+                    
+            if called_api:
+                pause(self.config['sleep_time'])  # 避免请求过快，回放时跳过
+        self._emit_interim(estimate)
+        return count
+        
+    def _emit_interim(self, estimate):
+        """保存并通知当前的中途估计"""
+        self.interim = estimate.snapshot()
+        if self.interim_callback:
+            self.interim_callback(self.interim)
+            
+    def _count_rows(self, comments_file):
+        """逐行统计评论条数(不含表头)，内容中的换行按CSV规则处理"""
+        with open(comments_file, encoding='utf-8-sig', newline='') as f:
+            return max(sum(1 for _ in csv.reader(f)) - 1, 0)
+            
+    def _output_path(self, prefix):
+        if not os.path.exists(self.config['output_dir']):
+            os.makedirs(self.config['output_dir'])
+        return os.path.join(self.config['output_dir'], f'{prefix}_{int(time.time())}.csv')
+        
+    def _append_results(self, store, stop):
+        """把一块的分析结果追加到分块输出文件"""
+        header = not os.path.exists(self.chunk_output)
+        with METRICS.timer('dataframe_io_seconds', op='write_csv'):
+            store.to_dataframe(0, stop, analysis=True).to_csv(
+                self.chunk_output, mode='a', header=header, index=False, encoding='utf-8-sig'
             )
             
-            result = response.json()
-            content = result['choices'][0]['message']['content'].strip()
-            sentiment = int(content) if content in ['0', '1', '2'] else 1
-            return sentiment
+    def analyze_text(self, text):
+        """分析单条评论并计入API用量，供抽样估计等只分析部分评论的场景使用
+
+        Raises:
+            HttpError, ValueError: 同 _analyze_text
+        """
+        return self._analyze_text(text)
+
+    def _analyze_text(self, text):
+        """调用DeepSeek API进行情感分析
+        
+        超长评论先按策略截断，发送前按RPM/TPM预算排队，回复长度限制为 max_tokens。
+        
+        Raises:
+            HttpError: 请求失败或返回错误状态码
+            ValueError: 返回内容无法解析为情感标签
+        """
+        budget_config = self.config['budget']
+        truncated = truncate_text(text, budget_config['max_input_tokens'], budget_config['truncate_policy'])
+        if truncated is not text:
+            self.usage.truncated += 1
             
-        except Exception as e:
-            print(f"API调用失败: {str(e)}")
-            return 1  # 出错时返回中性
+        headers = {
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        }
+        
+        prompt = self.config['prompt'].format(text=truncated)
+        data = {
+            'model': self.config['model'],
+            'messages': [{
+                'role': 'user',
+                'content': prompt
+            }],
+            'max_tokens': budget_config['max_tokens']
+        }
+        
+        estimated_prompt = estimate_tokens(prompt)
+        reservation = self.budget.acquire(estimated_prompt + budget_config['max_tokens'])
+        response = self.http.post(
+            f"{self.config['base_url']}/v1/chat/completions",
+            headers=headers,
+            json=data
+        )
+        if response.status_code != 200:
+            raise HttpError(
+                f"{ERROR_MESSAGES['api_error']}: {response.status_code} {response.text[:200]}",
+                status_code=response.status_code
+            )
+            
+        with METRICS.timer('json_parse_seconds', source='deepseek'):
+            result = response.json()
+        self.budget.settle(reservation, self.usage.record(result.get('usage'), estimated_prompt))
+        content = result['choices'][0]['message']['content'].strip()
+        if content not in ['0', '1', '2']:
+            raise ValueError(f"无法识别的情感标签: {content[:50]}")
+        return int(content)
     
-    def _save_results(self, results):
+    def _save_results(self, store, start=0):
         """保存完整分析结果"""
         try:
-            if not os.path.exists(self.config['output_dir']):
-                os.makedirs(self.config['output_dir'])
-                
-            output_file = os.path.join(
-                self.config['output_dir'],
-                f'analyzed_{int(time.time())}.csv'
-            )
-            
-            df_result = pd.DataFrame(results)
-            df_result.to_csv(output_file, index=False, encoding='utf-8-sig')
+            output_file = self._output_path('analyzed')
+            with METRICS.timer('dataframe_io_seconds', op='write_csv'):
+                store.to_dataframe(start, analysis=True).to_csv(
+                    output_file, index=False, encoding='utf-8-sig'
+                )
             return output_file
             
         except Exception as e:
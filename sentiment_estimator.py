@@ -0,0 +1,321 @@
+"""大评论串的抽样情感估计
+
+几十万条评论的微博往往只需要情感分布，不需要每条评论的标签。
+按 发布时间段 × 点赞层 把评论分层，每层内随机抽样并只分析样本，
+用分层估计给出各情感的占比和置信区间：
+    第一轮按各层大小等比例抽取 initial_samples 条(每层至少 min_per_stratum 条)；
+    之后每轮按层内方差做Neyman分配追加样本，条数按当前区间宽度与目标宽度之比估算；
+    各情感的区间宽度都不超过 target_width，或达到 max_samples、评论全部抽完、手动停止时结束。
+每轮都检查一次、宽度一达标就停，会偏向在样本碰巧集中时停下，区间的实际覆盖率低于名义置信水平，
+因此停止判断用放大 stop_inflation 倍的区间宽度，报告的区间仍按名义置信水平计算。
+区间宽度约与样本数的平方根成反比，±2.5%的精度通常只需一两千条样本，与评论总数基本无关。
+
+估计的是按条数的占比(每条评论同等对待)，点赞分层只用于降低方差。
+抽样分析失败的评论不计入样本。配置见 config.py 的 ESTIMATOR_CONFIG。
+
+用法:
+    python sentiment_estimator.py data/raw_comments/comments.csv --api-key sk-...
+    python sentiment_estimator.py comments.csv --mock --target-width 0.03 --chart
+    python sentiment_estimator.py comments.csv --cassette data/cassettes/estimate.sqlite
+"""
+import argparse
+import json
+import math
+import os
+import time
+
+from api_cli import add_api_arguments, api_target
+from config import CHART_CONFIG, ERROR_MESSAGES, ESTIMATOR_CONFIG
+from comment_store import CommentStore
+from http_client import pause
+from lazy_modules import lazy_import
+from metrics import METRICS
+from priority_scheduler import recency_scores, z_score
+
+np = lazy_import('numpy')
+
+LABELS = tuple(CHART_CONFIG['labels'])
+
+
+def assign_strata(store, time_buckets, like_tiers):
+    """每条评论所在的层
+
+    发布时间按排名等分为 time_buckets 段，点赞数按 like_tiers 的下界分层。
+
+    Returns:
+        (层编号数组, 层数)，层编号 = 时间段 * 点赞层数 + 点赞层
+    """
+    count = len(store)
+    if not count:
+        return np.zeros(0, dtype=np.int64), 0
+    recency = recency_scores(store.created_at, store.comment_id)
+    buckets = np.minimum((recency * time_buckets).astype(np.int64), time_buckets - 1)
+    tiers = np.searchsorted(np.asarray(like_tiers), np.asarray(store.like_count), side='right')
+    tier_count = len(like_tiers) + 1
+    return buckets * tier_count + tiers, time_buckets * tier_count
+
+
+class StratifiedSample:
+    """分层随机样本：各层预先打乱，按分配的条数依次取出"""
+
+    def __init__(self, strata, size, seed=0):
+        rng = np.random.default_rng(seed)
+        order = np.argsort(strata, kind='stable')
+        bounds = np.searchsorted(strata[order], np.arange(size + 1))
+        self.members = [rng.permutation(order[bounds[h]:bounds[h + 1]]) for h in range(size)]
+        self.population = np.array([len(members) for members in self.members], dtype=np.int64)
+        self.drawn = np.zeros(size, dtype=np.int64)   # 已抽取条数(含分析失败的)
+        self.counts = np.zeros((size, len(LABELS)), dtype=np.int64)  # 各层各情感的样本数
+
+    @property
+    def remaining(self):
+        return self.population - self.drawn
+
+    @property
+    def samples(self):
+        return int(self.counts.sum())
+
+    def draw(self, allocation):
+        """按各层分配的条数取出下一批评论下标"""
+        batch = []
+        for stratum, size in enumerate(allocation):
+            start = self.drawn[stratum]
+            batch.extend(self.members[stratum][start:start + size].tolist())
+            self.drawn[stratum] += size
+        return batch
+
+    def record(self, stratum, sentiment):
+        self.counts[stratum, LABELS.index(sentiment)] += 1
+
+    def _spread(self, total, shares, allocation=None):
+        """在 allocation 之外再按份额把 total 条分给各层，不超过各层剩余条数(最大余数法)"""
+        allocation = np.zeros(len(shares), dtype=np.int64) if allocation is None else allocation.copy()
+        remaining = self.remaining
+        total = min(int(total), int((remaining - allocation).sum()))
+        while total > 0:
+            open_strata = remaining - allocation > 0
+            weights = np.where(open_strata, shares, 0.0)
+            if weights.sum() <= 0:
+                weights = open_strata.astype(np.float64)
+            quota = weights / weights.sum() * total
+            extra = np.floor(quota).astype(np.int64)
+            leftover = total - int(extra.sum())
+            if leftover:
+                extra[np.argsort(-(quota - extra), kind='stable')[:leftover]] += 1
+            extra = np.minimum(extra, remaining - allocation)
+            allocation += extra
+            total -= int(extra.sum())
+        return allocation
+
+    def initial_allocation(self, total, min_per_stratum):
+        """第一轮：每层先取 min_per_stratum 条，其余按层大小等比例分配"""
+        base = np.minimum(self.population, min_per_stratum)
+        return self._spread(max(total - int(base.sum()), 0), self.population.astype(np.float64), base)
+
+    def neyman_allocation(self, total):
+        """按 层大小 × 层内标准差 分配，标准差用加一平滑的占比估计，避免样本全同的层得不到样本"""
+        n = self.counts.sum(axis=1, keepdims=True)
+        smoothed = (self.counts + 1) / (n + len(LABELS))
+        deviation = np.sqrt((smoothed * (1 - smoothed)).sum(axis=1))
+        return self._spread(total, self.population * deviation)
+
+    def estimate(self, z):
+        """分层估计各情感占比及置信区间
+
+        Returns:
+            {情感: {'ratio', 'low', 'high'}}，情感为字符串，与评测结果一致
+        """
+        n = self.counts.sum(axis=1)
+        sampled = n > 0
+        weights = np.where(sampled, self.population, 0).astype(np.float64)
+        if not weights.sum():
+            return {str(label): {'ratio': 0.0, 'low': 0.0, 'high': 1.0} for label in LABELS}
+        weights /= weights.sum()
+        # 有限总体校正：整层抽完时该层没有抽样误差
+        fpc = np.where(sampled, 1 - n / np.maximum(self.population, 1), 0.0)
+        result = {}
+        for column, label in enumerate(LABELS):
+            p = np.divide(self.counts[:, column], n, out=np.zeros(len(n)), where=sampled)
+            # 层内样本方差；只有一条样本的层取最大方差0.25
+            variance = np.where(n > 1, p * (1 - p) * n / np.maximum(n - 1, 1), 0.25)
+            ratio = float((weights * p).sum())
+            se = float(np.sqrt((weights ** 2 * fpc * variance / np.maximum(n, 1)).sum()))
+            result[str(label)] = {
+                'ratio': ratio,
+                'low': max(ratio - z * se, 0.0),
+                'high': min(ratio + z * se, 1.0)
+            }
+        return result
+
+
+class SentimentEstimator:
+    """分层抽样 + 自适应追加样本的情感分布估计"""
+
+    def __init__(self, analyzer=None, config=None):
+        """
+        Args:
+            analyzer: 负责调用API的 SentimentAnalyzer，其 is_running 为False时停止抽样
+            config: 默认为 ESTIMATOR_CONFIG
+        """
+        if analyzer is None:
+            from sentiment_analyzer import SentimentAnalyzer
+            analyzer = SentimentAnalyzer()
+        self.analyzer = analyzer
+        self.config = config or ESTIMATOR_CONFIG
+        self.progress_callback = None  # 每轮结束后调用，参数为当前估计
+
+    def _analyze(self, sample, batch, strata, store, clean_text):
+        """分析一批样本，返回失败条数"""
+        failed = 0
+        for idx in batch:
+            if not self.analyzer.is_running:
+                break
+            try:
+                # 纯表情评论规范化后为空，仍用原文
+                sentiment = self.analyzer.analyze_text(clean_text[idx] or store.content[idx])
+                sample.record(strata[idx], sentiment)
+                METRICS.counter('estimate_samples_total').inc()
+            except Exception as e:
+                print(f"单条评论分析失败: {str(e)}")
+                failed += 1
+            pause(self.analyzer.config['sleep_time'])
+        return failed
+
+    def _result(self, sample, store, rounds, failed, z):
+        classes = sample.estimate(z)
+        width = max(item['high'] - item['low'] for item in classes.values())
+        usage = self.analyzer.usage
+        return {
+            'total': len(store),
+            'samples': sample.samples,
+            'failed': failed,
+            'rounds': rounds,
+            'confidence': self.config['confidence'],
+            'target_width': self.config['target_width'],
+            'width': width,
+            'converged': width * self.config['stop_inflation'] <= self.config['target_width'],
+            'calls': usage.requests,
+            'cost': usage.cost,
+            'classes': classes,
+            'strata': [
+                {'population': int(population), 'sampled': int(sampled)}
+                for population, sampled in zip(sample.population, sample.counts.sum(axis=1))
+            ]
+        }
+
+    def estimate(self, comments_file=None, store=None):
+        """抽样估计评论的情感分布
+
+        Args:
+            comments_file: 爬虫输出的评论CSV
+            store: 已在内存中的 CommentStore，传入时不再读取文件
+
+        Returns:
+            估计结果dict(见 _result)，同时保存为 output_dir 下的JSON；失败时返回None
+        """
+        try:
+            if not self.analyzer.api_key:
+                raise ValueError(ERROR_MESSAGES['no_api_key'])
+            if store is None:
+                with METRICS.timer('dataframe_io_seconds', op='read_csv'):
+                    store = CommentStore.from_csv(comments_file)
+            if not len(store):
+                raise ValueError(ERROR_MESSAGES['no_comments'])
+
+            config = self.config
+            z = z_score(config['confidence'])
+            self.analyzer.usage.reset()
+            with METRICS.timer('normalize_seconds'):
+                clean_text = store.normalize()
+            strata, size = assign_strata(store, config['time_buckets'], config['like_tiers'])
+            sample = StratifiedSample(strata, size, config['seed'])
+
+            allocation = sample.initial_allocation(
+                min(config['initial_samples'], config['max_samples']), config['min_per_stratum']
+            )
+            rounds = failed = 0
+            while True:
+                rounds += 1
+                failed += self._analyze(sample, sample.draw(allocation), strata, store, clean_text)
+                result = self._result(sample, store, rounds, failed, z)
+                print(f"第{rounds}轮: {format_result(result)}")
+                if self.progress_callback:
+                    self.progress_callback(result)
+
+                drawn = int(sample.drawn.sum())
+                if result['converged'] or drawn >= config['max_samples'] \
+                        or not sample.remaining.sum() or not self.analyzer.is_running:
+                    break
+                # 区间宽度约与样本数的平方根成反比，按此估算还需要的条数
+                ratio = result['width'] * config['stop_inflation'] / config['target_width']
+                needed = math.ceil(max(sample.samples, 1) * ratio ** 2)
+                batch = min(max(needed - sample.samples, config['batch_min']), config['batch_max'],
+                            config['max_samples'] - drawn)
+                allocation = sample.neyman_allocation(batch)
+
+            print(f"API用量: {self.analyzer.usage.format()}")
+            self._save(result)
+            return result
+
+        except Exception as e:
+            print(f"抽样估计失败: {str(e)}")
+            return None
+
+    def _save(self, result):
+        output_dir = self.config['output_dir']
+        os.makedirs(output_dir, exist_ok=True)
+        output_file = os.path.join(output_dir, f'estimate_{int(time.time())}.json')
+        with open(output_file, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        result['output_file'] = output_file
+
+
+def format_result(result):
+    """一行文字描述估计结果"""
+    names = CHART_CONFIG['labels']
+    parts = [
+        f"{names[int(label)]} {item['ratio'] * 100:.1f}%({item['low'] * 100:.1f}%~{item['high'] * 100:.1f}%)"
+        for label, item in result['classes'].items()
+    ]
+    parts.append(f"样本 {result['samples']}/{result['total']} 条")
+    parts.append(f"区间宽度 {result['width'] * 100:.1f}%")
+    return ' | '.join(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='分层抽样估计评论的情感分布')
+    parser.add_argument('comments_file', help='爬虫输出的评论CSV')
+    parser.add_argument('--target-width', type=float, help='置信区间宽度目标，默认读取配置')
+    parser.add_argument('--max-samples', type=int, help='抽样总数上限，默认读取配置')
+    parser.add_argument('--confidence', type=float, help='置信水平，默认读取配置')
+    parser.add_argument('--seed', type=int, help='随机种子，默认读取配置')
+    parser.add_argument('--chart', action='store_true', help='生成带误差线的分布图')
+    add_api_arguments(parser)
+    args = parser.parse_args()
+
+    config = dict(ESTIMATOR_CONFIG)
+    for key in ('target_width', 'max_samples', 'confidence', 'seed'):
+        if getattr(args, key) is not None:
+            config[key] = getattr(args, key)
+
+    from config import ANALYZER_CONFIG
+    from sentiment_analyzer import SentimentAnalyzer
+    with api_target(parser, args) as target:
+        analyzer_config = dict(ANALYZER_CONFIG)
+        if target['base_url']:
+            analyzer_config.update(base_url=target['base_url'], sleep_time=target['sleep_time'])
+        analyzer = SentimentAnalyzer(analyzer_config)
+        analyzer.set_api_key(target['api_key'])
+        result = SentimentEstimator(analyzer, config).estimate(args.comments_file)
+    if result is None:
+        raise SystemExit(1)
+    print(f"估计结果已保存至: {result['output_file']}")
+    if args.chart:
+        from chart_maker import ChartMaker
+        chart_file = ChartMaker().create_estimate_chart(result)
+        if chart_file:
+            print(f"分布图已保存至: {chart_file}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+"""多账号会话池
+
+从账号文件加载多组 Cookie/User-Agent，每个账号有独立的连接池(HttpClient)和请求速率预算。
+每次翻页从健康且有余量的账号中选最久未用的一个，不同微博、不同页面的请求分散到各账号上。
+某个账号连续返回错误或异常数据(如 ok=-100 要求重新登录)时暂时隔离，隔离时间逐次翻倍。
+一级评论的首页 ok=1 却没有评论时先换其他账号确认：其他账号拿到了评论才说明该账号被软封禁，
+所有账号都返回空首页则是真的没有评论(如刚发布的微博)，不计为失败。
+
+账号文件格式(JSON):
+    [
+        {"name": "账号1", "cookie": "...", "user_agent": "...", "referer": "https://weibo.com/", "rpm": 20},
+        ...
+    ]
+"""
+import json
+import threading
+import time
+
+from comment_schema import SchemaDriftError, parse_page
+from config import CRAWLER_CONFIG
+from http_client import HttpClient, HttpError
+from metrics import METRICS
+from token_budget import TokenBudget
+
+DEFAULT_REFERER = 'https://weibo.com/'
+
+
+class NoSessionError(HttpError):
+    """会话池中没有可用账号"""
+
+
+class CrawlSession:
+    """单个账号的会话"""
+
+    def __init__(self, name, headers, rpm=0, http=None):
+        self.name = name
+        self.headers = headers
+        self.http = http or HttpClient()
+        self.budget = TokenBudget(rpm=rpm)
+        self.failures = 0       # 连续失败次数
+        self.strikes = 0        # 被隔离的次数，用于计算隔离时长
+        self.quarantined_until = 0.0
+        self.last_used = 0.0
+        self.requests = 0
+
+    def healthy(self, now=None):
+        return (now or time.monotonic()) >= self.quarantined_until
+
+    def status(self):
+        now = time.monotonic()
+        return {
+            'name': self.name,
+            'healthy': self.healthy(now),
+            'quarantine_left': max(self.quarantined_until - now, 0.0),
+            'failures': self.failures,
+            'requests': self.requests
+        }
+
+
+def validate_payload(page):
+    """检查解析后的评论页，返回错误原因，正常时返回None"""
+    if page.ok != 1:
+        return f"ok={page.ok}"
+    return None
+
+
+def is_first_page(params):
+    """一级评论的首页；回复串(fetch_level=1)的评论可能全被删除，空首页是正常的"""
+    return not params.get('max_id') and not params.get('fetch_level')
+
+
+class SessionPool:
+    """多账号会话池，可被多个爬虫共享"""
+
+    def __init__(self, sessions, config=None):
+        if not sessions:
+            raise ValueError('会话池至少需要一个账号')
+        self.config = config or CRAWLER_CONFIG
+        self.sessions = list(sessions)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_credentials(cls, credentials, config=None):
+        """
+        Args:
+            credentials: [{'name', 'cookie', 'user_agent', 'referer', 'rpm'}]
+        """
+        config = config or CRAWLER_CONFIG
+        sessions = []
+        for idx, item in enumerate(credentials):
+            headers = {
+                'User-Agent': item['user_agent'],
+                'Cookie': item['cookie'],
+                'Referer': item.get('referer') or DEFAULT_REFERER
+            }
+            sessions.append(CrawlSession(
+                item.get('name') or f'account{idx + 1}', headers,
+                rpm=item.get('rpm', config['session_rpm'])
+            ))
+        return cls(sessions, config)
+
+    @classmethod
+    def from_file(cls, path, config=None):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_credentials(json.load(f), config)
+
+    def acquire(self, cancelled=None, exclude=()):
+        """取一个健康且有速率余量的账号，都不可用时等待
+
+        Args:
+            exclude: 不参与选择的账号
+
+        Returns:
+            CrawlSession；指定了 exclude 且其余账号都在隔离时返回None
+
+        Raises:
+            NoSessionError: cancelled 返回True时
+        """
+        while True:
+            now = time.monotonic()
+            with self._lock:
+                candidates = sorted(
+                    (s for s in self.sessions if s.healthy(now) and s not in exclude),
+                    key=lambda s: s.last_used
+                )
+                if exclude and not candidates:
+                    return None
+                for session in candidates:
+                    if session.budget.try_acquire(1):
+                        session.last_used = now
+                        session.requests += 1
+                        return session
+                # 所有账号都在隔离或没有余量，等到最早恢复的那个
+                wait = min(
+                    (s.quarantined_until - now for s in self.sessions if not s.healthy(now)),
+                    default=0.5
+                )
+            if cancelled and cancelled():
+                raise NoSessionError('会话池没有可用账号')
+            time.sleep(min(max(wait, 0.05), 0.5))
+
+    def report(self, session, error=None):
+        """记录一次请求的结果，连续失败达到阈值时隔离该账号"""
+        with self._lock:
+            if error is None:
+                session.failures = 0
+                session.strikes = 0
+                return
+            session.failures += 1
+            if session.failures < self.config['session_failure_threshold']:
+                return
+            duration = self.config['session_quarantine_seconds'] * 2 ** session.strikes
+            session.strikes += 1
+            session.failures = 0
+            session.quarantined_until = time.monotonic() + duration
+        METRICS.counter('session_quarantined_total', session=session.name).inc()
+        print(f"账号 {session.name} 已隔离 {duration:.0f} 秒: {error}")
+
+    def fetch(self, url, params, cancelled=None):
+        """用池中的账号请求评论接口并解析为 CommentPage，异常数据换一个账号重试
+
+        Raises:
+            HttpError: 所有尝试都失败
+            SchemaDriftError: 接口字段结构变化
+        """
+        last_error = None
+        first_page = is_first_page(params)
+        suspects = {}  # 返回空首页的账号 -> 原因，等其他账号确认后再决定是否计为失败
+        empty = None   # 空首页，或缺少评论列表时的 SchemaDriftError
+        for _ in range(len(self.sessions) + 1):
+            session = self.acquire(cancelled, exclude=suspects)
+            if session is None:
+                break
+            try:
+                response = session.http.get(url, headers=session.headers, params=params)
+                if response.status_code != 200:
+                    raise HttpError(f"返回 {response.status_code}", status_code=response.status_code)
+                with METRICS.timer('json_parse_seconds', source='weibo'):
+                    page = parse_page(response.content)
+                error = validate_payload(page)
+                if error is None and first_page and not len(page):
+                    suspects[session], empty = "首页没有评论数据", page
+                    continue
+            except SchemaDriftError as e:
+                if first_page and e.field == 'data':
+                    # ok=1 却缺少评论列表，与空首页一样可能是账号被限制
+                    suspects[session], empty = str(e), e
+                    continue
+                # 字段结构变化与账号无关，换账号重试也没用
+                self.report(session)
+                raise
+            except (HttpError, ValueError) as e:
+                error = str(e)
+            self._record(session, error)
+            if error is None:
+                # 其他账号拿到了评论，返回空首页的账号被软封禁
+                for suspect, reason in suspects.items():
+                    self._record(suspect, reason)
+                return page
+            last_error = f'{session.name}: {error}'
+        if suspects:
+            # 能用的账号都返回空首页，确实没有评论
+            for suspect in suspects:
+                self._record(suspect)
+            if isinstance(empty, SchemaDriftError):
+                raise empty
+            return empty
+        raise HttpError(f"会话池请求失败: {last_error}")
+
+    def _record(self, session, error=None):
+        METRICS.counter('session_requests_total', session=session.name,
+                        status='ok' if error is None else 'error').inc()
+        self.report(session, error)
+
+    def status(self):
+        return [session.status() for session in self.sessions]
@@ -0,0 +1,60 @@
+"""评论文本规范化
+
+微博评论原文(text_raw)里的表情代码、@提及、链接、转发链和全角标点既增加prompt的token数，
+也会混进词云。这里把规则预编译好，用 pandas 的 .str 向量化方法对整列评论一次性处理，
+结果作为 clean_text 列保存，分析、去重和词云都使用这一列。
+"""
+import re
+import unicodedata
+
+from lazy_modules import lazy_import
+
+pd = lazy_import('pandas')
+
+# 以下规则都在 NFKC 之后匹配，全角的 ＠ ： 等已转成半角
+# 转发链，"//@用户:原文" 之后都是别人的内容
+REPOST_CHAIN_PATTERN = re.compile(r'//\s*@[^:\s]+\s*:.*', re.S)
+# 楼中楼回复的前缀，"回复@用户:"
+REPLY_PREFIX_PATTERN = re.compile(r'^\s*回复\s*@[^:\s]+\s*:')
+# 链接，以及微博把链接折叠后显示的文字
+URL_PATTERN = re.compile(r'https?://\S+|网页链接')
+# @用户名
+MENTION_PATTERN = re.compile(r'@[\w\-·]+')
+# 微博表情代码，如 [哈哈]、[doge]
+EMOTICON_PATTERN = re.compile(r'\[[^\[\]\s]{1,10}\]')
+# 连续重复的标点只保留两个，如 "！！！！！" -> "!!"
+REPEATED_PUNCT_PATTERN = re.compile(r'([!?~.,。…])\1{2,}')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# 按顺序执行的替换规则
+RULES = (
+    (REPOST_CHAIN_PATTERN, ''),
+    (REPLY_PREFIX_PATTERN, ''),
+    (URL_PATTERN, ' '),
+    (MENTION_PATTERN, ' '),
+    (EMOTICON_PATTERN, ' '),
+    (REPEATED_PUNCT_PATTERN, r'\1\1'),
+    (WHITESPACE_PATTERN, ' '),
+)
+
+
+def normalize_text(text):
+    """规范化单条评论，批量处理请用 normalize_series / normalize_texts"""
+    text = unicodedata.normalize('NFKC', str(text))
+    for pattern, repl in RULES:
+        text = pattern.sub(repl, text)
+    return text.strip()
+
+
+def normalize_series(series):
+    """向量化规范化一列评论，返回新的 Series，缺失值视为空串"""
+    series = series.fillna('').astype(str).str.normalize('NFKC')
+    for pattern, repl in RULES:
+        series = series.str.replace(pattern, repl, regex=True)
+    return series.str.strip()
+
+
+def normalize_texts(texts):
+    """规范化一组评论，返回列表；与原文相同的直接引用原字符串，不额外占内存"""
+    cleaned = normalize_series(pd.Series(texts, dtype=object)).tolist()
+    return [new if new != old else old for new, old in zip(cleaned, texts)]
@@ -0,0 +1,214 @@
+"""大模型请求的token预算与用量统计
+
+- estimate_tokens: 按字符类别粗略估算token数，用于截断和提前占用预算
+- truncate_text: 超长评论按策略截断
+- TokenBudget: 在一分钟滑动窗口内同时限制请求数(RPM)和token数(TPM)
+- UsageTracker: 按接口返回的 usage 累计 token、请求数和费用
+"""
+import math
+import re
+import threading
+import time
+from collections import deque
+
+from http_client import replaying
+from metrics import METRICS
+
+# 中日韩文字和全角符号约0.6个token/字，其余字符约0.3个token/字符
+_WIDE_CHARS = re.compile(r'[\u3000-\u303f\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]')
+WIDE_TOKENS_PER_CHAR = 0.6
+NARROW_TOKENS_PER_CHAR = 0.3
+TRUNCATE_POLICIES = ('none', 'head', 'head_tail')
+_ELLIPSIS = '…'
+_ELLIPSIS_TOKENS = NARROW_TOKENS_PER_CHAR  # 省略号不在宽字符范围内
+
+
+def estimate_tokens(text):
+    """估算文本的token数"""
+    wide = len(_WIDE_CHARS.findall(text))
+    return math.ceil(wide * WIDE_TOKENS_PER_CHAR + (len(text) - wide) * NARROW_TOKENS_PER_CHAR)
+
+
+def _fit(chars, budget):
+    """从头开始能放进 budget 个token的字符数"""
+    used = 0.0
+    for count, char in enumerate(chars):
+        used += WIDE_TOKENS_PER_CHAR if _WIDE_CHARS.match(char) else NARROW_TOKENS_PER_CHAR
+        if used > budget:
+            return count
+    return len(chars)
+
+
+def truncate_text(text, max_tokens, policy='head_tail'):
+    """把文本截断到不超过 max_tokens 个token(按 estimate_tokens 估算，含省略号)
+
+    Args:
+        policy: none 不截断；head 只保留开头；
+            head_tail 保留开头和结尾各一半，长评论的态度常写在最后
+
+    Raises:
+        ValueError: 未知的截断策略
+    """
+    if policy not in TRUNCATE_POLICIES:
+        raise ValueError(f"未知的截断策略: {policy}")
+    if policy == 'none' or max_tokens <= 0 or estimate_tokens(text) <= max_tokens:
+        return text
+    # 省略号本身也占token，先从预算中扣除，截断后的结果不超过 max_tokens
+    budget = max_tokens - _ELLIPSIS_TOKENS
+    if policy == 'head':
+        return text[:_fit(text, budget)] + _ELLIPSIS
+    half = budget / 2
+    head = _fit(text, half)
+    tail = _fit(text[::-1], half)
+    return text[:head] + _ELLIPSIS + text[len(text) - tail:]
+
+
+class TokenBudget:
+    """按每分钟请求数和token数调度请求，0表示不限制"""
+
+    def __init__(self, rpm=0, tpm=0, window=60.0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.window = window
+        self._events = deque()  # [发出时间, 占用token数]
+        self._tokens = 0
+        self._lock = threading.Lock()
+
+    def _expire(self, now):
+        while self._events and now - self._events[0][0] >= self.window:
+            _, tokens = self._events.popleft()
+            self._tokens -= tokens
+
+    def _reserve(self, tokens):
+        """预算足够时占用并返回 (占用记录, 0)，否则返回 (None, 需等待的秒数)"""
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            # 回放录制的响应时不受速率限制，只记录用量
+            rpm_ok = replaying() or not self.rpm or len(self._events) < self.rpm
+            tpm_ok = replaying() or not self.tpm or self._tokens + tokens <= self.tpm
+            if rpm_ok and tpm_ok:
+                entry = [now, tokens]
+                self._events.append(entry)
+                self._tokens += tokens
+                return entry, 0.0
+            return None, self.window - (now - self._events[0][0])
+
+    def try_acquire(self, tokens=1):
+        """不等待，预算不足时返回None"""
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        return self._reserve(tokens)[0]
+
+    def acquire(self, tokens, cancelled=None):
+        """等待到预算允许发出一个约占 tokens 的请求
+
+        Args:
+            tokens: 预估的 prompt + completion token数
+            cancelled: 返回True时放弃等待
+
+        Returns:
+            占用记录，拿到实际用量后传给 settle；放弃等待时返回None
+        """
+        if self.tpm:
+            tokens = min(tokens, self.tpm)  # 单个请求超过TPM时也要能发出去
+        started = time.monotonic()
+        while True:
+            entry, delay = self._reserve(tokens)
+            if entry is not None:
+                if entry[0] > started:
+                    METRICS.histogram('llm_budget_wait_seconds').observe(entry[0] - started)
+                return entry
+            if cancelled and cancelled():
+                return None
+            time.sleep(min(max(delay, 0.01), 0.5))
+
+    def settle(self, entry, tokens):
+        """用实际token数修正之前的占用"""
+        if entry is None:
+            return
+        with self._lock:
+            if time.monotonic() - entry[0] < self.window:
+                self._tokens += tokens - entry[1]
+                entry[1] = tokens
+
+    def usage(self):
+        """当前窗口内的 (请求数, token数)"""
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._events), self._tokens
+
+
+class UsageTracker:
+    """累计token用量与费用"""
+
+    def __init__(self, price_per_million=None):
+        """
+        Args:
+            price_per_million: {'prompt': 元, 'completion': 元}，每百万token的价格
+        """
+        self.prices = price_per_million or {}
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated_tokens = 0
+        self.truncated = 0
+        self.started = time.monotonic()
+
+    def record(self, usage, estimated_prompt):
+        """记录一次请求的用量
+
+        Args:
+            usage: 接口返回的 usage 字段，缺失时按估算值计
+            estimated_prompt: 发送前估算的 prompt token数
+
+        Returns:
+            本次请求的总token数
+        """
+        usage = usage or {}
+        prompt = int(usage.get('prompt_tokens', estimated_prompt))
+        completion = int(usage.get('completion_tokens', 0))
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt
+            self.completion_tokens += completion
+            self.estimated_tokens += estimated_prompt
+        METRICS.counter('llm_tokens_total', kind='prompt').inc(prompt)
+        METRICS.counter('llm_tokens_total', kind='completion').inc(completion)
+        return prompt + completion
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    @property
+    def cost(self):
+        return (self.prompt_tokens * self.prices.get('prompt', 0.0)
+                + self.completion_tokens * self.prices.get('completion', 0.0)) / 1_000_000
+
+    def summary(self):
+        minutes = max(time.monotonic() - self.started, 1e-9) / 60
+        return {
+            'requests': self.requests,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'total_tokens': self.total_tokens,
+            'truncated': self.truncated,
+            'cost': self.cost,
+            'tokens_per_minute': self.total_tokens / minutes,
+            'requests_per_minute': self.requests / minutes,
+            # 估算值与实际值之比，偏离1较多时说明估算系数需要调整
+            'estimate_ratio': self.estimated_tokens / self.prompt_tokens if self.prompt_tokens else None
+        }
+
+    def format(self):
+        stats = self.summary()
+        return (
+            f"请求 {stats['requests']} 次 | token 输入 {stats['prompt_tokens']} / 输出 {stats['completion_tokens']}"
+            f" | 约 {stats['cost']:.4f} 元 | {stats['tokens_per_minute']:.0f} token/分钟"
+            f" | 截断 {stats['truncated']} 条"
+        )
@@ -1,22 +1,30 @@
-import requests
-import pandas as pd
 import time
 import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from config import CRAWLER_CONFIG, ERROR_MESSAGES
+from comment_schema import parse_page
+from comment_store import CommentStore
+from http_client import HttpClient, pause
+from metrics import METRICS
 
 class WeiboCrawler:
     def __init__(self):
         self.config = CRAWLER_CONFIG
-        self.session = requests.Session()
+        self.http = HttpClient()
         self.headers = {}
         self.progress_callback = None
         self.is_running = True
         self.current_page = 1
         self.max_id = None
-        self.comments = []
+        self.comments = CommentStore()  # 列式存储，分析器直接共用
         self.url = None
         self.last_max_id = None  # 记录上次爬取的位置
+        self.fetch_replies = self.config['fetch_replies']  # 是否爬取楼中楼回复
+        self._lock = threading.Lock()
+        self.budget = None  # 可选的 TokenBudget，多个爬虫共享请求速率
+        self.session_pool = None  # 可选的 SessionPool，设置后用多个账号轮流请求
         
     def set_headers(self, user_agent, cookie, referer):
         """设置请求头"""
@@ -26,19 +34,34 @@ class WeiboCrawler:
             'Referer': referer
         }
         
-    def crawl_comments(self, url):
-        """开始爬取评论"""
+    def crawl_comments(self, url, fetch_replies=None):
+        """开始爬取评论
+        
+        Args:
+            url: 微博URL
+            fetch_replies: 是否同时爬取楼中楼回复，默认读取配置
+        """
+        if fetch_replies is not None:
+            self.fetch_replies = fetch_replies
         self.url = url
         self.is_running = True
-        self.comments = []
+        self.comments = CommentStore()
         self.current_page = 1
         self.max_id = None
         return self._crawl()
         
     def _crawl(self, start_from_max_id=None):
         """实际的爬取逻辑"""
+        # 回复在线程池中并发爬取，不阻塞主分页循环
+        executor = None
+        reply_futures = []
+        if self.fetch_replies:
+            executor = ThreadPoolExecutor(
+                max_workers=self.config['reply_workers'],
+                thread_name_prefix='reply'
+            )
         try:
-            if not all(self.headers.values()):
+            if not self.session_pool and not all(self.headers.values()):
                 raise ValueError(ERROR_MESSAGES['no_headers'])
 
             # 从URL中提取参数
@@ -55,7 +78,7 @@ class WeiboCrawler:
                     
                 while self.is_running:
                     # 构造API请求
-                    api_url = "https://weibo.com/ajax/statuses/buildComments"
+                    api_url = f"{self.config['base_url']}/ajax/statuses/buildComments"
                     params = {
                         'id': mid,
                         'is_reload': 1,
@@ -67,46 +90,93 @@ class WeiboCrawler:
                         'max_id': start_from_max_id if start_from_max_id else (self.max_id if self.max_id else 0)
                     }
                     
-                    response = self.session.get(api_url, headers=self.headers, params=params)
-                    data = response.json()
-                    
-                    if 'data' in data and isinstance(data['data'], list):
-                        comments_data = data['data']
-                        if not comments_data:
-                            break
-                            
-                        for comment in comments_data:
-                            self.comments.append({
-                                'comment_id': comment['id'],
-                                'content': comment['text_raw'],
-                                'created_at': comment['created_at'],
-                                'user_name': comment['user']['screen_name'],
-                                'like_count': comment.get('like_counts', 0)
-                            })
-                            
-                        # 回调进度
-                        if self.progress_callback:
-                            self.progress_callback(len(self.comments))
-                            
-                        # 获取下一页的max_id
-                        self.max_id = data.get('max_id')
-                        if not self.max_id:
-                            break
-                            
-                        self.current_page += 1
-                        time.sleep(self.config['sleep_time'])
-                    else:
+                    page = self._fetch(api_url, params)
+                    if page.ok != 1 or not len(page):
                         break
                         
+                    METRICS.counter('comments_crawled_total', level='top').inc(len(page))
+                    with self._lock:
+                        page.write_to(self.comments)
+                        
+                    if executor:
+                        for comment_id, total in zip(page.comment_id, page.total_number):
+                            if total >= self.config['reply_min_count']:
+                                reply_futures.append(
+                                    executor.submit(self._crawl_replies, comment_id, uid)
+                                )
+                        
+                    # 回调进度
+                    if self.progress_callback:
+                        self.progress_callback(len(self.comments))
+                        
+                    # 获取下一页的max_id
+                    self.max_id = page.max_id
+                    if not self.max_id:
+                        break
+                        
+                    self.current_page += 1
+                    pause(self.config['sleep_time'])
+                        
             except Exception as e:
                 print(f"爬取失败: {str(e)}")
                 
+            # 等待尚未完成的回复爬取
+            if reply_futures:
+                wait(reply_futures)
+                if self.progress_callback:
+                    self.progress_callback(len(self.comments))
+                
             # 保存已爬取的评论
             return self._save_comments()
                 
         except Exception as e:
             print(f"爬虫异常: {str(e)}")
             raise
+        finally:
+            if executor:
+                executor.shutdown(wait=False)
+            
+    def _fetch(self, url, params):
+        """请求评论接口并解析为 CommentPage，设置了共享预算时先排队，设置了会话池时由池选择账号"""
+        if self.budget:
+            self.budget.acquire(1)
+        if self.session_pool:
+            return self.session_pool.fetch(url, params, cancelled=lambda: not self.is_running)
+        response = self.http.get(url, headers=self.headers, params=params)
+        with METRICS.timer('json_parse_seconds', source='weibo'):
+            return parse_page(response.content)
+        
+    def _crawl_replies(self, comment_id, uid):
+        """爬取某条评论下的全部回复"""
+        max_id = 0
+        try:
+            while self.is_running:
+                params = {
+                    'id': comment_id,
+                    'is_reload': 1,
+                    'is_show_bulletin': 2,
+                    'is_mix': 1,
+                    'count': 20,
+                    'uid': uid,
+                    'fetch_level': 1,
+                    'flow': 0,
+                    'max_id': max_id
+                }
+                page = self._fetch(f"{self.config['base_url']}/ajax/statuses/buildComments", params)
+                if page.ok != 1 or not len(page):
+                    break
+                    
+                METRICS.counter('comments_crawled_total', level='reply').inc(len(page))
+                with self._lock:
+                    page.write_to(self.comments, parent_id=comment_id)
+                        
+                max_id = page.max_id
+                if not max_id:
+                    break
+                pause(self.config['sleep_time'])
+                
+        except Exception as e:
+            print(f"爬取回复失败({comment_id}): {str(e)}")
             
     def _save_comments(self):
         """保存评论到文件"""
@@ -119,8 +189,9 @@ class WeiboCrawler:
                 f'comments_{int(time.time())}.csv'
             )
             
-            df = pd.DataFrame(self.comments)
-            df.to_csv(output_file, index=False, encoding='utf-8-sig')
+            with self._lock, METRICS.timer('dataframe_io_seconds', op='write_csv'):
+                # DataFrame 直接引用存储中的数组，写完即释放
+                self.comments.to_dataframe().to_csv(output_file, index=False, encoding='utf-8-sig')
             return output_file
         return None
         